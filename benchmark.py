@@ -0,0 +1,257 @@
+from PySide6.QtGui import QVector2D as Vec2
+from physics import PhysicsManager, Body, Circle, Edge, StepStats
+from snooker import Ball, Table, hit_impulse
+from showcase import PhysicsManager_Gravity
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+
+
+class Scenario():
+    """
+    A headless setup stepped for a fixed number of ticks. build(rng) returns the
+    manager ready to step, scenarios with the same seed are the same every run.
+    """
+    name: str
+    ticks: int
+
+    def __init__(self, name: str, build, ticks: int):
+        self.name = name
+        self.build = build
+        self.ticks = ticks
+
+    def run(self, seed: int = 0, ticks: int = None) -> 'BenchmarkResult':
+        manager = self.build(random.Random(seed))
+        steps = [manager.step() for i in range(ticks if ticks else self.ticks)]
+        return BenchmarkResult(self.name, len(manager._bodies), steps)
+
+
+class BenchmarkResult():
+    name: str
+    bodies: int
+    ticks: int
+    ms_per_tick: float
+    p50: float
+    p95: float
+    max: float
+    pairs_per_tick: float
+    contacts_per_tick: float
+    awake: float
+
+    def __init__(self, name: str, bodies: int, steps: [StepStats]):
+        self.name = name
+        self.bodies = bodies
+        self.ticks = len(steps)
+        frametime = sorted(step.frametime for step in steps)
+        self.ms_per_tick = sum(frametime) / self.ticks
+        self.p50 = frametime[self.ticks // 2]
+        self.p95 = frametime[min(int(self.ticks * 0.95), self.ticks - 1)]
+        self.max = frametime[-1]
+        self.pairs_per_tick = sum(step.pairs for step in steps) / self.ticks
+        self.contacts_per_tick = sum(step.resolved for step in steps) / self.ticks
+        self.awake = sum(step.awake for step in steps) / self.ticks
+
+    def to_dict(self) -> dict:
+        return {'bodies': self.bodies, 'ticks': self.ticks, 'ms_per_tick': self.ms_per_tick, 'p50': self.p50, 'p95': self.p95,
+                'max': self.max, 'pairs_per_tick': self.pairs_per_tick, 'contacts_per_tick': self.contacts_per_tick, 'awake': self.awake}
+
+    def __repr__(self):
+        return (f'{self.name:<16} {self.bodies:>6} {self.ms_per_tick:>9.3f} {self.p50:>8.3f} {self.p95:>8.3f} {self.max:>8.3f}'
+                f' {self.pairs_per_tick:>10.1f} {self.contacts_per_tick:>9.1f} {self.awake:>8.1f}')
+
+    header = (f'{"scenario":<16} {"bodies":>6} {"ms/tick":>9} {"p50":>8} {"p95":>8} {"max":>8}'
+              f' {"pairs":>10} {"contacts":>9} {"awake":>8}')
+
+
+def walls(manager: PhysicsManager, width: float, height: float, elasticity: float = 0.8):
+    # floor, left and right side of an open box, a ceiling too for closed fields
+    for p1, p2 in ((Vec2(0, height), Vec2(width, height)), (Vec2(0, 0), Vec2(0, height)), (Vec2(width, 0), Vec2(width, height))):
+        edge = Body(Edge(p2 - p1), Body.Type.Static)
+        edge.position = p1
+        edge.elasticity = elasticity
+        manager.add_body(edge)
+
+
+def snooker_rack(manager: PhysicsManager) -> Ball:
+    # 15 reds, 6 colours and the cue ball on a 400 x 800 table, returns the cue ball
+    table = Table(Vec2(400, 800))
+    table.add_to(manager)
+    manager.global_friction = 0.5
+    step = Ball.radius * 2 + 0.5
+    for row in range(5):
+        for i in range(row + 1):
+            manager.add_body(Ball(Vec2(200 + (i - row / 2) * step, 200 - row * step * math.sqrt(3) / 2), Ball.Color.Red).body)
+    colours = ((Vec2(200, 222), Ball.Color.Pink), (Vec2(200, 90), Ball.Color.Black), (Vec2(200, 400), Ball.Color.Blue),
+               (Vec2(200, 640), Ball.Color.Brown), (Vec2(150, 640), Ball.Color.Yellow), (Vec2(250, 640), Ball.Color.Green))
+    for position, colour in colours:
+        manager.add_body(Ball(position, colour).body)
+    cue = Ball(Vec2(300, 680), Ball.Color.White)
+    manager.add_body(cue.body)
+    return cue
+
+
+def snooker_break(rng: random.Random) -> PhysicsManager:
+    manager = PhysicsManager(headless=True)
+    cue = snooker_rack(manager)
+    # from the right of the baulk, past the blue, full into the apex red
+    cue.hit(hit_impulse(Vec2(205, 210) - cue.position(), 1.0, 1000.0))
+    return manager
+
+
+def snooker_idle(rng: random.Random) -> PhysicsManager:
+    manager = PhysicsManager(headless=True)
+    snooker_rack(manager)
+    return manager
+
+
+def gravity_pile(n: int):
+    # showcase balls stacked in columns on the floor of a box, the columns collapse into a pile
+    def build(rng: random.Random) -> PhysicsManager:
+        manager = PhysicsManager_Gravity(headless=True)
+        manager.gravity = 200
+        columns = max(int(math.sqrt(n) * 2), 10)
+        rows = math.ceil(n / columns)
+        width = columns * 62
+        height = rows * 62 + 100
+        walls(manager, width, height)
+        tops = [height] * columns
+        for k in range(n):
+            column = k % columns
+            radius = rng.randint(15, 30)
+            ball = Body(Circle(radius), Body.Type.Dynamic)
+            ball.elasticity = 0.8
+            ball.set_mass(2 * math.pi * radius ** 2)
+            ball.position = Vec2(31 + column * 62 + rng.uniform(-1, 1), tops[column] - radius - 0.5)
+            tops[column] -= 2 * radius + 0.5
+            manager.add_body(ball)
+        return manager
+    return build
+
+
+def dense_field(n: int):
+    # small balls moving at random in a closed box, no friction and no sleep
+    def build(rng: random.Random) -> PhysicsManager:
+        manager = PhysicsManager(headless=True)
+        manager.allow_sleep = False
+        size = math.sqrt(n) * 25
+        walls(manager, size, size, 1.0)
+        ceiling = Body(Edge(Vec2(size, 0)), Body.Type.Static)
+        ceiling.elasticity = 1.0
+        manager.add_body(ceiling)
+        for k in range(n):
+            ball = Body(Circle(5), Body.Type.Dynamic)
+            ball.elasticity = 1.0
+            ball.position = Vec2(rng.uniform(6, size - 6), rng.uniform(6, size - 6))
+            angle = rng.uniform(0, 2 * math.pi)
+            ball.linear_velocity = Vec2(math.cos(angle), math.sin(angle)) * 100
+            manager.add_body(ball)
+        return manager
+    return build
+
+
+scenarios = [
+    Scenario('snooker_break', snooker_break, 600),
+    Scenario('snooker_idle', snooker_idle, 600),
+    Scenario('pile_100', gravity_pile(100), 120),
+    Scenario('pile_1000', gravity_pile(1000), 120),
+    Scenario('pile_5000', gravity_pile(5000), 120),
+    Scenario('dense_field', dense_field(1000), 120),
+]
+
+
+def scaling(results: [BenchmarkResult], prefix: str = 'pile_') -> [(int, float, float)]:
+    # (bodies, ms/tick, exponent against the previous size), cost ~ bodies ** exponent
+    curve = sorted((result.bodies, result.ms_per_tick) for result in results if result.name.startswith(prefix))
+    points = []
+    for i, (bodies, ms) in enumerate(curve):
+        exponent = None
+        if i > 0 and ms > 0 and curve[i - 1][1] > 0:
+            exponent = math.log(ms / curve[i - 1][1]) / math.log(bodies / curve[i - 1][0])
+        points.append((bodies, ms, exponent))
+    return points
+
+
+def compare(results: [BenchmarkResult], baseline: dict, tolerance: float, slack: float = 0.1, counter_tolerance: float = 0.05) -> [str]:
+    """
+    Regressions against a saved baseline. Pairs tested and contacts resolved are the
+    same every run of a seed, they are held to counter_tolerance, enough for a change
+    in rounding, and fail on any machine. Time per tick depends on the machine and the
+    load, results are the fastest of some runs and get the wider tolerance.
+    Slack is an absolute margin on top of the tolerance, sub millisecond ticks are mostly noise.
+    """
+    failures = []
+    for result in results:
+        base = baseline['scenarios'].get(result.name)
+        if base is None or base['ticks'] != result.ticks:
+            # per tick averages of another number of ticks are another measurement
+            continue
+        for key, allowed in (('ms_per_tick', tolerance), ('pairs_per_tick', counter_tolerance), ('contacts_per_tick', counter_tolerance)):
+            limit = base[key] * (1 + allowed)
+            value = getattr(result, key)
+            if value > limit + slack:
+                failures.append(f'{result.name} {key} {value:.3f} > {base[key]:.3f} + {allowed:.0%}')
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='headless physics benchmarks')
+    parser.add_argument('names', nargs='*', help='scenarios to run, all by default')
+    parser.add_argument('--list', action='store_true', help='list the scenarios')
+    parser.add_argument('--ticks', type=float, default=1.0, help='scale the ticks of every scenario')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help='json file to compare against, exits 1 on a regression')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every scenario, the fastest is kept')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed slowdown over the baseline')
+    parser.add_argument('--counter-tolerance', type=float, default=0.05, help='allowed increase of pairs and contacts per tick')
+    parser.add_argument('--slack', type=float, default=0.1, help='absolute margin over the tolerance, ms or pairs per tick')
+    parser.add_argument('--save', help='write the results as a new baseline')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for scenario in scenarios:
+            print(scenario.name, scenario.ticks)
+        return 0
+    selected = [scenario for scenario in scenarios if not args.names or scenario.name in args.names]
+    unknown = set(args.names) - set(scenario.name for scenario in scenarios)
+    if unknown:
+        parser.error(f'unknown scenario {", ".join(sorted(unknown))}')
+
+    print(BenchmarkResult.header)
+    results = []
+    for scenario in selected:
+        ticks = max(int(scenario.ticks * args.ticks), 1)
+        # one slow run is noise, the fastest is what the code can do
+        runs = [scenario.run(args.seed, ticks) for i in range(max(args.repeat, 1))]
+        result = min(runs, key=lambda run: run.ms_per_tick)
+        results.append(result)
+        print(result, flush=True)
+
+    curve = scaling(results)
+    if len(curve) > 1:
+        print('\npile scaling')
+        for bodies, ms, exponent in curve:
+            print(f'{bodies:>6} {ms:>9.3f} ms' + (f'  ~n^{exponent:.2f}' if exponent is not None else ''))
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'seed': args.seed, 'repeat': args.repeat,
+                       'scenarios': {result.name: result.to_dict() for result in results}}, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        failures = compare(results, baseline, args.tolerance, args.slack, args.counter_tolerance)
+        for failure in failures:
+            print('REGRESSION', failure)
+        if failures:
+            return 1
+        compared = [result.name for result in results if baseline['scenarios'].get(result.name, {}).get('ticks') == result.ticks]
+        print(f'no regression against {args.baseline} in {", ".join(compared) if compared else "no scenario, ticks differ"}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,7 @@
 from .common import *
 from .illuminant import *
 from .material import *
-from .core import *
\ No newline at end of file
+from .core import *
+from .cache import *
+from .deferred import *
+from .layers import *
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+from lighting.core import LightingManager
+
+
+class IlluminationCache():
+    """
+    Least recently used cache of lit textures. Keys are built by the caller,
+    usually (material, quantized position, zoom), a miss computes the exact
+    texture and stores it for the whole quantum. Entries are dropped when the
+    lights of the lighting manager change (LightingManager.version).
+    """
+    capacity: int
+    # world units per position step of a key
+    quantum: float
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, lighting: LightingManager, capacity: int = 512, quantum: float = 1.0):
+        if capacity < 1:
+            raise Exception('cache capacity must be at least 1')
+        self.lighting = lighting
+        self.capacity = capacity
+        self.quantum = quantum
+        self._entries = OrderedDict()
+        self._version = lighting.version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def quantize(self, x: float, y: float) -> (int, int):
+        return (round(x / self.quantum), round(y / self.quantum))
+
+    def clear(self):
+        self._entries.clear()
+
+    def get(self, key):
+        if self._version != self.lighting.version:
+            self._version = self.lighting.version
+            self._entries.clear()
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        entries = self._entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, key, compute):
+        # cached value of key, compute() on a miss
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> str:
+        return f'illumination cache {len(self._entries)}/{self.capacity} hits {self.hits} misses {self.misses} ({self.hit_rate():.0%}) evicted {self.evictions}'
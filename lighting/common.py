@@ -40,7 +40,14 @@ def sphere_normal(image:np.ndarray) -> np.ndarray:
     normal_map[:,:,:][nan_mask] = 0
     return normal_map
 
-def Array_from_QImage(qimage: QImage) -> np.ndarray:
+def resample_nearest(image:np.ndarray, height, width) -> np.ndarray:
+    # nearest neighbour resize of the first two axes
+    rows = np.linspace(0, image.shape[0] - 1, height).round().astype(np.intp)
+    cols = np.linspace(0, image.shape[1] - 1, width).round().astype(np.intp)
+    return image[rows][:, cols]
+
+def Array_from_QImage(qimage: QImage, out: np.ndarray = None) -> np.ndarray:
+    # float32 (height, width, colors) pixels, converted once from the image memory, into out when given
     width = qimage.width()
     height = qimage.height()
     if qimage.hasAlphaChannel():
@@ -48,14 +55,31 @@ def Array_from_QImage(qimage: QImage) -> np.ndarray:
     else:
         colors = 3
     pixel_data = qimage.constBits()
-    image_array = np.frombuffer(pixel_data, dtype=np.uint8).reshape((height, width, colors)).astype(dtype=np.float32)
-    return image_array
+    pixels = np.frombuffer(pixel_data, dtype=np.uint8).reshape((height, width, colors))
+    if out is None:
+        out = np.empty(pixels.shape, dtype=np.float32)
+    np.copyto(out, pixels)
+    return out
+
+def Array_view_of_QImage(qimage: QImage) -> np.ndarray:
+    # writable (height, width, 4) uint8 view of the pixels of an ARGB32 image, valid while qimage lives
+    if qimage.format() not in (QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied, QImage.Format_RGB32):
+        raise Exception("image view needs a 32 bit image, format: ", qimage.format())
+    width = qimage.width()
+    height = qimage.height()
+    pixel_data = qimage.bits()
+    return np.frombuffer(pixel_data, dtype=np.uint8).reshape((height, qimage.bytesPerLine()))[:, :width * 4].reshape((height, width, 4))
 
 def QImage_from_Array(image_array: np.ndarray) -> QImage:
+    # the image owns its pixels, a missing alpha is opaque
     height, width = image_array.shape[:2]
-    image_array = image_array.astype(dtype=np.uint8)
+    qimage = QImage(width, height, QImage.Format_ARGB32)
+    pixels = Array_view_of_QImage(qimage)
     colors = image_array.shape[2]
-    return QImage(image_array.data, width, height, width * colors, QImage.Format_ARGB32)
+    np.copyto(pixels[:, :, :colors], image_array, casting='unsafe')
+    if colors == 3:
+        pixels[:, :, 3] = 255
+    return qimage
 
 def Array_from_QVector3D(vector: QVector3D) -> np.ndarray:
     return np.array(vector.toTuple())
@@ -1,6 +1,64 @@
 import numpy as np
 from lighting.illuminant import *
 from lighting.material import *
+
+
+def _per_channel(ufunc, a, b, out):
+    # ufunc into (H, W, 3) out, a and b are (H, W, 3), (H, W) or (3,) for b,
+    # a strided pass per channel beats broadcasting over the last axis of 3
+    for k in range(3):
+        ufunc(a if a.ndim == 2 else a[:, :, k], b if b.ndim == 2 else b[k], out=out[:, :, k])
+
+
+def _dot(a, b, out, temp):
+    # sum over the last axis of (H, W, 3) a times b, per channel as well
+    np.multiply(a[:, :, 0], b[:, :, 0], out=out)
+    for k in (1, 2):
+        np.multiply(a[:, :, k], b[:, :, k], out=temp)
+        out += temp
+
+
+class _Scratch():
+    """float32 buffers for lighting one surface size, reused by every relight of it"""
+    def __init__(self, size):
+        height, width = size
+        self.diffuse = np.empty((height, width, 3), dtype=np.float32)
+        self.specular = np.empty((height, width, 3), dtype=np.float32)
+        self.vector = np.empty((height, width, 3), dtype=np.float32)
+        self.reflection = np.empty((height, width, 3), dtype=np.float32)
+        self.color = np.empty((height, width, 3), dtype=np.float32)
+        self.distance = np.empty((height, width), dtype=np.float32)
+        self.intensity = np.empty((height, width), dtype=np.float32)
+        self.n_l = np.empty((height, width), dtype=np.float32)
+        self.phong = np.empty((height, width), dtype=np.float32)
+        self.temp = np.empty((height, width), dtype=np.float32)
+
+    def view(self, region) -> '_Scratch':
+        # the same buffers cut to region, (rows, cols) slices
+        view = _Scratch.__new__(_Scratch)
+        for name, buffer in vars(self).items():
+            setattr(view, name, buffer[region])
+        return view
+
+
+class _Batch():
+    """
+    Materials of an illuminate_batch stacked as one tall surface, N blocks of H rows,
+    with their scratch buffers. Grows to the largest batch, smaller ones use the top rows.
+    """
+    def __init__(self, size, capacity):
+        height, width = size
+        rows = height * capacity
+        self.capacity = capacity
+        self.scratch = _Scratch((rows, width))
+        self.diffuse = np.empty((rows, width, 3), dtype=np.float32)
+        self.alpha = np.empty((rows, width, 1), dtype=np.float32)
+        self.normal = np.empty((rows, width, 3), dtype=np.float32)
+        self.flat = np.empty((rows, width), dtype=bool)
+        self.smoothness = np.empty((rows, width, 1), dtype=np.float32)
+        self.metalness = np.empty((rows, width), dtype=np.float32)
+
+
 class LightingManager():
     lighting_list: [LightSource]
     ambient_intensity: float
@@ -9,20 +67,35 @@ class LightingManager():
     f_b = 0.01
     f_c = 1
     k_glossy = 1
+    # illuminate_into and illuminate_gbuffer cut a spot to the rectangle around the tiles where it adds
+    # more than this to the intensity, about a colour step of a white surface, 0 lights every pixel
+    cull_threshold = 1 / 255
+    tile_size = 32
     def __init__(self):
         pass
         self.lighting_list = []
         self.ambient_intensity = 0.1
         self.ambient_color = np.array([1,1,1])
         self.view = np.array([0,0,1])
+        # bumped on every change of the lights, cached textures older than it are stale
+        self.version = 0
+        # scratch buffers of illuminate_into by surface size
+        self._scratch = {}
+        # _Batch of illuminate_batch by surface size
+        self._batches = {}
     
+    def changed(self):
+        # call after editing a light source or the ambient in place
+        self.version += 1
 
     def add_light_source(self, source):
         self.lighting_list.append(source)
+        self.changed()
 
     def set_color(self, color):
         if isinstance(color, QColor):
             self.ambient_color = np.array((color.redF(), color.greenF(), color.blueF()))
+            self.changed()
 
     def illuminate(self, surface, material:Material, transform:np.ndarray=None)->np.ndarray:
         if surface.shape[:2] != material.diffuse_map.shape[:2]:
@@ -84,3 +157,242 @@ class LightingManager():
         specular = material.smoothness * I_specular * 255
         illuminated = np.minimum(diffuse + ambient + specular, 255)
         return np.concatenate((illuminated, material.alpha_map), axis=-1)
+
+    def _light_frame(self, source, transform) -> (np.ndarray, np.ndarray, np.ndarray):
+        # position, direction and color of source in the frame of the surface, float32
+        color = source.color.astype(np.float32)
+        position = source.position.astype(np.float32)
+        direction = source.direction.astype(np.float32)
+        if transform is not None:
+            position[:2] = (transform @ np.array([source.position[0], source.position[1], 1]))[:2]
+            direction[:2] = (transform @ np.array([source.direction[0], source.direction[1], 0]))[:2]
+        return position, direction, color
+
+    def illuminate_into(self, surface, material:Material, out:np.ndarray, transform:np.ndarray=None)->np.ndarray:
+        """
+        Same lighting as illuminate, written into out, an (H, W, 4) array such as the
+        pixels of a QImage from Array_view_of_QImage. Runs in float32 in place on
+        scratch buffers kept per surface size, nothing is allocated per pixel.
+        """
+        size = material.diffuse_map.shape[:2]
+        if surface.shape[:2] != size or out.shape[:2] != size:
+            raise Exception("currently not support resample, surface: ", surface.shape[:2], "out: ", out.shape[:2], "diffuse_map: ", size)
+        return self._shade(surface, material.diffuse_map, material.alpha_map, material.normal_map,
+                           material.smoothness, material.metalness, out, transform)
+
+    def illuminate_gbuffer(self, gbuffer, out:np.ndarray)->np.ndarray:
+        """
+        Light every pixel of a GBuffer into out, (height, width, 4), in one pass
+        with the materials stored per pixel.
+        """
+        if out.shape[:2] != gbuffer.albedo.shape[:2]:
+            raise Exception("out ", out.shape[:2], " does not match gbuffer ", gbuffer.albedo.shape[:2])
+        return self._shade(gbuffer.position, gbuffer.albedo, gbuffer.alpha, gbuffer.normal,
+                           gbuffer.smoothness, gbuffer.metalness, out, flat=gbuffer.flat)
+
+    def _tiles(self, surface) -> (np.ndarray, np.ndarray):
+        # per tile of tile_size pixels the box of the surface points in it, (rows, cols, 3) lower and upper
+        size = self.tile_size
+        rows = np.arange(0, surface.shape[0], size)
+        cols = np.arange(0, surface.shape[1], size)
+        lower = np.minimum.reduceat(np.minimum.reduceat(surface, rows, axis=0), cols, axis=1)
+        upper = np.maximum.reduceat(np.maximum.reduceat(surface, rows, axis=0), cols, axis=1)
+        return lower, upper
+
+    def _light_scissor(self, source, position, direction, tiles) -> tuple:
+        """
+        Scissor rectangle of a spot, (rows, cols) slices of the surface around
+        every tile it reaches with more than cull_threshold of intensity, None if
+        it reaches none. One rectangle per light, not a light list per tile: tiles
+        inside it the spot doesn't reach are shaded as well, they gain under the
+        threshold. The bound takes the nearest point of a tile for the attenuation
+        and the widest angle to it for the spread, lambert and phong are at most 1.
+        """
+        if tiles is None or source.type != LightSource.Type.Spot:
+            return (slice(None), slice(None))
+        lower, upper = tiles
+        nearest = np.clip(position, lower, upper) - position
+        distance = np.sqrt(np.sum(nearest**2, axis=-1))
+        reach = source.intensity / (self.f_a * distance**2 + self.f_b * distance + self.f_c)
+        # largest cos between direction and a point of the tile
+        toward = np.sum(np.maximum((lower - position) * direction, (upper - position) * direction), axis=-1)
+        cos = np.divide(toward, distance, out=np.ones_like(distance), where=distance > 0)
+        reach *= np.clip(cos, 0, 1) ** source.spread
+        reached = reach > self.cull_threshold
+        rows = np.flatnonzero(reached.any(axis=1))
+        if not len(rows):
+            return None
+        cols = np.flatnonzero(reached.any(axis=0))
+        size = self.tile_size
+        return (slice(rows[0] * size, (rows[-1] + 1) * size), slice(cols[0] * size, (cols[-1] + 1) * size))
+
+    def _shade(self, surface, diffuse_map, alpha_map, normal_map, smoothness, metalness, out, transform=None, flat=None, scratch=None)->np.ndarray:
+        # smoothness (H, W, 1) and metalness (H, W) may be per pixel, flat pixels are lit as without normal map
+        size = diffuse_map.shape[:2]
+        if scratch is None:
+            scratch = self._scratch.get(size)
+            if scratch is None:
+                scratch = self._scratch[size] = _Scratch(size)
+        I_diffuse = scratch.diffuse
+        I_specular = scratch.specular
+        I_diffuse.fill(0)
+        I_specular.fill(0)
+        # a surface within one tile is lit whole, bounding it costs more than it saves
+        tiles = None
+        if self.cull_threshold > 0 and max(size) > self.tile_size:
+            tiles = self._tiles(surface)
+        for source in self.lighting_list:
+            source_pos, source_drt, source_color = self._light_frame(source, transform)
+            region = self._light_scissor(source, source_pos, source_drt, tiles)
+            if region is None:
+                continue
+            # everything below works on the part of the surface the light reaches
+            buffers = scratch.view(region)
+            self._light_terms(source, source_pos, source_drt, surface[region],
+                              None if normal_map is None else normal_map[region],
+                              metalness[region] if isinstance(metalness, np.ndarray) else metalness,
+                              None if flat is None else flat[region], buffers)
+            weight = source_color * source.intensity
+            _per_channel(np.multiply, buffers.n_l, weight, buffers.color)
+            buffers.diffuse += buffers.color
+            _per_channel(np.multiply, buffers.phong, weight, buffers.color)
+            buffers.specular += buffers.color
+        return self._compose(I_diffuse, I_specular, diffuse_map, alpha_map, smoothness, out, scratch.color)
+
+    def _light_terms(self, source, source_pos, source_drt, surface, normal_map, metalness, flat, buffers):
+        """
+        Diffuse and specular term of one light source per pixel, for intensity 1
+        and white light, into buffers.n_l and buffers.phong. The arrays cover the
+        same part of the surface, source_pos and source_drt are in its frame.
+        """
+        vector = buffers.vector
+        reflection = buffers.reflection
+        distance = buffers.distance
+        intensity = buffers.intensity
+        n_l = buffers.n_l
+        phong = buffers.phong
+        temp = buffers.temp
+        match source.type:
+            case LightSource.Type.Parallel:
+                intensity.fill(1)
+                if normal_map is not None:
+                    np.matmul(normal_map, -source_drt, out=n_l)
+                    _per_channel(np.multiply, normal_map, n_l, reflection)
+                    reflection *= 2
+                    reflection += source_drt
+
+            case LightSource.Type.Spot:
+                _per_channel(np.subtract, surface, source_pos, vector)
+                _dot(vector, vector, distance, temp)
+                np.sqrt(distance, out=distance)
+                _per_channel(np.divide, vector, distance, vector)
+                # 1 / (f_a d^2 + f_b d + f_c)
+                np.multiply(distance, self.f_a, out=intensity)
+                intensity += self.f_b
+                intensity *= distance
+                intensity += self.f_c
+                np.reciprocal(intensity, out=intensity)
+                np.matmul(vector, source_drt, out=n_l)
+                np.power(n_l, source.spread, out=n_l)
+                intensity *= n_l
+                if normal_map is not None:
+                    _dot(normal_map, vector, n_l, temp)
+                    np.negative(n_l, out=n_l)
+                    _per_channel(np.multiply, normal_map, n_l, reflection)
+                    reflection *= 2
+                    reflection += vector
+
+        if normal_map is not None:
+            np.maximum(reflection, 0, out=reflection)
+            np.matmul(reflection, self.view.astype(np.float32), out=phong)
+            np.power(phong, metalness, out=phong)
+            np.maximum(n_l, 0, out=n_l)
+            if flat is not None:
+                np.copyto(phong, 1, where=flat)
+                np.copyto(n_l, 1, where=flat)
+            n_l *= intensity
+            phong *= intensity
+        else:
+            np.copyto(n_l, intensity)
+            np.copyto(phong, intensity)
+        phong *= self.k_glossy
+
+    def _compose(self, I_diffuse, I_specular, diffuse_map, alpha_map, smoothness, out, temp)->np.ndarray:
+        # light sums to pixels, I_diffuse and I_specular are overwritten
+        I_diffuse *= diffuse_map
+        np.multiply(diffuse_map, (self.ambient_color * self.ambient_intensity).astype(np.float32), out=temp)
+        I_diffuse += temp
+        I_specular *= smoothness
+        I_specular *= 255
+        I_diffuse += I_specular
+        np.minimum(I_diffuse, 255, out=I_diffuse)
+        if isinstance(out, np.ndarray):
+            np.copyto(out[:, :, :3], I_diffuse, casting='unsafe')
+            np.copyto(out[:, :, 3:], alpha_map, casting='unsafe')
+            return out
+        # a list of images, one per block of rows
+        height = len(I_diffuse) // len(out)
+        for k, image in enumerate(out):
+            rows = slice(k * height, (k + 1) * height)
+            np.copyto(image[:, :, :3], I_diffuse[rows], casting='unsafe')
+            np.copyto(image[:, :, 3:], alpha_map[rows], casting='unsafe')
+        return out
+
+    def illuminate_batch(self, surfaces: np.ndarray, materials: [Material], out=None):
+        """
+        Light N surfaces of the same size in one pass, surfaces shaped (N, H, W, 3)
+        with one material each. Same as illuminate on every surface without
+        transform. The surfaces are lit as one tall surface in float32 on buffers
+        kept per size, into out: (N, H, W, 4) or a list of N (H, W, 4) arrays such
+        as the pixels of QImages from Array_view_of_QImage. A float32 array is
+        returned when out is None.
+        """
+        n = len(materials)
+        if surfaces.ndim != 4 or surfaces.shape[0] != n:
+            raise Exception("surfaces must be shaped (N, H, W, 3) with one material each, surfaces: ", surfaces.shape, "materials: ", n)
+        size = surfaces.shape[1:3]
+        for material in materials:
+            if material.diffuse_map.shape[:2] != size:
+                raise Exception("currently not support resample, surface: ", size, "diffuse_map: ", material.diffuse_map.shape[:2])
+        if out is None:
+            out = np.empty(surfaces.shape[:3] + (4,), dtype=np.float32)
+        if n == 0:
+            return out
+        batch = self._batches.get(size)
+        if batch is None or batch.capacity < n:
+            batch = self._batches[size] = _Batch(size, max(n, 2 * batch.capacity if batch else 8))
+        height, width = size
+        rows = n * height
+        diffuse = batch.diffuse[:rows]
+        alpha = batch.alpha[:rows]
+        normal = batch.normal[:rows]
+        flat = batch.flat[:rows]
+        for k, material in enumerate(materials):
+            block = slice(k * height, (k + 1) * height)
+            np.copyto(diffuse[block], material.diffuse_map)
+            np.copyto(alpha[block], material.alpha_map)
+            if material.normal_map is None:
+                # lit flat, lambert and phong of 1
+                normal[block] = 0
+                flat[block] = True
+            else:
+                np.copyto(normal[block], material.normal_map)
+                flat[block] = False
+        # smoothness and metalness stay scalars while the materials agree
+        smoothness = materials[0].smoothness
+        metalness = materials[0].metalness
+        if any(material.smoothness != smoothness for material in materials):
+            smoothness = batch.smoothness[:rows]
+            for k, material in enumerate(materials):
+                smoothness[k * height:(k + 1) * height] = material.smoothness
+        if any(material.metalness != metalness for material in materials):
+            metalness = batch.metalness[:rows]
+            for k, material in enumerate(materials):
+                metalness[k * height:(k + 1) * height] = material.metalness
+        target = out
+        if isinstance(out, np.ndarray):
+            # a reshape of a strided out would be a copy, it is written image by image then
+            target = out.reshape(rows, width, 4) if out.flags.c_contiguous else list(out)
+        self._shade(surfaces.reshape(rows, width, 3), diffuse, alpha, normal, smoothness, metalness, target,
+                    flat=flat if flat.any() else None, scratch=batch.scratch.view((slice(0, rows), slice(None))))
+        return out
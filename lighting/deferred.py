@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class GBuffer():
+    """
+    Surface attributes per screen pixel: albedo, normal, world position, alpha and
+    the smoothness and metalness of the material. Objects are composited in draw
+    order, each covering the pixels where its alpha is not 0, then
+    LightingManager.illuminate_gbuffer lights all of them in one pass. Pixels
+    composited without normal are flat, lit like a material without normal map.
+    Static objects go into the background once, clear() restores it every frame.
+    """
+    width: int
+    height: int
+    albedo: np.ndarray
+    normal: np.ndarray
+    position: np.ndarray
+    alpha: np.ndarray
+    smoothness: np.ndarray
+    metalness: np.ndarray
+    flat: np.ndarray
+
+    def __init__(self, width: int, height: int):
+        self.width = 0
+        self.height = 0
+        self.resize(width, height)
+
+    def resize(self, width: int, height: int):
+        if (width, height) == (self.width, self.height):
+            return
+        self.width = width
+        self.height = height
+        self.albedo = np.zeros((height, width, 3), dtype=np.float32)
+        self.normal = np.zeros((height, width, 3), dtype=np.float32)
+        self.position = np.zeros((height, width, 3), dtype=np.float32)
+        self.alpha = np.zeros((height, width, 1), dtype=np.float32)
+        self.smoothness = np.zeros((height, width, 1), dtype=np.float32)
+        self.metalness = np.ones((height, width), dtype=np.float32)
+        self.flat = np.ones((height, width), dtype=bool)
+        self._background = None
+
+    def _layers(self) -> tuple:
+        return (self.albedo, self.normal, self.position, self.alpha, self.smoothness, self.metalness, self.flat)
+
+    def set_background(self):
+        # what was composited so far stays, clear() goes back to it
+        self._background = tuple(layer.copy() for layer in self._layers())
+
+    def clear_background(self):
+        self._background = None
+
+    def clear(self):
+        if self._background is not None:
+            for layer, background in zip(self._layers(), self._background):
+                np.copyto(layer, background)
+            return
+        self.albedo.fill(0)
+        self.normal.fill(0)
+        self.position.fill(0)
+        self.alpha.fill(0)
+        self.smoothness.fill(0)
+        self.metalness.fill(1)
+        self.flat.fill(True)
+
+    def composite(self, x: int, y: int, position: np.ndarray, albedo: np.ndarray, alpha: np.ndarray,
+                  normal: np.ndarray = None, smoothness: float = 0, metalness: float = 1):
+        """
+        Draw a patch with its top left pixel at x, y, clipped to the buffer.
+        position, albedo and normal are (h, w, 3), alpha (h, w, 1).
+        """
+        h, w = position.shape[:2]
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self.width)
+        y1 = min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        patch = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        screen = (slice(y0, y1), slice(x0, x1))
+        mask = alpha[patch][:, :, 0] > 0
+        mask3 = mask[:, :, np.newaxis]
+        np.copyto(self.position[screen], position[patch], where=mask3)
+        np.copyto(self.albedo[screen], albedo[patch], where=mask3)
+        np.copyto(self.alpha[screen], alpha[patch], where=mask3)
+        np.copyto(self.smoothness[screen], smoothness, where=mask3)
+        np.copyto(self.metalness[screen], metalness, where=mask)
+        np.copyto(self.normal[screen], 0 if normal is None else normal[patch], where=mask3)
+        np.copyto(self.flat[screen], normal is None, where=mask)
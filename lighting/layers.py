@@ -0,0 +1,86 @@
+import numpy as np
+from lighting.core import LightingManager, _Scratch
+from lighting.material import Material
+
+
+class LightLayers():
+    """
+    Lighting of a static surface kept per light source, as the diffuse and specular
+    term of each light for intensity 1 and white light. Changing the intensity or
+    color of a light or the ambient only weights and sums the layers again, a light
+    that moved, turned or changed its spread is recomputed alone.
+    Layers cover the whole surface, the culling of the lighting manager depends
+    on the intensity and is not used here.
+    """
+    lighting: LightingManager
+    surface: np.ndarray
+    material: Material
+    # layers computed since creation, to see what a change cost
+    recomputed: int
+
+    def __init__(self, lighting: LightingManager, surface: np.ndarray, material: Material, transform: np.ndarray = None):
+        size = material.diffuse_map.shape[:2]
+        if surface.shape[:2] != size:
+            raise Exception("currently not support resample, surface: ", surface.shape[:2], "diffuse_map: ", size)
+        self.lighting = lighting
+        self.surface = np.ascontiguousarray(surface, dtype=np.float32)
+        self.material = material
+        self.transform = transform
+        self.recomputed = 0
+        self._scratch = _Scratch(size)
+        # light source to (geometry it was computed for, diffuse layer, specular layer)
+        self._layers = {}
+
+    def _geometry(self, source) -> tuple:
+        # everything a layer depends on besides intensity and color
+        lighting = self.lighting
+        return (source.type, tuple(source.position.tolist()), tuple(source.direction.tolist()), source.spread,
+                lighting.f_a, lighting.f_b, lighting.f_c, lighting.k_glossy, tuple(lighting.view.tolist()))
+
+    def layer(self, source) -> (np.ndarray, np.ndarray):
+        # diffuse and specular layer of source, (H, W) each, recomputed if its geometry changed
+        geometry = self._geometry(source)
+        cached = self._layers.get(source)
+        if cached is not None and cached[0] == geometry:
+            return cached[1], cached[2]
+        lighting = self.lighting
+        material = self.material
+        scratch = self._scratch
+        source_pos, source_drt, _ = lighting._light_frame(source, self.transform)
+        lighting._light_terms(source, source_pos, source_drt, self.surface, material.normal_map,
+                              material.metalness, None, scratch)
+        diffuse = scratch.n_l.copy()
+        specular = scratch.phong.copy()
+        self._layers[source] = (geometry, diffuse, specular)
+        self.recomputed += 1
+        return diffuse, specular
+
+    def refresh(self):
+        # compute stale layers and drop those of removed lights
+        sources = self.lighting.lighting_list
+        for source in list(self._layers):
+            if source not in sources:
+                del self._layers[source]
+        for source in sources:
+            self.layer(source)
+
+    def illuminate_into(self, out: np.ndarray) -> np.ndarray:
+        """Weighted sum of the layers with the current intensities and colors into out, (H, W, 4)."""
+        self.refresh()
+        scratch = self._scratch
+        I_diffuse = scratch.diffuse
+        I_specular = scratch.specular
+        temp = scratch.temp
+        I_diffuse.fill(0)
+        I_specular.fill(0)
+        for source in self.lighting.lighting_list:
+            diffuse, specular = self.layer(source)
+            weight = source.color.astype(np.float32) * source.intensity
+            for k in range(3):
+                np.multiply(diffuse, weight[k], out=temp)
+                I_diffuse[:, :, k] += temp
+                np.multiply(specular, weight[k], out=temp)
+                I_specular[:, :, k] += temp
+        material = self.material
+        return self.lighting._compose(I_diffuse, I_specular, material.diffuse_map, material.alpha_map,
+                                      material.smoothness, out, scratch.color)
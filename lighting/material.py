@@ -15,11 +15,12 @@ class Material():
         self.smoothness = 0
         self.metalness = 1
     def set_diffuse_map(self, _map: np.ndarray):
-        self.diffuse_map = _map[:,:,:3]
+        # float32 maps, lighting runs in float32
+        self.diffuse_map = np.ascontiguousarray(_map[:,:,:3], dtype=np.float32)
         if _map.shape[2] == 4:
-            self.alpha_map = _map[:,:,-1][:,:,np.newaxis]
+            self.alpha_map = np.ascontiguousarray(_map[:,:,-1][:,:,np.newaxis], dtype=np.float32)
         else:
-            self.alpha_map = np.ones((_map.shape[0], _map.shape[1], 1))
+            self.alpha_map = np.ones((_map.shape[0], _map.shape[1], 1), dtype=np.float32)
         if not self._width:
             self._width, self._height = _map.shape[:2]
         elif _map.shape[:2] != (self._width, self._height):
@@ -27,7 +28,7 @@ class Material():
 
 
     def set_normal_map(self, _map: np.ndarray):
-        self.normal_map = _map
+        self.normal_map = np.ascontiguousarray(_map, dtype=np.float32)
         if self._width:
             self._width, self._height = _map.shape[:2]
         elif _map.shape[:2] != (self._width, self._height):
@@ -1,6 +1,20 @@
 from .common import *
 from .shape import Shape,Circle,Edge
 from .body import Body
-from .contact import Contact
+from .island import Island
+from .registry import BodyRegistry
+from .simulation import BodyState, StepStats, SimulationResult, Snapshot
+from .stats import PhysicsStats
+from .body_array import BodyArray, BodyView
+from .contact import Contact, time_of_impact
+from .contact_cache import ContactCache, Manifold
+from .batch_contact import color_pairs, solve_circle_pairs
+from .broadphase import Broadphase, BruteForce, SweepAndPrune, CellIndex, body_bounds
+from .static_index import StaticIndex
+from .query import RayHit
 from .collision_grid import *
 from .core import *
+from .ccd import PhysicsManager_CCD
+from .event_engine import PhysicsManager_Event, Trajectory, Event
+from .worker import PhysicsWorker
+from .replay import ReplayRecorder, ReplayPlayer, ReplayFrame
@@ -0,0 +1,118 @@
+import numpy as np
+from physics.common import *
+from physics.body_array import BodyArray
+
+
+def color_pairs(index_a: np.ndarray, index_b: np.ndarray, body_count: int) -> [np.ndarray]:
+    """
+    Split pairs into batches in which no body appears twice. A batch takes every
+    pair that is the first remaining pair of both of its bodies, so each body sees
+    its pairs in the original order, as the sequential resolve does.
+    Returns a list of positions into index_a / index_b, batches keep the pair order.
+    """
+    batches = []
+    remaining = np.arange(len(index_a))
+    while len(remaining):
+        a = index_a[remaining]
+        b = index_b[remaining]
+        order = np.arange(len(remaining))
+        first = np.full(body_count, len(remaining))
+        np.minimum.at(first, a, order)
+        np.minimum.at(first, b, order)
+        taken = (first[a] == order) & (first[b] == order)
+        batches.append(remaining[taken])
+        remaining = remaining[~taken]
+    return batches
+
+
+def solve_circle_pairs(array: BodyArray, index_a: np.ndarray, index_b: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Narrowphase and impulse resolve of circle pairs stored in a BodyArray, the same
+    impulses as Contact.resolve, one batch of independent contacts at a time.
+    Every body sees its contacts in pair order, so this matches the sequential
+    resolve up to rounding: the arrays are float64 while Body keeps float32 vectors,
+    after a full break the balls end within a few thousandths of a unit.
+    Returns the indices of the intersecting pairs, (touching_a, touching_b).
+    """
+    touching_a = []
+    touching_b = []
+    for batch in color_pairs(index_a, index_b, array.count):
+        a = index_a[batch]
+        b = index_b[batch]
+        a_b = array.position[b] - array.position[a]
+        lengthSquare = np.einsum('ij,ij->i', a_b, a_b)
+        radius_a = array.radius[a]
+        radius_b = array.radius[b]
+        intersect = (lengthSquare <= (radius_a + radius_b) ** 2) & (lengthSquare > eps)
+        if not intersect.any():
+            continue
+        a = a[intersect]
+        b = b[intersect]
+        a_b = a_b[intersect]
+        radius_a = radius_a[intersect]
+        radius_b = radius_b[intersect]
+        touching_a.append(a)
+        touching_b.append(b)
+
+        normal = a_b / np.sqrt(lengthSquare[intersect])[:, np.newaxis]
+        nx = normal[:, 0]
+        ny = normal[:, 1]
+        # contact points relative to the centers
+        rax = nx * radius_a
+        ray = ny * radius_a
+        rbx = -nx * radius_b
+        rby = -ny * radius_b
+
+        inv_mass_a = array.inv_mass[a]
+        inv_mass_b = array.inv_mass[b]
+        inv_I_a = array.inv_I[a]
+        inv_I_b = array.inv_I[b]
+        sum_invMass = inv_mass_a + inv_mass_b
+        elasticity_AB = array.elasticity[a] * array.elasticity[b]
+        friction = array.friction[a] * array.friction[b]
+
+        angular_velocity_a = array.angle_velocity[a]
+        angular_velocity_b = array.angle_velocity[b]
+        vel_a_b = array.linear_velocity[a] - array.linear_velocity[b]
+        vx = vel_a_b[:, 0] - angular_velocity_a * ray + angular_velocity_b * rby
+        vy = vel_a_b[:, 1] + angular_velocity_a * rax - angular_velocity_b * rbx
+
+        # collision impulse
+        sa = inv_I_a * cross_xy(rax, ray, nx, ny)
+        sb = inv_I_b * cross_xy(rbx, rby, nx, ny)
+        angularFactor = (-sa * ray - sb * rby) * nx + (sa * rax + sb * rbx) * ny
+        impulse = (1.0 + elasticity_AB) * (vx * nx + vy * ny) / (sum_invMass + angularFactor)
+        jx = nx * impulse
+        jy = ny * impulse
+
+        # friction impulse, from the velocity before the collision impulse
+        vel_normal = vx * nx + vy * ny
+        tx = vx - nx * vel_normal
+        ty = vy - ny * vel_normal
+        tang_length = np.sqrt(tx * tx + ty * ty)
+        tang_length[tang_length == 0] = 1
+        ux = tx / tang_length
+        uy = ty / tang_length
+        sa = inv_I_a * cross_xy(rax, ray, ux, uy)
+        sb = inv_I_b * cross_xy(rbx, rby, ux, uy)
+        inv_inertia = (-sa * ray - sb * rby) * ux + (sa * rax + sb * rbx) * uy
+        friction_factor = friction / (sum_invMass + inv_inertia)
+        jx += tx * friction_factor
+        jy += ty * friction_factor
+
+        # bodies in a batch are distinct, the updates can be scattered at once
+        array.linear_velocity[a, 0] -= jx * inv_mass_a
+        array.linear_velocity[a, 1] -= jy * inv_mass_a
+        array.linear_velocity[b, 0] += jx * inv_mass_b
+        array.linear_velocity[b, 1] += jy * inv_mass_b
+        array.angle_velocity[a] = angular_velocity_a - inv_I_a * cross_xy(rax, ray, jx, jy)
+        array.angle_velocity[b] = angular_velocity_b + inv_I_b * cross_xy(rbx, rby, jx, jy)
+
+        # move collider out of both
+        depth = np.sqrt(lengthSquare[intersect]) - radius_a - radius_b
+        ds = normal * depth[:, np.newaxis]
+        array.position[a] += ds * (inv_mass_a / sum_invMass)[:, np.newaxis]
+        array.position[b] -= ds * (inv_mass_b / sum_invMass)[:, np.newaxis]
+    if not touching_a:
+        return index_a[:0], index_b[:0]
+    return np.concatenate(touching_a), np.concatenate(touching_b)
@@ -6,6 +6,10 @@ class Body(object):
     class Type(Enum):
         Static = 0
         Dynamic = 1
+
+    # no per body __dict__, _array and _index are only set on bodies bound to a BodyArray
+    __slots__ = ('_shape', '_invMass', '_invI', 'type', 'position', 'linear_velocity', 'angle', 'angle_velocity',
+                 'elasticity', 'friction', 'sleeping', 'sleep_time', 'island', '_array', '_index')
     
     _shape: Shape
     _invMass: float
@@ -17,6 +21,9 @@ class Body(object):
     angle_velocity: float
     elasticity: float
     friction: float
+    sleeping: bool
+    sleep_time: int
+    island: object
 
     def __init__(self, shape, type):
 
@@ -32,6 +39,10 @@ class Body(object):
         self.angle_velocity = 0.0
         self.elasticity = 0.9
         self.friction = 0.5
+        self.sleeping = False
+        # ticks at rest, managed by the physics manager
+        self.sleep_time = 0
+        self.island = None
 
         if self.type == Body.Type.Static:
             self._invMass = 0
@@ -51,6 +62,14 @@ class Body(object):
         # local to world
         return self.position + rotate_vec(self.shape.center_mass(), self.angle)
 
+    def center_xy(self) -> (float, float):
+        x, y = self.position.toTuple()
+        cx, cy = self._shape._center_mass.toTuple()
+        if cx == 0 and cy == 0:
+            return x, y
+        cx, cy = rotate_xy(cx, cy, self.angle)
+        return x + cx, y + cy
+
     def point_local_to_world(self, local_point: Vec2) -> Vec2:
         return self.position + rotate_vec(local_point, self.angle)
     
@@ -75,12 +94,21 @@ class Body(object):
     def invI(self) -> float:
         return self._invI
 
+    def wake(self):
+        if self.island is not None:
+            self.island.wake()
+        else:
+            self.sleeping = False
+            self.sleep_time = 0
+
     def applyImpulseLinear(self, impulse: Vec2):
         if self.type != Body.Type.Dynamic:
             return
         
         if 0 == self._invMass:
             return
+        if self.sleeping:
+            self.wake()
         self.linear_velocity += impulse * self._invMass
     
     def applyImpulseAngular(self, impulse: float):
@@ -89,18 +117,29 @@ class Body(object):
         
         if 0 == self._invMass:
             return
+        if self.sleeping:
+            self.wake()
         
         self.angle_velocity += self._invI * impulse
 
     def applyImpulse(self, impulse_point:Vec2, impulse: Vec2):
+        px, py = impulse_point.toTuple()
+        jx, jy = impulse.toTuple()
+        self.applyImpulseXY(px, py, jx, jy)
+
+    def applyImpulseXY(self, px: float, py: float, jx: float, jy: float):
+        # applyImpulse on plain floats, impulse (jx, jy) at world point (px, py)
         if self.type != Body.Type.Dynamic:
             return
         
         if 0 == self._invMass:
             return
-        self.linear_velocity += impulse * self._invMass
-        vec_ = impulse_point - self.center()
-        self.angle_velocity += self._invI * cross(vec_, impulse)
+        if self.sleeping:
+            self.wake()
+        vx, vy = self.linear_velocity.toTuple()
+        self.linear_velocity = Vec2(vx + jx * self._invMass, vy + jy * self._invMass)
+        cx, cy = self.center_xy()
+        self.angle_velocity += self._invI * cross_xy(px - cx, py - cy, jx, jy)
     
     def update(self, dt: float):
         self.position += self.linear_velocity * dt 
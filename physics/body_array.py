@@ -0,0 +1,183 @@
+import numpy as np
+from physics.common import *
+from physics.body import Body
+from physics.shape import Shape
+
+
+class BodyArray():
+    """
+    Contiguous storage of dynamic body state. Every bound body becomes a BodyView,
+    reading and writing its state straight from the arrays, so integration and
+    friction can run as one batched operation over all bodies.
+    """
+    capacity: int
+    count: int
+    bodies: [Body]
+    position: np.ndarray
+    linear_velocity: np.ndarray
+    angle: np.ndarray
+    angle_velocity: np.ndarray
+    inv_mass: np.ndarray
+    inv_I: np.ndarray
+    elasticity: np.ndarray
+    friction: np.ndarray
+    radius: np.ndarray
+    circle: np.ndarray
+
+    _columns = ('position', 'linear_velocity', 'angle', 'angle_velocity', 'inv_mass', 'inv_I', 'elasticity', 'friction', 'radius', 'circle')
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = max(int(capacity), 1)
+        self.count = 0
+        self.bodies = []
+        self.position = np.zeros((self.capacity, 2))
+        self.linear_velocity = np.zeros((self.capacity, 2))
+        self.angle = np.zeros(self.capacity)
+        self.angle_velocity = np.zeros(self.capacity)
+        self.inv_mass = np.zeros(self.capacity)
+        self.inv_I = np.zeros(self.capacity)
+        self.elasticity = np.zeros(self.capacity)
+        self.friction = np.zeros(self.capacity)
+        # bounding radius, used for broad checks
+        self.radius = np.zeros(self.capacity)
+        self.circle = np.zeros(self.capacity, dtype=bool)
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in self._columns:
+            old = getattr(self, name)
+            new = np.zeros((self.capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def bind(self, body: Body):
+        if body.type != Body.Type.Dynamic:
+            raise Exception("only dynamic body can be stored in body array")
+        if isinstance(body, BodyView):
+            raise Exception("body is already stored in a body array")
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        self.position[i] = body.position.toTuple()
+        self.linear_velocity[i] = body.linear_velocity.toTuple()
+        self.angle[i] = body.angle
+        self.angle_velocity[i] = body.angle_velocity
+        self.inv_mass[i] = body.invMass
+        self.inv_I[i] = body.invI
+        self.elasticity[i] = body.elasticity
+        self.friction[i] = body.friction
+        self.circle[i] = body.shapeType == Shape.Type.Circle
+        if self.circle[i]:
+            self.radius[i] = body.shape.radius
+        else:
+            self.radius[i] = body.shape.vec.length()
+
+        body.__class__ = BodyView
+        body._array = self
+        body._index = i
+        self.bodies.append(body)
+        self.count += 1
+
+    def unbind(self, body: Body):
+        if not isinstance(body, BodyView) or body._array is not self:
+            raise Exception("body is not stored in this body array")
+        i = body._index
+        position = body.position
+        linear_velocity = body.linear_velocity
+        angle = body.angle
+        angle_velocity = body.angle_velocity
+        invMass = body.invMass
+        invI = body.invI
+        elasticity = body.elasticity
+        friction = body.friction
+
+        # swap remove, the last body takes the free slot
+        last = self.count - 1
+        if i != last:
+            for name in self._columns:
+                column = getattr(self, name)
+                column[i] = column[last]
+            moved = self.bodies[last]
+            moved._index = i
+            self.bodies[i] = moved
+        self.bodies.pop()
+        self.count -= 1
+
+        body.__class__ = Body
+        body._array = None
+        body._index = -1
+        body.position = position
+        body.linear_velocity = linear_velocity
+        body.angle = angle
+        body.angle_velocity = angle_velocity
+        body._invMass = invMass
+        body._invI = invI
+        body.elasticity = elasticity
+        body.friction = friction
+
+    def integrate(self, dt: float, index: np.ndarray = None):
+        # all bodies, or only the rows in index
+        if index is None:
+            index = slice(0, self.count)
+        self.position[index] += self.linear_velocity[index] * dt
+        angle = self.angle[index] + self.angle_velocity[index] * dt
+        angle[angle > 2 * Pi] -= 2 * Pi
+        self.angle[index] = angle
+
+    def apply_friction(self, global_friction: float, dt: float, index: np.ndarray = None):
+        # same slow down effect as PhysicsManager.solve_movement, for all bodies or the rows in index at once
+        if index is None:
+            index = slice(0, self.count)
+        velocity = self.linear_velocity[index]
+        speed = np.sqrt(np.einsum('ij,ij->i', velocity, velocity))
+        moving = speed > 0
+        if moving.any():
+            v = velocity[moving]
+            unit = v / speed[moving, np.newaxis]
+            factor = (1 - global_friction * self.friction[index][moving]) * dt
+            v_after = v - factor[:, np.newaxis] * v - 3 * global_friction * dt * unit
+            stopped = np.einsum('ij,ij->i', v_after, v) <= 0
+            v_after[stopped] = 0
+            velocity[moving] = v_after
+            self.linear_velocity[index] = velocity
+
+        angle_velocity = self.angle_velocity[index]
+        angle_velocity_after = angle_velocity - np.sign(angle_velocity) * global_friction * dt
+        angle_velocity_after[angle_velocity_after * angle_velocity <= 0] = 0
+        self.angle_velocity[index] = angle_velocity_after
+
+
+def _vector_column(name):
+    def getter(self) -> Vec2:
+        x, y = getattr(self._array, name)[self._index]
+        return Vec2(x, y)
+    def setter(self, value: Vec2):
+        getattr(self._array, name)[self._index] = (value.x(), value.y())
+    return property(getter, setter)
+
+def _scalar_column(name):
+    def getter(self) -> float:
+        return float(getattr(self._array, name)[self._index])
+    def setter(self, value: float):
+        getattr(self._array, name)[self._index] = value
+    return property(getter, setter)
+
+
+class BodyView(Body):
+    """
+    A body whose state lives in a BodyArray. Bodies are switched to this class when
+    bound, so plain bodies keep their cheap attribute access.
+    Vectors read from a view are copies, assign them back to change the body.
+    """
+    __slots__ = ()
+    _array: BodyArray
+    _index: int
+
+    position = _vector_column('position')
+    linear_velocity = _vector_column('linear_velocity')
+    angle = _scalar_column('angle')
+    angle_velocity = _scalar_column('angle_velocity')
+    elasticity = _scalar_column('elasticity')
+    friction = _scalar_column('friction')
+    _invMass = _scalar_column('inv_mass')
+    _invI = _scalar_column('inv_I')
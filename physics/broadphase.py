@@ -0,0 +1,148 @@
+from abc import ABC, abstractmethod
+import numpy as np
+from physics.common import *
+from physics.body import Body
+from physics.shape import Shape
+
+
+def body_bounds(body: Body) -> tuple:
+    # axis aligned bounding box in world space, (min_x, min_y, max_x, max_y)
+    if body.shapeType == Shape.Type.Circle:
+        x, y = body.position.toTuple()
+        r = body.shape.radius
+        return (x - r, y - r, x + r, y + r)
+    x1, y1 = body.position.toTuple()
+    x2, y2 = body.point_local_to_world(body.shape.vec).toTuple()
+    return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+
+class Broadphase(ABC):
+    """
+    Finds the candidate pairs for the narrowphase. Bounds are given as an array
+    with rows of (min_x, min_y, max_x, max_y), pairs come back as two index arrays,
+    every overlapping pair only once.
+    Static bodies are not part of the broadphase, see StaticIndex.
+    """
+    _empty = np.zeros(0, dtype=np.intp)
+
+    @abstractmethod
+    def find_pairs(self, bounds: np.ndarray) -> (np.ndarray, np.ndarray):
+        pass
+
+
+class BruteForce(Broadphase):
+    def find_pairs(self, bounds: np.ndarray) -> (np.ndarray, np.ndarray):
+        n = len(bounds)
+        if n < 2:
+            return self._empty, self._empty
+        a, b = np.triu_indices(n, 1)
+        overlap = (bounds[a, 0] <= bounds[b, 2]) & (bounds[b, 0] <= bounds[a, 2]) \
+                & (bounds[a, 1] <= bounds[b, 3]) & (bounds[b, 1] <= bounds[a, 3])
+        return a[overlap], b[overlap]
+
+
+class SweepAndPrune(Broadphase):
+    """
+    Sort and sweep on the x axis. The order of the last call is kept and sorted again
+    with a stable (adaptive) sort, bodies move little between ticks so the order is
+    almost sorted already and the sort stays close to linear.
+    """
+    _order: np.ndarray
+
+    def __init__(self):
+        self._order = None
+
+    def find_pairs(self, bounds: np.ndarray) -> (np.ndarray, np.ndarray):
+        n = len(bounds)
+        if n < 2:
+            return self._empty, self._empty
+        order = self._order
+        if order is None or len(order) != n:
+            order = np.arange(n)
+        order = order[np.argsort(bounds[order, 0], kind='stable')]
+        self._order = order
+
+        min_x = bounds[order, 0]
+        max_x = bounds[order, 2]
+        # sweep, every box pairs with the following boxes starting before its end
+        end = np.searchsorted(min_x, max_x, side='right')
+        count = end - np.arange(n) - 1
+        total = count.sum()
+        if total == 0:
+            return self._empty, self._empty
+        first = np.repeat(np.arange(n), count)
+        second = first + 1 + np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+        a = order[first]
+        b = order[second]
+        overlap = (bounds[a, 1] <= bounds[b, 3]) & (bounds[b, 1] <= bounds[a, 3])
+        return a[overlap], b[overlap]
+
+
+class CellIndex():
+    """
+    Fixed items by grid cell as (cell key, item) entries sorted by key. Queries for
+    many boxes at once look their cells up with searchsorted, there is no dict and
+    no loop over the boxes. For bodies that don't move between rebuilds, statics
+    and sleeping bodies.
+    """
+    cell_width: float
+    cell_height: float
+
+    def __init__(self, cell_width: float, cell_height: float = None):
+        self.cell_width = float(cell_width)
+        self.cell_height = float(cell_height if cell_height else cell_width)
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._items = Broadphase._empty
+        self._span = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def key(x, y):
+        # one int64 per cell, cells within 2 ** 31 of the origin
+        return x * (1 << 32) + y
+
+    def set_entries(self, keys: np.ndarray, items: np.ndarray):
+        keys = np.asarray(keys, dtype=np.int64)
+        items = np.asarray(items, dtype=np.intp)
+        order = np.lexsort((items, keys))
+        self._keys = keys[order]
+        self._items = items[order]
+        self._span = int(items.max()) + 1 if len(items) else 0
+
+    def set_bounds(self, bounds: np.ndarray):
+        # row i of bounds becomes item i, in every cell it touches
+        items, keys = self._cells(bounds)
+        self.set_entries(keys, items)
+
+    def _cells(self, bounds: np.ndarray) -> (np.ndarray, np.ndarray):
+        # (row, cell key) of every cell the rows of bounds touch
+        x0 = np.floor_divide(bounds[:, 0], self.cell_width).astype(np.int64)
+        y0 = np.floor_divide(bounds[:, 1], self.cell_height).astype(np.int64)
+        x1 = np.floor_divide(bounds[:, 2], self.cell_width).astype(np.int64)
+        y1 = np.floor_divide(bounds[:, 3], self.cell_height).astype(np.int64)
+        rows = y1 - y0 + 1
+        count = (x1 - x0 + 1) * rows
+        row = np.repeat(np.arange(len(bounds)), count)
+        local = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        return row, self.key(x0[row] + local // rows[row], y0[row] + local % rows[row])
+
+    def query(self, bounds: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Row of bounds and item of every item sharing a cell with the row, each pair
+        once, sorted by row then item.
+        """
+        empty = Broadphase._empty
+        if not len(bounds) or not len(self._keys):
+            return empty, empty
+        row, keys = self._cells(bounds)
+        first = np.searchsorted(self._keys, keys, 'left')
+        hits = np.searchsorted(self._keys, keys, 'right') - first
+        total = hits.sum()
+        if not total:
+            return empty, empty
+        position = np.repeat(first, hits) + np.arange(total) - np.repeat(np.cumsum(hits) - hits, hits)
+        # an item in several cells of a row is found once
+        pair = np.unique(np.repeat(row, hits) * self._span + self._items[position])
+        return pair // self._span, pair % self._span
@@ -0,0 +1,152 @@
+from PySide6.QtCore import QTimer as Timer
+
+from physics.common import *
+from physics.body import Body
+from physics.shape import Shape
+from physics.contact import Contact, time_of_impact
+from physics.broadphase import Broadphase, body_bounds
+from physics.core import PhysicsManager
+from physics.stats import PhysicsStats
+
+import numpy as np
+import timeit
+
+
+class PhysicsManager_CCD(PhysicsManager):
+    """
+    Continuous collision: every tick is advanced from one impact to the next
+    (swept time of impact) instead of stepping the whole dt and fixing overlaps.
+    Fast bodies can't pass through thin edges or other bodies, so large dt is fine.
+    """
+    # impacts solved per tick before the rest of the tick is stepped plainly
+    max_impacts = 64
+    # bodies are advanced until they overlap by slop, so the contact is found
+    slop = 0.01
+    # impacts are exact already, no substeps needed
+    max_substeps = 1
+
+    def __init__(self, timer:Timer=None, broadphase:Broadphase=None, headless:bool=False):
+        super().__init__(timer, broadphase, headless)
+        self.impacts = 0
+        self._swept = None
+
+    def _swept_bounds(self, dt) -> ([Body], np.ndarray, np.ndarray):
+        # all bodies, a swept body can reach sleeping bodies away from its cells
+        bodies, bounds, moving = self._all_body_bounds()
+        motion = np.array([body.linear_velocity.toTuple() for body in bodies]).reshape(-1, 2) * dt
+        bounds_start = bounds[:, :2]
+        bounds_end = bounds[:, 2:]
+        bounds = np.concatenate((np.minimum(bounds_start, bounds_start + motion), np.maximum(bounds_end, bounds_end + motion)), axis=1)
+        return bodies, bounds, moving
+
+    def _pair_impacts(self, bodies: [Body], index_a, index_b, dt, start, impacts: dict):
+        # swept test of the pairs, impacts within dt are kept at start + time of impact
+        for a, b in zip(index_a, index_b):
+            bodyA = bodies[a]
+            bodyB = bodies[b]
+            if bodyA.shapeType != Shape.Type.Circle:
+                bodyA, bodyB = bodyB, bodyA
+            toi = time_of_impact(bodyA, bodyB, dt, self.slop)
+            if toi is not None:
+                impacts[(bodyA, bodyB)] = start + toi
+
+    def _static_impacts(self, bodyA: Body, bounds: np.ndarray, dt, start, impacts: dict):
+        statics = self.static_index
+        candidates = statics.query(bounds)
+        self.stats.current[PhysicsStats.StaticChecks] += len(candidates)
+        for i in candidates:
+            bodyS = statics.bodies[i]
+            toi = time_of_impact(bodyA, bodyS, dt, self.slop)
+            if toi is not None:
+                impacts[(bodyA, bodyS)] = start + toi
+
+    def find_impacts(self, dt) -> dict:
+        """
+        Impacts of the tick with the velocities at its start, (bodyA, bodyB) to the time
+        of impact. The swept bounds over dt are kept in _swept for update_impacts.
+        """
+        impacts = {}
+        self._swept = None
+        if not self._awake:
+            return impacts
+        stats = self.stats.current
+        t = timeit.default_timer()
+        bodies, bounds, moving = self._swept_bounds(dt)
+        self._swept = (bodies, bounds, {body: i for i, body in enumerate(bodies)})
+
+        index_a, index_b = self.broadphase.find_pairs(bounds)
+        active = moving[index_a] | moving[index_b]
+        narrowphase = timeit.default_timer()
+        stats[PhysicsStats.Broadphase] += narrowphase - t
+        stats[PhysicsStats.Pairs] += int(np.count_nonzero(active))
+        self._pair_impacts(bodies, index_a[active].tolist(), index_b[active].tolist(), dt, 0.0, impacts)
+        for a in np.flatnonzero(moving).tolist():
+            self._static_impacts(bodies[a], bounds[a], dt, 0.0, impacts)
+        stats[PhysicsStats.Narrowphase] += timeit.default_timer() - narrowphase
+        return impacts
+
+    def update_impacts(self, impacts: dict, changed: [Body], elapsed, remaining):
+        """
+        Only the bodies of the last impact changed velocity, their impacts are dropped and
+        tested again over the rest of the tick. The other bodies keep moving as they did,
+        their times of impact and swept bounds from the start of the tick still hold.
+        """
+        stats = self.stats.current
+        t = timeit.default_timer()
+        for pair in [pair for pair in impacts if pair[0] in changed or pair[1] in changed]:
+            del impacts[pair]
+        bodies, swept, index_of = self._swept
+        changed = [body for body in changed if body in index_of]
+        for body in changed:
+            motion = body.linear_velocity * remaining
+            bounds = np.array(body_bounds(body))
+            start = bounds[:2] + np.minimum(motion.toTuple(), 0)
+            end = bounds[2:] + np.maximum(motion.toTuple(), 0)
+            others = np.flatnonzero((swept[:, 0] <= end[0]) & (start[0] <= swept[:, 2])
+                                    & (swept[:, 1] <= end[1]) & (start[1] <= swept[:, 3]))
+            others = [i for i in others.tolist() if bodies[i] is not body]
+            stats[PhysicsStats.Pairs] += len(others)
+            self._pair_impacts(bodies, [index_of[body]] * len(others), others, remaining, elapsed, impacts)
+            if body.linear_velocity.lengthSquared() > 0.001:
+                self._static_impacts(body, np.concatenate((start, end)), remaining, elapsed, impacts)
+        stats[PhysicsStats.Narrowphase] += timeit.default_timer() - t
+
+    def solve_impacts(self, dt):
+        stats = self.stats.current
+        impacts = self.find_impacts(dt)
+        elapsed = 0.0
+        self.impacts = 0
+        while impacts and self.impacts < self.max_impacts:
+            (bodyA, bodyB), time = min(impacts.items(), key=lambda impact: impact[1])
+            t = timeit.default_timer()
+            self.integrate(max(time - elapsed, 0.0))
+            resolve = timeit.default_timer()
+            stats[PhysicsStats.Integrate] += resolve - t
+            elapsed = max(time, elapsed)
+            self.impacts += 1
+
+            contact = Contact(bodyA, bodyB)
+            contact.time_impact = elapsed
+            if bodyB.type == Body.Type.Static:
+                self.resolve_static(contact)
+            elif contact.intersect:
+                contact.resolve()
+                self._touching.append((bodyA, bodyB))
+                self.wake_islands()
+            stats[PhysicsStats.Resolve] += timeit.default_timer() - resolve
+            stats[PhysicsStats.Contacts] += 1
+            self.update_impacts(impacts, (bodyA, bodyB), elapsed, dt - elapsed)
+        t = timeit.default_timer()
+        self.integrate(dt - elapsed)
+        stats[PhysicsStats.Integrate] += timeit.default_timer() - t
+
+    def solve(self, dt):
+        stats = self.stats.current
+        self.wake_islands()
+        self.solve_impacts(dt)
+        t = timeit.default_timer()
+        self.apply_friction(dt)
+        sleep = timeit.default_timer()
+        stats[PhysicsStats.Integrate] += sleep - t
+        self.solve_sleep()
+        stats[PhysicsStats.Sleep] += timeit.default_timer() - sleep
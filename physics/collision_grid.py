@@ -1,94 +1,106 @@
+import numpy as np
+from physics.common import *
 from physics.body import Body
-from physics.contact import Contact
-class CollisionCell():
-    bodies: [Body]
-    def __init__(self):
-        self.bodies = []
-    def add_body(self, body: Body):
-        self.bodies.append(body)
-    def unload_body(self):
-        for body in self.bodies:
-            if body.type != Body.Type.Static:
-                self.bodies.remove(body)
+from physics.broadphase import Broadphase
 
 
-class CollisionGrid():
-    width: int
-    height: int
+class SpatialHash(Broadphase):
+    """
+    Uniform grid hashed by cell coordinate, so the world has no fixed size.
+    A body is stored in every cell its bounds overlap. Cell ranges of the last call
+    are kept, only bodies which changed cells are moved. Candidate pairs are kept
+    with the number of cells they share and updated by the same moves, the pair
+    arrays are only rebuilt on a tick where a pair came or went.
+    """
     cell_width: float
     cell_height: float
-    cells: [CollisionCell]
-    def __init__(self, width = 0, height = 0, cell_width = 1, cell_height = 1):
-        self.width = width
-        self.height = height
-        self.cell_width = cell_width
-        self.cell_height = cell_height
-        self.cells = []
-        for i in range(0, width * height):
-            self.cells.append(CollisionCell())
-    
-    def cell(self, x:int, y:int) -> CollisionCell:
-        if not self._check_coordinate(x, y):
-            print(x, y)
-            return None
-        return self.cells[x * self.height + y]
+    moved: int
 
-    def _cell(self, index: int) -> CollisionCell:
-        if index >= self.width * self.height or index < 0:
-            # invalid idx
-            return None
-        return self.cells[index]
-    
-    def setCell(self, x:int, y:int, obj:object):
-        if not self._check_coordinate(x, y):
+    def __init__(self, cell_width: float, cell_height: float = None):
+        self.cell_width = float(cell_width)
+        self.cell_height = float(cell_height if cell_height else cell_width)
+        self._cells = {}
+        self._ranges = None
+        # (i, j) with i < j to the number of cells they share, and the same pairs as sorted
+        # arrays, None once a pair came or went
+        self._shared = {}
+        self._pairs = None
+        # bodies that changed cells in the last call
+        self.moved = 0
+
+    def _cell_ranges(self, bounds: np.ndarray) -> np.ndarray:
+        size = np.array([self.cell_width, self.cell_height, self.cell_width, self.cell_height])
+        return np.floor(bounds / size).astype(np.int64)
+
+    def _range_cells(self, cell_range):
+        x0, y0, x1, y1 = cell_range
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield (x, y)
+
+    def _leave(self, i: int, key):
+        cells = self._cells
+        shared = self._shared
+        cell = cells[key]
+        cell.discard(i)
+        for j in cell:
+            pair = (i, j) if i < j else (j, i)
+            count = shared[pair] - 1
+            if count:
+                shared[pair] = count
+            else:
+                del shared[pair]
+                self._pairs = None
+        if not cell:
+            del cells[key]
+
+    def _enter(self, i: int, key):
+        cell = self._cells.get(key)
+        if cell is None:
+            self._cells[key] = {i}
             return
-        self.cells[x  * self.height + y] = obj
-    
-    def _check_coordinate(self, x, y):
-        if x >= 0 and x < self.width:
-            if y >= 0 and y < self.height:
-                return True
+        shared = self._shared
+        for j in cell:
+            pair = (i, j) if i < j else (j, i)
+            count = shared.get(pair, 0)
+            if not count:
+                self._pairs = None
+            shared[pair] = count + 1
+        cell.add(i)
+
+    def find_pairs(self, bounds: np.ndarray) -> (np.ndarray, np.ndarray):
+        n = len(bounds)
+        ranges = self._cell_ranges(bounds)
+        if self._ranges is None or len(self._ranges) != n:
+            # body set changed, bodies have new indices
+            self._cells.clear()
+            self._shared.clear()
+            self._pairs = None
+            changed = range(n)
         else:
-            return False
-    
-    def load_body(self, body: Body):
-        x = int(body.position.x() // self.cell_width)
-        y = int(body.position.y() // self.cell_height)
-        if not self._check_coordinate(x, y):
-            return
-        idx = x  * self.height + y
-        self.cells[idx].add_body(body)
-    
-    
-    def unload_body(self):
-        for cell in self.cells:
-            cell.unload_body()
-    
-    def check_collision(self, idx):
-        width = self.width
-        height = self.height
-        if idx >= width * height or idx < 0:
-            # invalid idx
-            return
-        cell = self.cells[idx]
-        for body in cell.bodies:
-            if body.type == Body.Type.Static:
-                continue
-            self._check_body_cell(body, self._cell(idx - 1))
-            self._check_body_cell(body, self._cell(idx))
-            self._check_body_cell(body, self._cell(idx + 1))
-            self._check_body_cell(body, self._cell(idx + height - 1))
-            self._check_body_cell(body, self._cell(idx + height))
-            self._check_body_cell(body, self._cell(idx + height + 1))
-            self._check_body_cell(body, self._cell(idx - height - 1))
-            self._check_body_cell(body, self._cell(idx - height))
-            self._check_body_cell(body, self._cell(idx - height + 1))
+            changed = np.flatnonzero((ranges != self._ranges).any(axis=1)).tolist()
+            for i in changed:
+                for key in self._range_cells(self._ranges[i].tolist()):
+                    self._leave(i, key)
+        for i in changed:
+            for key in self._range_cells(ranges[i].tolist()):
+                self._enter(i, key)
+        self._ranges = ranges
+        self.moved = len(changed)
+        if self._pairs is None:
+            self._pairs = self._pair_arrays()
 
-    @classmethod
-    def _check_body_cell(cls, body: Body, cell: CollisionCell):
-        if body == None or cell == None:
-            return
-        for bodyB in cell.bodies:
-            contact = Contact(body, bodyB)
-            contact.resolve()
+        a, b = self._pairs
+        if not len(a):
+            return a, b
+        overlap = (bounds[a, 0] <= bounds[b, 2]) & (bounds[b, 0] <= bounds[a, 2]) \
+                & (bounds[a, 1] <= bounds[b, 3]) & (bounds[b, 1] <= bounds[a, 3])
+        return a[overlap], b[overlap]
 
+    def _pair_arrays(self) -> (np.ndarray, np.ndarray):
+        if not self._shared:
+            return self._empty, self._empty
+        pairs = np.fromiter(self._shared, dtype=np.dtype((np.intp, 2)), count=len(self._shared))
+        # in index order, the same every run whatever order the cells were filled in
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        return pairs[:, 0], pairs[:, 1]
@@ -1,5 +1,5 @@
 from PySide6.QtGui import QVector2D as Vec2
-from math import sin, cos, pi as Pi
+from math import sin, cos, copysign, pi as Pi
 
 eps = 0.000000001
 
@@ -13,6 +13,27 @@ def cross(a, b):
     else:
         raise Exception("Unknown type for cross product")
 
+# specialized cross products, no type dispatch, vv -> float, vs and sv -> Vec2
+def cross_vv(a: Vec2, b: Vec2) -> float:
+    return a.x() * b.y() - a.y() * b.x()
+
+def cross_vs(a: Vec2, b: float) -> Vec2:
+    return Vec2(b * a.y(), -b * a.x())
+
+def cross_sv(a: float, b: Vec2) -> Vec2:
+    return Vec2(-a * b.y(), a * b.x())
+
+def cross_xy(ax, ay, bx, by):
+    # on plain floats or numpy arrays
+    return ax * by - ay * bx
+
+def rotate_xy(x: float, y: float, angle: float) -> (float, float):
+    if angle == 0:
+        return x, y
+    s = sin(angle)
+    c = cos(angle)
+    return c * x - s * y, s * x + c * y
+
 def rotate_vec(vec: Vec2, angle: float) -> Vec2:
     s = sin(angle)
     c = cos(angle)
@@ -3,6 +3,8 @@ from physics.body import Body
 from physics.shape import Shape, Circle, Edge
 
 class Contact(object):
+    __slots__ = ('pt_A_worldspace', 'pt_B_worldspace', 'pt_A_localspace', 'pt_B_localspace', 'normal', 'distance',
+                 'time_impact', 'bodyA', 'bodyB', 'intersect')
     pt_A_worldspace: Vec2
     pt_B_worldspace: Vec2
     pt_A_localspace: Vec2
@@ -18,21 +20,33 @@ class Contact(object):
     intersect:bool
 
     def __init__(self, bodyA: Body, bodyB: Body):
+        self.set(bodyA, bodyB)
+
+    def set(self, bodyA: Body, bodyB: Body):
+        # narrowphase, a record can be set again for another pair
         self.bodyA = bodyA
         self.bodyB = bodyB
         self.intersect = False
-        if bodyA == bodyB:
+        self.time_impact = 0.0
+        if bodyA is bodyB:
             return
         if bodyA.shapeType == Shape.Type.Circle and bodyB.shapeType == Shape.Type.Circle:
-            a_b = bodyB.position - bodyA.position
-            
-            self.normal = a_b.normalized()
-            self.pt_A_worldspace = bodyA.position + self.normal * bodyA.shape.radius
-            self.pt_B_worldspace = bodyB.position - self.normal * bodyB.shape.radius
-            
-            radii_ab = bodyA.shape.radius + bodyB.shape.radius
-            lengthSquare = a_b.lengthSquared()
-            self.intersect = lengthSquare <= radii_ab ** 2 and lengthSquare > eps
+            ax, ay = bodyA.position.toTuple()
+            bx, by = bodyB.position.toTuple()
+            dx = bx - ax
+            dy = by - ay
+            radiusA = bodyA.shape.radius
+            radiusB = bodyB.shape.radius
+            lengthSquare = dx * dx + dy * dy
+            if lengthSquare > (radiusA + radiusB) ** 2 or lengthSquare <= eps:
+                return
+            length = lengthSquare ** 0.5
+            nx = dx / length
+            ny = dy / length
+            self.normal = Vec2(nx, ny)
+            self.pt_A_worldspace = Vec2(ax + nx * radiusA, ay + ny * radiusA)
+            self.pt_B_worldspace = Vec2(bx - nx * radiusB, by - ny * radiusB)
+            self.intersect = True
         
         elif bodyA.shapeType == Shape.Type.Circle and bodyB.shapeType == Shape.Type.Edge:
             radius = bodyA.shape.radius
@@ -80,34 +94,63 @@ class Contact(object):
         else:
             self.intersect = False
         #     raise Exception("unknown intersect")
+
+    def set_points(self, bodyA: Body, bodyB: Body, normal: Vec2, pt_A: Vec2, pt_B: Vec2):
+        # intersecting contact with a known geometry, skips the narrowphase
+        self.bodyA = bodyA
+        self.bodyB = bodyB
+        self.normal = normal
+        self.pt_A_worldspace = pt_A
+        self.pt_B_worldspace = pt_B
+        self.time_impact = 0.0
+        self.intersect = True
+
+    @classmethod
+    def from_points(cls, bodyA: Body, bodyB: Body, normal: Vec2, pt_A: Vec2, pt_B: Vec2) -> 'Contact':
+        contact = cls.__new__(cls)
+        contact.set_points(bodyA, bodyB, normal, pt_A, pt_B)
+        return contact
     
     def resolve(self):
         if not self.intersect:
             return
         bodyA = self.bodyA
         bodyB = self.bodyB
-        sum_invMass = bodyA.invMass + bodyB.invMass
+        invMassA = bodyA.invMass
+        invMassB = bodyB.invMass
+        invIA = bodyA.invI
+        invIB = bodyB.invI
+        sum_invMass = invMassA + invMassB
         elasticity_AB = bodyA.elasticity * bodyB.elasticity
 
-        ra = self.pt_A_worldspace - bodyA.center()
-        rb = self.pt_B_worldspace - bodyB.center()
+        # all in plain floats, the velocities are written back once per body
+        nx, ny = self.normal.toTuple()
+        pax, pay = self.pt_A_worldspace.toTuple()
+        pbx, pby = self.pt_B_worldspace.toTuple()
+        cax, cay = bodyA.center_xy()
+        cbx, cby = bodyB.center_xy()
+        rax = pax - cax
+        ray = pay - cay
+        rbx = pbx - cbx
+        rby = pby - cby
 
-        n = self.normal
-        angularJA = cross(bodyA.invI * cross(ra, n), ra)
-        angularJB = cross(bodyB.invI * cross(rb, n), rb)
-        angularFactor = Vec2.dotProduct((angularJA + angularJB), n)
+        ran = cross_xy(rax, ray, nx, ny)
+        rbn = cross_xy(rbx, rby, nx, ny)
+        angularFactor = invIA * ran * ran + invIB * rbn * rbn
 
         # get the world space velocity of the motion and rotation
-        velA = bodyA.linear_velocity + cross(bodyA.angle_velocity, ra)
-        velB = bodyB.linear_velocity + cross(bodyB.angle_velocity, rb)
-        vel_a_b = velA - velB
+        vax, vay = bodyA.linear_velocity.toTuple()
+        vbx, vby = bodyB.linear_velocity.toTuple()
+        wa = bodyA.angle_velocity
+        wb = bodyB.angle_velocity
+        vx = (vax - wa * ray) - (vbx - wb * rby)
+        vy = (vay + wa * rax) - (vby + wb * rbx)
 
         # calculate the collision impulse
-        impulse = (1.0 + elasticity_AB) * Vec2.dotProduct(vel_a_b, n) / (sum_invMass + angularFactor)
-        vec_impulse = n * impulse
-
-        self.bodyA.applyImpulse(self.pt_A_worldspace, vec_impulse * -1.0)
-        self.bodyB.applyImpulse(self.pt_B_worldspace, vec_impulse)
+        vel_normal = vx * nx + vy * ny
+        impulse = (1.0 + elasticity_AB) * vel_normal / (sum_invMass + angularFactor)
+        jx = nx * impulse
+        jy = ny * impulse
 
         #
         # calculate the impulse caused by friction
@@ -115,26 +158,126 @@ class Contact(object):
 
         friction = bodyA.friction * bodyB.friction
 
-        vel_norm = n * Vec2.dotProduct(n, vel_a_b)
-        vel_tang = vel_a_b - vel_norm
-        tang = vel_tang.normalized()
-
-        inertiaA = cross(bodyA.invI * cross(ra, tang), ra)
-        inertiaB = cross(bodyB.invI * cross(rb, tang), rb)
-        inv_inertia = Vec2.dotProduct((inertiaA + inertiaB), tang)
+        tx = vx - nx * vel_normal
+        ty = vy - ny * vel_normal
+        length = tx * tx + ty * ty
+        if length > 1e-12:
+            length = length ** 0.5
+            ux = tx / length
+            uy = ty / length
+        else:
+            ux = uy = 0.0
 
-        impulse_friction = vel_tang * friction / (sum_invMass + inv_inertia)
+        rat = cross_xy(rax, ray, ux, uy)
+        rbt = cross_xy(rbx, rby, ux, uy)
+        inv_inertia = invIA * rat * rat + invIB * rbt * rbt
 
-        # Apply kinetic friction
-        self.bodyA.applyImpulse(self.pt_A_worldspace, impulse_friction * -1.0)
-        self.bodyB.applyImpulse(self.pt_B_worldspace, impulse_friction)
+        # Apply the collision and the kinetic friction impulse
+        scale = friction / (sum_invMass + inv_inertia)
+        jx += tx * scale
+        jy += ty * scale
+        bodyA.applyImpulseXY(pax, pay, -jx, -jy)
+        bodyB.applyImpulseXY(pbx, pby, jx, jy)
 
         # move collider out of both
-        tA = self.bodyA.invMass / sum_invMass
-        tB = self.bodyB.invMass / sum_invMass
-
-        ds = self.pt_B_worldspace - self.pt_A_worldspace
-        if self.bodyA.type != Body.Type.Static:
-            self.bodyA.position += ds * tA
-        if self.bodyB.type != Body.Type.Static:
-            self.bodyB.position -= ds * tB
\ No newline at end of file
+        tA = invMassA / sum_invMass
+        tB = invMassB / sum_invMass
+
+        dx = pbx - pax
+        dy = pby - pay
+        if bodyA.type != Body.Type.Static:
+            x, y = bodyA.position.toTuple()
+            bodyA.position = Vec2(x + dx * tA, y + dy * tA)
+        if bodyB.type != Body.Type.Static:
+            x, y = bodyB.position.toTuple()
+            bodyB.position = Vec2(x - dx * tB, y - dy * tB)
+
+
+class ContactPool():
+    """
+    Contact records reused from tick to tick instead of allocated per pair.
+    peek() hands out the next free record, keep() holds it until reset(),
+    a record that is not kept is handed out again by the next peek().
+    """
+    __slots__ = ('_records', 'count')
+
+    def __init__(self):
+        self._records = []
+        self.count = 0
+
+    def peek(self) -> Contact:
+        if self.count == len(self._records):
+            self._records.append(Contact.__new__(Contact))
+        return self._records[self.count]
+
+    def keep(self):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+    def contacts(self) -> [Contact]:
+        # contacts kept since the last reset
+        return self._records[:self.count]
+
+
+def _toi_point(position: Vec2, velocity: Vec2, point: Vec2, radius: float) -> float:
+    # circle center moving from position with velocity against a fixed point
+    d = position - point
+    a = Vec2.dotProduct(velocity, velocity)
+    b = 2 * Vec2.dotProduct(d, velocity)
+    c = d.lengthSquared() - radius ** 2
+    if b >= 0:
+        # moving away
+        return None
+    if c <= 0:
+        return 0.0
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return None
+    return (-b - discriminant ** 0.5) / (2 * a)
+
+def time_of_impact(bodyA: Body, bodyB: Body, dt: float, slop: float = 0.0) -> float:
+    """
+    Swept test of circle bodyA against circle or edge bodyB, both moving with their
+    linear velocity. Returns the earliest time in [0, dt] where they are closer than
+    their radii minus slop, None if they don't meet.
+    """
+    if bodyA.shapeType != Shape.Type.Circle:
+        return None
+    velocity = bodyA.linear_velocity - bodyB.linear_velocity
+    radius = bodyA.shape.radius - slop
+    toi = None
+    if bodyB.shapeType == Shape.Type.Circle:
+        toi = _toi_point(bodyA.position, velocity, bodyB.position, radius + bodyB.shape.radius)
+
+    elif bodyB.shapeType == Shape.Type.Edge:
+        b1 = bodyB.position
+        vec_edge = rotate_vec(bodyB.shape.vec, bodyB.angle)
+        length = vec_edge.length()
+        if length < eps:
+            return None
+        vec_edge_unit = vec_edge / length
+        normal = Vec2(vec_edge_unit.y(), -vec_edge_unit.x())
+        a_b1 = bodyA.position - b1
+        side = Vec2.dotProduct(a_b1, normal)
+        approach = Vec2.dotProduct(velocity, normal)
+        if side < 0:
+            side = -side
+            approach = -approach
+        # against the inner part of the edge
+        if approach < 0:
+            t = max((side - radius) / -approach, 0.0)
+            along = Vec2.dotProduct(a_b1 + velocity * t, vec_edge_unit)
+            if 0 <= along <= length:
+                toi = t
+        # against the end points
+        if toi is None:
+            for point in (b1, b1 + vec_edge):
+                t = _toi_point(bodyA.position, velocity, point, radius)
+                if t is not None and (toi is None or t < toi):
+                    toi = t
+
+    if toi is None or toi > dt:
+        return None
+    return toi
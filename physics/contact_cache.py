@@ -0,0 +1,197 @@
+from physics.common import *
+from physics.body import Body
+from physics.contact import Contact
+
+
+class Manifold():
+    """
+    Persistent contact between two bodies. The accumulated normal and tangent impulses
+    of the last tick are kept and applied again at the start of the next one (warm start).
+    Impulses are scalars along the normal and its perpendicular, they don't depend on
+    which body is A.
+    """
+    __slots__ = ('bodyA', 'bodyB', 'stateA', 'stateB', 'nx', 'ny', 'rax', 'ray', 'rbx', 'rby', 'ds',
+                 'normal_mass', 'tangent_mass', 'bias', 'friction', 'normal_impulse', 'tangent_impulse', 'tick',
+                 'static_normal')
+
+    def __init__(self):
+        self.normal_impulse = 0.0
+        self.tangent_impulse = 0.0
+        self.tick = -1
+
+    def prepare(self, contact: Contact, stateA: list, stateB: list, restitution_threshold: float):
+        bodyA = contact.bodyA
+        bodyB = contact.bodyB
+        self.bodyA = bodyA
+        self.bodyB = bodyB
+        self.stateA = stateA
+        self.stateB = stateB
+        nx, ny = contact.normal.toTuple()
+        pax, pay = contact.pt_A_worldspace.toTuple()
+        pbx, pby = contact.pt_B_worldspace.toTuple()
+        cax, cay = bodyA.center_xy()
+        cbx, cby = bodyB.center_xy()
+        self.nx = nx
+        self.ny = ny
+        self.rax = rax = pax - cax
+        self.ray = ray = pay - cay
+        self.rbx = rbx = pbx - cbx
+        self.rby = rby = pby - cby
+        self.ds = (pbx - pax, pby - pay)
+
+        invMassA, invIA = stateA[3], stateA[4]
+        invMassB, invIB = stateB[3], stateB[4]
+        ran = cross_xy(rax, ray, nx, ny)
+        rbn = cross_xy(rbx, rby, nx, ny)
+        self.normal_mass = invMassA + invMassB + invIA * ran * ran + invIB * rbn * rbn
+        # tangent is the normal turned by 90 degrees
+        rat = cross_xy(rax, ray, -ny, nx)
+        rbt = cross_xy(rbx, rby, -ny, nx)
+        self.tangent_mass = invMassA + invMassB + invIA * rat * rat + invIB * rbt * rbt
+        self.friction = bodyA.friction * bodyB.friction
+
+        # bounce against the approach speed, resting contacts only stop
+        vn = self.relative_velocity(nx, ny)
+        self.bias = bodyA.elasticity * bodyB.elasticity * vn if vn > restitution_threshold else 0.0
+
+        # against a static body, the normal velocity A came in with unless it was approaching,
+        # taken off after solving as PhysicsManager.resolve_static does
+        self.static_normal = None
+        if bodyB.type == Body.Type.Static:
+            vel_normal = stateA[0] * nx + stateA[1] * ny
+            if vel_normal < 0.01:
+                self.static_normal = vel_normal
+
+    def relative_velocity(self, x: float, y: float) -> float:
+        # velocity of the contact point of A relative to B, along (x, y)
+        vax, vay, wa = self.stateA[0], self.stateA[1], self.stateA[2]
+        vbx, vby, wb = self.stateB[0], self.stateB[1], self.stateB[2]
+        vx = (vax - wa * self.ray) - (vbx - wb * self.rby)
+        vy = (vay + wa * self.rax) - (vby + wb * self.rbx)
+        return vx * x + vy * y
+
+    def apply(self, px: float, py: float):
+        # impulse (px, py) on B, the opposite on A
+        stateA = self.stateA
+        stateB = self.stateB
+        stateA[0] -= px * stateA[3]
+        stateA[1] -= py * stateA[3]
+        stateA[2] -= stateA[4] * cross_xy(self.rax, self.ray, px, py)
+        stateB[0] += px * stateB[3]
+        stateB[1] += py * stateB[3]
+        stateB[2] += stateB[4] * cross_xy(self.rbx, self.rby, px, py)
+
+    def warm_start(self):
+        nx = self.nx
+        ny = self.ny
+        jn = self.normal_impulse
+        jt = self.tangent_impulse
+        self.apply(nx * jn - ny * jt, ny * jn + nx * jt)
+
+    def solve(self):
+        nx = self.nx
+        ny = self.ny
+        if self.normal_mass <= 0:
+            return
+        # tangent first, limited by the normal impulse of the last iteration
+        if self.tangent_mass > 0:
+            vt = self.relative_velocity(-ny, nx)
+            limit = self.friction * self.normal_impulse
+            impulse = min(max(self.tangent_impulse + vt / self.tangent_mass, -limit), limit)
+            delta = impulse - self.tangent_impulse
+            self.tangent_impulse = impulse
+            self.apply(-ny * delta, nx * delta)
+
+        vn = self.relative_velocity(nx, ny)
+        impulse = max(self.normal_impulse + (vn + self.bias) / self.normal_mass, 0.0)
+        delta = impulse - self.normal_impulse
+        self.normal_impulse = impulse
+        self.apply(nx * delta, ny * delta)
+
+
+class ContactCache():
+    """
+    Manifolds of the touching pairs keyed by body pair, kept while the pair touches.
+    solve() runs sequential impulse iterations over all contacts of a tick, warm
+    started with the impulses of the last tick, so stacks and racks converge in a
+    few iterations instead of fighting each other from zero every tick.
+    Velocities are solved on plain floats and written back to the bodies once.
+    """
+    # approach speed under which a contact doesn't bounce, above the speed gravity adds in a tick
+    restitution_threshold = 10.0
+
+    def __init__(self):
+        self._manifolds = {}
+        self.tick = 0
+
+    def __len__(self):
+        return len(self._manifolds)
+
+    def clear(self):
+        self._manifolds.clear()
+
+    def solve(self, contacts: [Contact], iterations: int, warm_start: bool = True) -> [Manifold]:
+        self.tick += 1
+        manifolds = self._manifolds
+        states = {}
+        active = []
+        for contact in contacts:
+            bodyA = contact.bodyA
+            bodyB = contact.bodyB
+            key = (bodyA, bodyB) if id(bodyA) < id(bodyB) else (bodyB, bodyA)
+            manifold = manifolds.get(key)
+            if manifold is None:
+                manifold = Manifold()
+                manifolds[key] = manifold
+            elif not warm_start or manifold.tick != self.tick - 1:
+                manifold.normal_impulse = 0.0
+                manifold.tangent_impulse = 0.0
+            manifold.tick = self.tick
+            for body in (bodyA, bodyB):
+                if body not in states:
+                    movable = body.type == Body.Type.Dynamic and body.invMass != 0
+                    if movable and body.sleeping:
+                        body.wake()
+                    vx, vy = body.linear_velocity.toTuple()
+                    states[body] = [vx, vy, body.angle_velocity, body.invMass if movable else 0.0, body.invI if movable else 0.0]
+            manifold.prepare(contact, states[bodyA], states[bodyB], self.restitution_threshold)
+            active.append(manifold)
+
+        # pairs that stopped touching are dropped
+        if len(manifolds) > len(active):
+            for key in [key for key, manifold in manifolds.items() if manifold.tick != self.tick]:
+                del manifolds[key]
+
+        if warm_start:
+            for manifold in active:
+                manifold.warm_start()
+        for i in range(iterations):
+            for manifold in active:
+                manifold.solve()
+        for manifold in active:
+            if manifold.static_normal is not None:
+                manifold.stateA[0] -= manifold.static_normal * manifold.nx
+                manifold.stateA[1] -= manifold.static_normal * manifold.ny
+
+        for body, state in states.items():
+            if state[3] != 0:
+                body.linear_velocity = Vec2(state[0], state[1])
+                body.angle_velocity = state[2]
+
+        # move colliders out of each other, as Contact.resolve
+        for manifold in active:
+            invMassA = manifold.stateA[3]
+            invMassB = manifold.stateB[3]
+            sum_invMass = invMassA + invMassB
+            if sum_invMass == 0:
+                continue
+            dx, dy = manifold.ds
+            if invMassA:
+                x, y = manifold.bodyA.position.toTuple()
+                t = invMassA / sum_invMass
+                manifold.bodyA.position = Vec2(x + dx * t, y + dy * t)
+            if invMassB:
+                x, y = manifold.bodyB.position.toTuple()
+                t = invMassB / sum_invMass
+                manifold.bodyB.position = Vec2(x - dx * t, y - dy * t)
+        return active
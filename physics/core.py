@@ -1,172 +1,720 @@
 from PySide6.QtGui import QVector2D as Vec2
-from PySide6.QtCore import QThreadPool as ThreadPool, QRunnable as Worker, QTimer as Timer, Signal, Slot, QMutex as Mutex
+from PySide6.QtCore import QTimer as Timer, Signal, Slot, QMutex as Mutex
 
 
 from physics.shape import Shape, Edge, Circle
 from physics.common import *
 from physics.body import Body
-from physics.collision_grid import *
-from physics.contact import Contact
+from physics.collision_grid import SpatialHash
+from physics.static_index import StaticIndex
+from physics.contact import Contact, ContactPool
+from physics.contact_cache import ContactCache
+from physics.stats import PhysicsStats
+from physics.query import RayHit, cast, overlapping, ray_boxes
+from physics.island import Island
+from physics.registry import BodyRegistry
+from physics.simulation import BodyState, StepStats, SimulationResult, Snapshot
+from physics.body_array import BodyArray
+from physics.batch_contact import solve_circle_pairs
+from physics.broadphase import Broadphase, BruteForce, SweepAndPrune, CellIndex, body_bounds
 
+from math import ceil, inf
 import timeit
+import numpy as np
 
 class PhysicsManager():
     tps = 60
+    # bodies slower than this for sleep_ticks ticks are put to sleep with their island
+    sleep_velocity = 0.05
+    sleep_angle_velocity = 0.05
+    sleep_ticks = 30
+    # a tick is split into substeps so no body moves further than substep_travel
+    # times the smallest shape size in one substep
+    substep_travel = 0.5
+    max_substeps = 8
+    # real time fed to the accumulator per frame is capped, a long stall doesn't
+    # turn into a burst of steps
+    max_frame_time = 0.25
+    # 0 resolves every contact once in pair order, more runs that many warm started
+    # sequential impulse iterations over all contacts of a tick (ContactCache)
+    solver_iterations = 0
+    warm_starting = True
 
-    def __init__(self, timer:Timer=None):
-        if timer:
-            self._timer = timer
+    def __init__(self, timer:Timer=None, broadphase:Broadphase=None, headless:bool=False, static_index:StaticIndex=None):
+        # headless managers have no timer and only advance by step / run_until_rest,
+        # with a timer the real time between timeouts is stepped in fixed dt steps
+        self.dt = (1000 // self.tps) / 1000
+        if headless:
+            self._timer = None
         else:
-            self._timer = Timer()
-            self._timer.start(1000 // self.tps)
-        self._timer.timeout.connect(self.update)
-        self.dt = self._timer.interval() / 1000
-        
-        self._bodies = []
-        self._statics = []
+            if timer:
+                self._timer = timer
+            else:
+                self._timer = Timer()
+                self._timer.start(1000 // self.tps)
+            self._timer.timeout.connect(self.update)
+
+        # dynamic and static bodies, dense lists with stable handles
+        self._registry = BodyRegistry()
+        self._static_registry = BodyRegistry()
+        self._bodies = self._registry.bodies
+        self._statics = self._static_registry.bodies
+        self._next_handle = 0
+        # bodies to remove at the start of the next step, a dict keeps the order
+        self._removed = {}
+        self._awake = []
+        self._woken = []
+        # (bodies, bounds, CellIndex) of the sleeping bodies, None until the next _sleeping_index
+        self._sleeping = None
+        # (tick, bodies, bounds, CellIndex) of all bodies for the scene queries
+        self._queries = None
+        self._touching = []
+        self._contacts = ContactPool()
+        self._cache = ContactCache()
         self._mutex = Mutex()
+        self._accumulator = 0.0
+        self._last_update = None
+        self._previous = {}
+        self._min_size = None
+        # fraction of a step the accumulator is ahead of the simulation, for interpolation
+        self.alpha = 0.0
+        self.broadphase = broadphase if broadphase else SweepAndPrune()
+        self.static_index = static_index if static_index else StaticIndex()
+        self.allow_sleep = True
 
         self.frametime = 0
+        self.time = 0.0
+        self.ticks = 0
+        self.contacts = 0
+        # phase timings and counters of the last steps
+        self.stats = PhysicsStats()
+        # ReplayRecorder writing the bodies after every step
+        self.recorder = None
         self.global_friction = 0
         self.gravity = 0
         self.gravity_center = None
     
-    def add_body(self, body: Body):
+    def _track_size(self, body: Body):
+        # smallest shape of the world, for the substeps
+        size = body.shape.size()
+        if self._min_size is None or size < self._min_size:
+            self._min_size = size
+
+    def _register(self, body: Body) -> int:
+        self._track_size(body)
+        self._queries = None
+        handle = self._next_handle
+        self._next_handle += 1
         if body.type == Body.Type.Static:
-            self._statics.append(body)
+            self._static_registry.add(body, handle)
         else:
-            self._bodies.append(body)
+            self._registry.add(body, handle)
+            self._awake.append(body)
+        return handle
 
-    def add_bodies(self, bodies: list[Body]):
-        self._bodies = self._bodies + bodies
-    
-    def remove_body(self, body: Body):
-        self._mutex.lock()
-        self._bodies.remove(body)
-        self._mutex.unlock()
+    def add_body(self, body: Body) -> int:
+        # returns the handle of the body
+        handle = self._register(body)
+        if body.type == Body.Type.Static:
+            self.static_index.add(body)
+        return handle
+
+    def add_bodies(self, bodies: list[Body]) -> [int]:
+        # statics are baked into the index once for the whole batch
+        handles = [self._register(body) for body in bodies]
+        statics = [body for body in bodies if body.type == Body.Type.Static]
+        if statics:
+            self.static_index.add_many(statics)
+        return handles
+
+    def body(self, handle: int) -> Body:
+        body = self._registry.get(handle)
+        return body if body is not None else self._static_registry.get(handle)
+
+    def handle(self, body: Body) -> int:
+        handle = self._registry.handle(body)
+        return handle if handle is not None else self._static_registry.handle(body)
+
+    def remove_body(self, body):
+        """
+        Queue a body, or the body of a handle, for removal. The queue is flushed at
+        the start of the next step, the body takes part in no step after this call.
+        """
+        if isinstance(body, int):
+            handle = body
+            body = self.body(handle)
+            if body is None:
+                raise Exception(f'no body with handle {handle}')
+        elif body not in self._registry and body not in self._static_registry:
+            raise Exception('body is not in the physics manager')
+        self._removed[body] = None
+
+    def flush_removals(self):
+        if not self._removed:
+            return
+        removed = self._removed
+        self._removed = {}
+        self._remove_bodies([body for body in removed if body in self._registry or body in self._static_registry])
+        # the smallest shape may have gone with them, the substeps follow what is left
+        if any(body.shape.size() <= self._min_size for body in removed):
+            self._min_size = None
+            for body in self._bodies + self._statics:
+                self._track_size(body)
+
+    def _remove_body(self, body: Body):
+        self._remove_bodies([body])
+
+    def _remove_bodies(self, bodies: [Body]):
+        # O(1) per body in the registries, the awake list and islands are filtered once
+        removed = set(bodies)
+        self._sleeping = None
+        self._queries = None
+        statics = []
+        islands = set()
+        for body in bodies:
+            if body in self._static_registry:
+                self._static_registry.remove(body)
+                statics.append(body)
+                continue
+            self._registry.remove(body)
+            if body.island is not None:
+                islands.add(body.island)
+                body.sleeping = False
+                body.sleep_time = 0
+                body.island = None
+        if statics:
+            self.static_index.remove_many(statics)
+        for island in islands:
+            island.bodies = [body for body in island.bodies if body not in removed]
+        if len(removed) > len(statics):
+            self._awake = [body for body in self._awake if body not in removed]
+            self._previous = {body: position for body, position in self._previous.items() if body not in removed}
     
-    def solve_movement(self, dt):
-        # movement
-        for body in self._bodies:
+    def integrate(self, dt):
+        for body in self._awake:
             body.update(dt)
+
+    def apply_friction(self, dt):
+        if self.global_friction <= 0:
+            return
+        for body in self._awake:
             if body.type is not Body.Type.Dynamic:
                 continue
-            if self.global_friction > 0 and body.linear_velocity.lengthSquared() > 0:
+            if body.linear_velocity.lengthSquared() > 0:
                 # apply slow donw effect
                 linear_velocity_after = body.linear_velocity - (1 - self.global_friction * body.friction) * dt * body.linear_velocity - 3 * self.global_friction * dt * body.linear_velocity.normalized()
                 if Vec2.dotProduct(linear_velocity_after, body.linear_velocity) > 0:
                     body.linear_velocity = linear_velocity_after
                 else:
                     body.linear_velocity *= 0
-                angle_velocity_after = body.angle_velocity - body.angle_velocity**0 * self.global_friction * dt
+            if body.angle_velocity != 0:
+                angle_velocity_after = body.angle_velocity - copysign(self.global_friction * dt, body.angle_velocity)
                 if angle_velocity_after * body.angle_velocity > 0:
                     body.angle_velocity = angle_velocity_after
                 else:
                     body.angle_velocity = 0.0
-        
 
-    def solve_contact(self):
-        # contact
-        for bodyA in self._bodies:
+    def solve_movement(self, dt):
+        # movement
+        self.integrate(dt)
+        self.apply_friction(dt)
+
+    def _bounds_of(self, bodies: [Body]) -> np.ndarray:
+        return np.array([body_bounds(body) for body in bodies]).reshape(-1, 4)
+
+    def _moving(self, bodies: [Body]) -> np.ndarray:
+        return np.array([body.linear_velocity.lengthSquared() > 0.001 for body in bodies], dtype=bool)
+
+    def _all_body_bounds(self) -> ([Body], np.ndarray, np.ndarray):
+        bodies = self._bodies
+        return bodies, self._bounds_of(bodies), self._moving(bodies)
+
+    def _cell_size(self, bounds: np.ndarray) -> float:
+        # twice the mean extent, a body takes one to four cells
+        if not len(bounds):
+            return 1.0
+        return max(float(np.mean(bounds[:, 2:] - bounds[:, :2])) * 2, eps)
 
-            if bodyA.linear_velocity.lengthSquared() <= 0.001:
+    def _sleeping_index(self) -> ([Body], np.ndarray, CellIndex):
+        # sleeping bodies don't move, they are indexed once until a body falls asleep or wakes
+        if self._sleeping is None:
+            bodies = [body for body in self._bodies if body.sleeping]
+            bounds = self._bounds_of(bodies)
+            index = CellIndex(self._cell_size(bounds))
+            index.set_bounds(bounds)
+            self._sleeping = (bodies, bounds, index)
+        return self._sleeping
+
+    def _body_bounds(self) -> ([Body], np.ndarray, np.ndarray):
+        """
+        Bodies for the broadphase, their bounds and which of them are moving: the
+        awake bodies and the sleeping bodies in their cells. Two sleeping bodies
+        can't start a contact, the cost follows the awake bodies.
+        """
+        awake = self._awake
+        if len(awake) == len(self._bodies):
+            return self._all_body_bounds()
+        bounds = self._bounds_of(awake)
+        sleeping, sleeping_bounds, index = self._sleeping_index()
+        near = np.unique(index.query(bounds)[1])
+        bodies = awake + [sleeping[i] for i in near.tolist()]
+        moving = np.concatenate((self._moving(awake), np.zeros(len(near), dtype=bool)))
+        return bodies, np.concatenate((bounds, sleeping_bounds[near])), moving
+
+    def find_contacts(self, bodies: [Body], index_a: np.ndarray, index_b: np.ndarray):
+        # intersecting contacts of the pairs, records from the pool
+        pool = self._contacts
+        for a, b in zip(index_a.tolist(), index_b.tolist()):
+            contact = pool.peek()
+            contact.set(bodies[a], bodies[b])
+            if(contact.intersect):
+                pool.keep()
+                yield contact
+
+    def find_static_contacts(self, bodies: [Body], bounds: np.ndarray, moving: np.ndarray):
+        # only the statics near the body are tested, circles against the baked geometry
+        statics = self.static_index
+        pool = self._contacts
+        stats = self.stats.current
+        # candidates of all moving bodies in one query, in order of body then static
+        rows, candidates = statics.query_pairs(bounds[moving])
+        stats[PhysicsStats.StaticChecks] += len(candidates)
+        for a, i in zip(moving[rows].tolist(), candidates.tolist()):
+            bodyA = bodies[a]
+            contact = pool.peek()
+            if bodyA.shapeType != Shape.Type.Circle:
+                contact.set(bodyA, statics.bodies[i])
+            elif statics.collide(bodyA, i, contact) is None:
                 continue
-            for bodyB in self._bodies:
-                if (bodyA.position - bodyB.position).lengthSquared() > (bodyA.shape.radius+bodyB.shape.radius)**2:
-                    continue
-                contact = Contact(bodyA, bodyB)
-                if(contact.intersect):
-                    contact.resolve()  
+            if contact.intersect:
+                pool.keep()
+                stats[PhysicsStats.Contacts] += 1
+                yield contact
+
+    def solve_pairs(self, bodies: [Body], index_a: np.ndarray, index_b: np.ndarray):
+        resolve = 0.0
+        for contact in self.find_contacts(bodies, index_a, index_b):
+            t = timeit.default_timer()
+            contact.resolve()
+            resolve += timeit.default_timer() - t
+            self._touching.append((contact.bodyA, contact.bodyB))
+        self.stats.current[PhysicsStats.Resolve] += resolve
+
+    def solve_statics(self, bodies: [Body], bounds: np.ndarray, moving: np.ndarray):
+        # contacts are found one at a time, each one sees the bodies moved by the last
+        resolve = 0.0
+        for contact in self.find_static_contacts(bodies, bounds, moving):
+            t = timeit.default_timer()
+            self.resolve_static(contact)
+            resolve += timeit.default_timer() - t
+        self.stats.current[PhysicsStats.Resolve] += resolve
+
+    def solve_cached(self, bodies: [Body], index_a: np.ndarray, index_b: np.ndarray, bounds: np.ndarray, moving: np.ndarray):
+        # all contacts of the tick are collected in the pool first, then solved together
+        for contact in self.find_contacts(bodies, index_a, index_b):
+            self._touching.append((contact.bodyA, contact.bodyB))
+        # static contacts need nothing besides being kept in the pool
+        list(self.find_static_contacts(bodies, bounds, moving))
+        t = timeit.default_timer()
+        self._cache.solve(self._contacts.contacts(), self.solver_iterations, self.warm_starting)
+        self.stats.current[PhysicsStats.Resolve] += timeit.default_timer() - t
+
+    def resolve_static(self, contact: Contact):
+        if(contact.intersect):
+            bodyA = contact.bodyA
+            vel_normal = Vec2.dotProduct(bodyA.linear_velocity, contact.normal)
+            contact.resolve()
+            if vel_normal < 0.01:
+                bodyA.linear_velocity -= vel_normal * contact.normal
+
+    def solve_contact(self):
+        self._contacts.reset()
+        if not self._awake:
+            # only awake bodies can start a contact
+            return
+        stats = self.stats.current
+        t = timeit.default_timer()
+        bodies, bounds, moving = self._body_bounds()
 
-            for bodyS in self._statics:
+        # contact, every candidate pair once, pairs of resting bodies are skipped
+        index_a, index_b = self.broadphase.find_pairs(bounds)
+        active = moving[index_a] | moving[index_b]
+        narrowphase = timeit.default_timer()
+        stats[PhysicsStats.Broadphase] += narrowphase - t
+        touching = len(self._touching)
+        resolve = stats[PhysicsStats.Resolve]
+        stats[PhysicsStats.Pairs] += int(np.count_nonzero(active))
+        if self.solver_iterations > 0:
+            self.solve_cached(bodies, index_a[active], index_b[active], bounds, np.flatnonzero(moving))
+        else:
+            self.solve_pairs(bodies, index_a[active], index_b[active])
+            self.solve_statics(bodies, bounds, np.flatnonzero(moving))
+        stats[PhysicsStats.Contacts] += len(self._touching) - touching
+        # narrowphase is what the contact search took besides resolving
+        stats[PhysicsStats.Narrowphase] += timeit.default_timer() - narrowphase - (stats[PhysicsStats.Resolve] - resolve)
 
-                contact = Contact(bodyA, bodyS)
-                if(contact.intersect):
-                    vel_normal = Vec2.dotProduct(bodyA.linear_velocity, contact.normal)
-                    contact.resolve()
-                    if vel_normal < 0.01:
-                        bodyA.linear_velocity -= vel_normal * contact.normal
+    def wake_islands(self):
+        # bodies woken by an impulse or by hand go back to the awake list
+        if self._woken:
+            self._sleeping = None
+        for island in self._woken:
+            self._awake.extend(island.bodies)
+        self._woken.clear()
+
+    def _resting(self, bodies: [Body]) -> np.ndarray:
+        return np.array([body.linear_velocity.lengthSquared() < self.sleep_velocity ** 2
+                         and abs(body.angle_velocity) < self.sleep_angle_velocity for body in bodies], dtype=bool)
+
+    def solve_sleep(self):
+        touching = self._touching
+        self._touching = []
+        self.contacts = len(touching)
+        if not self.allow_sleep:
+            return
+        bodies = self._awake
+        for body, resting in zip(bodies, self._resting(bodies)):
+            if resting:
+                body.sleep_time += 1
+            else:
+                body.sleep_time = 0
+
+        # islands of touching awake bodies, union find
+        parent = {body: body for body in bodies}
+        def find(body):
+            while parent[body] is not body:
+                parent[body] = parent[parent[body]]
+                body = parent[body]
+            return body
+        for bodyA, bodyB in touching:
+            if bodyA in parent and bodyB in parent:
+                parent[find(bodyA)] = find(bodyB)
+        islands = {}
+        for body in bodies:
+            islands.setdefault(find(body), []).append(body)
+
+        awake = []
+        for island in islands.values():
+            if all(body.sleep_time >= self.sleep_ticks for body in island):
+                Island(island, self._woken)
+                self._sleeping = None
+            else:
+                awake.extend(island)
+        self._awake = awake
+
+    def solve(self, dt):
+        # one tick of the simulation
+        stats = self.stats.current
+        self.wake_islands()
+        self.solve_contact()
+        self.wake_islands()
+        t = timeit.default_timer()
+        self.solve_movement(dt)
+        sleep = timeit.default_timer()
+        stats[PhysicsStats.Integrate] += sleep - t
+        self.solve_sleep()
+        stats[PhysicsStats.Sleep] += timeit.default_timer() - sleep
+
+    def _max_speed(self) -> float:
+        if not self._awake:
+            return 0.0
+        return max(body.linear_velocity.lengthSquared() for body in self._awake) ** 0.5
+
+    def substeps(self, dt) -> int:
+        # substeps for the fastest awake body, 1 unless something moves fast
+        if self.max_substeps <= 1 or not self._min_size:
+            return 1
+        travel = self._max_speed() * dt / (self.substep_travel * self._min_size)
+        return min(max(ceil(travel), 1), self.max_substeps)
+
+    def step(self, dt:float=None) -> StepStats:
+        if dt is None:
+            dt = self.dt
+        stats = self.stats
+        stats.begin()
+        t = timeit.default_timer()
+        self.flush_removals()
+        substeps = self.substeps(dt)
+        for i in range(substeps):
+            self.solve(dt / substeps)
+        elapsed = timeit.default_timer() - t
+        self.frametime = 1000 * elapsed
+        self.time += dt
+        self.ticks += 1
 
- 
+        current = stats.current
+        current[PhysicsStats.Total] = elapsed
+        current[PhysicsStats.Awake] = len(self._awake)
+        current[PhysicsStats.Sleeping] = len(self._bodies) - len(self._awake)
+        current[PhysicsStats.Substeps] = substeps
+        pairs = int(current[PhysicsStats.Pairs] + current[PhysicsStats.StaticChecks])
+        resolved = int(current[PhysicsStats.Contacts])
+        stats.record()
+        if self.recorder is not None:
+            self.recorder.record()
+        return StepStats(self.ticks, self.time, dt, self.frametime, len(self._awake), self.contacts, substeps,
+                         pairs, resolved)
+
+    def accumulate(self, elapsed: float) -> int:
+        """
+        Add elapsed real time and run as many fixed dt steps as it covers,
+        the remainder is kept for the next call. Returns the number of steps.
+        """
+        self._accumulator += min(elapsed, self.max_frame_time)
+        steps = 0
+        frametime = 0.0
+        while self._accumulator >= self.dt:
+            if self._accumulator < 2 * self.dt:
+                # state before the last step of the frame, rendering interpolates from it
+                self._previous = {body: Vec2(body.position) for body in self._awake}
+            self.step()
+            frametime += self.frametime
+            self._accumulator -= self.dt
+            steps += 1
+        if steps:
+            self.frametime = frametime
+        self.alpha = self._accumulator / self.dt
+        return steps
+
+    def interpolated_position(self, body: Body) -> Vec2:
+        # position between the last two steps for the time the accumulator is ahead
+        previous = self._previous.get(body)
+        if previous is None:
+            return body.position
+        return previous + (body.position - previous) * self.alpha
+
+    def _query_index(self) -> ([Body], np.ndarray, CellIndex):
+        # all bodies by cell for the scene queries, built at most once per tick
+        if self._queries is None or self._queries[0] != self.ticks:
+            bodies, bounds, moving = self._all_body_bounds()
+            index = CellIndex(self._cell_size(bounds))
+            index.set_bounds(bounds)
+            self._queries = (self.ticks, bodies, bounds, index)
+        return self._queries[1:]
+
+    def _query_candidates(self, box) -> ([Body], np.ndarray, np.ndarray):
+        # bodies and their bounds in the cells of box, and the statics in its cells
+        bodies, bounds, index = self._query_index()
+        rows = np.unique(index.query(np.array([box], dtype=float))[1])
+        static_rows = np.array(self.static_index.query(box), dtype=np.intp)
+        return [bodies[i] for i in rows.tolist()], bounds[rows], static_rows
+
+    def query_aabb(self, bounds) -> [Body]:
+        """
+        Bodies and statics whose bounds overlap (min_x, min_y, max_x, max_y). Only the
+        cells of the box are searched, bodies are indexed once per tick, a body moved
+        by hand between steps is found at its new place after the next step.
+        """
+        bodies, body_bounds, static_rows = self._query_candidates(bounds)
+        statics = self.static_index
+        found = [bodies[i] for i in overlapping(body_bounds, bounds).tolist()]
+        # the cells of a static are wider than its bounds
+        found.extend(statics.bodies[i] for i in static_rows[overlapping(statics.bounds[static_rows], bounds)].tolist())
+        return found
+
+    def raycast(self, origin: Vec2, direction: Vec2, max_distance: float = inf, ignore=()) -> RayHit:
+        # first body along the ray, None if nothing is hit within max_distance
+        return self.circle_cast(origin, 0.0, direction, max_distance, ignore)
+
+    def circle_cast(self, origin: Vec2, radius: float, direction: Vec2, max_distance: float = inf, ignore=()) -> RayHit:
+        # first body hit by a circle moving from origin, the hit position is where a ball would stop
+        length = direction.length()
+        if length <= eps:
+            return None
+        # an endless cast ends where it leaves the bounds of everything
+        if max_distance == inf:
+            extent = self._extent()
+            if extent is None:
+                return None
+            index, enter = ray_boxes(extent[np.newaxis], origin.x(), origin.y(), direction.x() / length,
+                                     direction.y() / length, inf, radius)
+            if not len(index):
+                return None
+            width, height = (extent[2:] - extent[:2] + 2 * radius).tolist()
+            distance = float(enter[0]) + (width * width + height * height) ** 0.5
+        else:
+            distance = max_distance
+        end = origin + direction * (distance / length)
+        box = (min(origin.x(), end.x()) - radius, min(origin.y(), end.y()) - radius,
+               max(origin.x(), end.x()) + radius, max(origin.y(), end.y()) + radius)
+        bodies, bounds, static_rows = self._query_candidates(box)
+        return cast(bodies, bounds, self.static_index, origin, radius, direction, max_distance, ignore, static_rows)
+
+    def _extent(self) -> np.ndarray:
+        # bounds around all bodies and statics, None for an empty world
+        bounds = np.concatenate((self._query_index()[1], self.static_index.bounds))
+        if not len(bounds):
+            return None
+        return np.concatenate((bounds[:, :2].min(axis=0), bounds[:, 2:].max(axis=0)))
+
+    def at_rest(self) -> bool:
+        self.wake_islands()
+        return bool(self._resting(self._awake).all())
+
+    def state(self) -> [BodyState]:
+        return [BodyState(body) for body in self._bodies]
+
+    def snapshot(self, clock: bool = False) -> Snapshot:
+        # with clock the interpolation follows the wall clock, for readers on another thread
+        return Snapshot(self.time, self.ticks, self.frametime, self.dt, self._bodies, self._previous, None if clock else self.alpha)
+
+    def run_until_rest(self, max_time:float, dt:float=None) -> SimulationResult:
+        """
+        Step in a tight loop until every body is at rest or max_time of simulation
+        time has passed, returns the final state and the stats of every step.
+        """
+        if dt is None:
+            dt = self.dt
+        steps = []
+        start = self.time
+        at_rest = self.at_rest()
+        while not at_rest and self.time - start < max_time:
+            steps.append(self.step(dt))
+            at_rest = self.at_rest()
+        return SimulationResult(self.time - start, len(steps), at_rest, self.state(), steps)
 
     @Slot()
     def update(self):
+        now = timeit.default_timer()
+        elapsed = self.dt if self._last_update is None else now - self._last_update
+        self._last_update = now
         self._mutex.lock()
-        t = timeit.default_timer()
-        self.solve_contact()
-        self.solve_movement(self.dt)
-        self.frametime = 1000 * (timeit.default_timer() - t)
+        self.accumulate(elapsed)
         self._mutex.unlock()
 
 
-# Do not use
+class PhysicsManager_Array(PhysicsManager):
+    """
+    Dynamic bodies are stored in a BodyArray, integration, global friction
+    and circle to circle contacts run as batched numpy operations instead of
+    a loop over bodies.
+    """
+    def __init__(self, timer:Timer=None, broadphase:Broadphase=None, headless:bool=False, static_index:StaticIndex=None, capacity:int=64):
+        super().__init__(timer, broadphase, headless, static_index)
+        self._array = BodyArray(capacity)
+        # array row of every body given to the broadphase
+        self._rows = None
+
+    def add_body(self, body: Body) -> int:
+        handle = super().add_body(body)
+        if body.type == Body.Type.Dynamic:
+            self._array.bind(body)
+        return handle
+
+    def add_bodies(self, bodies: list[Body]) -> [int]:
+        handles = super().add_bodies(bodies)
+        for body in bodies:
+            if body.type == Body.Type.Dynamic:
+                self._array.bind(body)
+        return handles
+
+    def _remove_bodies(self, bodies: [Body]):
+        super()._remove_bodies(bodies)
+        for body in bodies:
+            if body.type == Body.Type.Dynamic:
+                self._array.unbind(body)
+
+    def _awake_index(self) -> np.ndarray:
+        # rows of the awake bodies, None when all are awake so the arrays are used whole
+        array = self._array
+        if len(self._awake) == array.count == len(self._bodies):
+            return None
+        awake = [body._index for body in self._awake if body.type == Body.Type.Dynamic]
+        if len(awake) == array.count:
+            return None
+        return np.array(awake, dtype=np.intp)
+
+    def integrate(self, dt):
+        self._array.integrate(dt, self._awake_index())
+
+    def apply_friction(self, dt):
+        if self.global_friction > 0:
+            self._array.apply_friction(self.global_friction, dt, self._awake_index())
+
+    def _row_bounds(self, rows: np.ndarray) -> np.ndarray:
+        position = self._array.position[rows]
+        radius = self._array.radius[rows, np.newaxis]
+        return np.concatenate((position - radius, position + radius), axis=1)
+
+    def _bounds_of(self, bodies: [Body]) -> np.ndarray:
+        return self._row_bounds(np.array([body._index for body in bodies], dtype=np.intp))
+
+    def _all_body_bounds(self) -> ([Body], np.ndarray, np.ndarray):
+        array = self._array
+        velocity = array.linear_velocity[:array.count]
+        return array.bodies, self._row_bounds(np.arange(array.count)), np.einsum('ij,ij->i', velocity, velocity) > 0.001
+
+    def _body_bounds(self) -> ([Body], np.ndarray, np.ndarray):
+        # rows of the awake bodies and the sleeping ones in their cells, kept in _rows for solve_pairs
+        array = self._array
+        rows = self._awake_index()
+        if rows is None:
+            rows = np.arange(array.count)
+            bodies = array.bodies
+        else:
+            sleeping, sleeping_bounds, index = self._sleeping_index()
+            near = np.unique(index.query(self._row_bounds(rows))[1])
+            rows = np.concatenate((rows, np.array([sleeping[i]._index for i in near.tolist()], dtype=np.intp)))
+            bodies = [array.bodies[row] for row in rows.tolist()]
+        self._rows = rows
+        velocity = array.linear_velocity[rows]
+        moving = np.einsum('ij,ij->i', velocity, velocity) > 0.001
+        return bodies, self._row_bounds(rows), moving
+
+    def _max_speed(self) -> float:
+        velocity = self._array.linear_velocity[:self._array.count]
+        if not len(velocity):
+            return 0.0
+        return float(np.sqrt(np.einsum('ij,ij->i', velocity, velocity).max()))
+
+    def _resting(self, bodies: [Body]) -> np.ndarray:
+        array = self._array
+        index = np.array([body._index for body in bodies], dtype=np.intp)
+        velocity = array.linear_velocity[index]
+        return (np.einsum('ij,ij->i', velocity, velocity) < self.sleep_velocity ** 2) \
+            & (np.abs(array.angle_velocity[index]) < self.sleep_angle_velocity)
+
+    def solve_pairs(self, bodies: [Body], index_a: np.ndarray, index_b: np.ndarray):
+        # circle pairs are solved in batches, other shapes fall back to Contact
+        array = self._array
+        rows = self._rows
+        batched = array.circle[rows[index_a]] & array.circle[rows[index_b]]
+        t = timeit.default_timer()
+        touching_a, touching_b = solve_circle_pairs(array, rows[index_a[batched]], rows[index_b[batched]])
+        # the batch tests and resolves in one go, counted as resolve
+        self.stats.current[PhysicsStats.Resolve] += timeit.default_timer() - t
+        for a, b in zip(touching_a, touching_b):
+            bodyA = array.bodies[a]
+            bodyB = array.bodies[b]
+            # impulses are written to the arrays directly, wake up the bodies here
+            if bodyA.sleeping:
+                bodyA.wake()
+            if bodyB.sleeping:
+                bodyB.wake()
+            self._touching.append((bodyA, bodyB))
+        super().solve_pairs(bodies, index_a[~batched], index_b[~batched])
+
+
 class PhysicsManager_Grid(PhysicsManager):
-    def __init__(self, timer:Timer, world_width, world_height, grid_width, grid_height):
-        super().__init__(timer)
-        self.grid = CollisionGrid(grid_width, grid_height, world_width // grid_width, world_height // grid_height)
-        self._threadpool = ThreadPool()
-        self._sub_steps = 2
-        self.num_body = 0
-    
+    """
+    PhysicsManager using a SpatialHash broadphase, cells of the hash and of the
+    static index are world_width / grid_width by world_height / grid_height.
+    The hash is unbounded, bodies out of the world size are still handled.
+    """
+    def __init__(self, timer:Timer, world_width, world_height, grid_width, grid_height, headless:bool=False):
+        cell_width = world_width / grid_width
+        cell_height = world_height / grid_height
+        super().__init__(timer, SpatialHash(cell_width, cell_height), headless, StaticIndex(cell_width, cell_height))
+        self.grid = self.broadphase
+
     def add_static_body(self, body:Body):
         body.type = Body.Type.Static
-        self.grid.load_body(body)
-    
+        self.add_body(body)
+
     def add_static_body_cell(self, body:Body, coordinate: (int,int)):
-        body.type = Body.Type.Static
-        x,y = coordinate
-        self.grid.cell(x,y).add_body(body)
+        self.add_static_body_multicell(body, [coordinate])
 
-    def add_static_body_multicell(self, body:Body, coordinates: [(int,int)]):
+    def add_static_body_multicell(self, body:Body, coordinates: [(int,int)]) -> int:
         body.type = Body.Type.Static
-        for x,y in coordinates:
-            self.grid.cell(x,y).add_body(body)
-
-    def reload_grid(self):
-        self.grid.unload_body()
-        for body in self._bodies:
-            self.grid.load_body(body)
-    
-    class ContactSolver(Worker):
-        def __init__(self, manager, i, slice_size):
-            super().__init__()
-            self.manager = manager
-            self.i = i
-            self.slice_size = slice_size
-
-        def run(self):
-            start = self.i * self.slice_size
-            end = start + self.slice_size
-            for index in range(start, end):
-                self.manager.grid.check_collision(index)
-        
-    
-    def solve_contact(self):
-        thread_count = self._threadpool.maxThreadCount()
-        slice_count = thread_count * 2
-        slice_size = int(self.grid.width / slice_count) * self.grid.height
-        if slice_size < self.grid.height:
-            slice_size = 1
-        for i in range(0, thread_count):
-            worker = self.ContactSolver(self, 2 * i, slice_size) 
-            worker.setAutoDelete(True)
-            self._threadpool.start(worker)
-        self._threadpool.waitForDone()
-
-        for i in range(0, thread_count):
-            worker = self.ContactSolver(self, 2 * i + 1, slice_size) 
-            worker.setAutoDelete(True)
-            self._threadpool.start(worker)
-        self._threadpool.waitForDone()
-    
-    @Slot()
-    def update(self):
-        self.num_body = 0
-        t = timeit.default_timer()
-        sub_dt = self.dt / self._sub_steps
-        for i in range(0, self._sub_steps):
-            self.reload_grid()
-            self.solve_contact()
-            self.solve_movement(sub_dt)
-        self.frametime = 1000 * (timeit.default_timer() - t)
-
+        handle = self._register(body)
+        self.static_index.add(body, coordinates)
+        return handle
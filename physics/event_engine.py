@@ -0,0 +1,439 @@
+from PySide6.QtCore import QTimer as Timer
+
+from physics.common import *
+from physics.shape import Shape
+from physics.body import Body
+from physics.contact import Contact
+from physics.static_index import StaticIndex
+from physics.core import PhysicsManager
+from physics.simulation import StepStats, SimulationResult
+
+from math import exp, log, sqrt, hypot, inf
+from itertools import count
+from enum import Enum
+import heapq
+import timeit
+
+
+class Trajectory():
+    """
+    Closed form motion of a circle under the global friction of PhysicsManager,
+    taken to the continuous limit: speed' = -k * speed - c along a straight line.
+    Times are absolute (time of the event engine), the trajectory starts at time.
+    """
+    time: float
+    x: float
+    y: float
+    ux: float
+    uy: float
+    speed: float
+    duration: float
+    travel: float
+
+    def __init__(self, body: Body, time: float, global_friction: float):
+        self.time = time
+        self.x, self.y = body.position.toTuple()
+        vx, vy = body.linear_velocity.toTuple()
+        self.speed = hypot(vx, vy)
+        if self.speed > 0:
+            self.ux = vx / self.speed
+            self.uy = vy / self.speed
+        else:
+            self.ux = self.uy = 0.0
+        self.angle = body.angle
+        self.angle_velocity = body.angle_velocity
+
+        if global_friction > 0:
+            self.k = 1 - global_friction * body.friction
+            self.c = 3 * global_friction
+            self.angle_deceleration = global_friction
+        else:
+            self.k = self.c = self.angle_deceleration = 0.0
+
+        # time until the ball stops and distance travelled until then
+        s0 = self.speed
+        k = self.k
+        c = self.c
+        if s0 == 0:
+            self.duration = 0.0
+        elif c <= 0:
+            self.duration = inf
+        elif abs(k) < eps:
+            self.duration = s0 / c
+        elif 1 + k * s0 / c > 0:
+            self.duration = log(1 + k * s0 / c) / k
+        else:
+            self.duration = inf
+        self.travel = self._distance(self.duration) if self.duration < inf else inf
+
+    def _distance(self, tau: float) -> float:
+        s0 = self.speed
+        k = self.k
+        c = self.c
+        if abs(k) < eps:
+            return s0 * tau - 0.5 * c * tau * tau
+        return (s0 + c / k) * (1 - exp(-k * tau)) / k - c * tau / k
+
+    def _speed(self, tau: float) -> float:
+        k = self.k
+        c = self.c
+        if abs(k) < eps:
+            return self.speed - c * tau
+        return (self.speed + c / k) * exp(-k * tau) - c / k
+
+    @property
+    def end(self) -> float:
+        # absolute time the ball stops moving and spinning
+        spin = abs(self.angle_velocity) / self.angle_deceleration if self.angle_deceleration > 0 else 0.0
+        return self.time + max(self.duration, spin)
+
+    def distance(self, t: float) -> float:
+        tau = min(t - self.time, self.duration)
+        if tau <= 0:
+            return 0.0
+        return self._distance(tau)
+
+    def speed_at(self, t: float) -> float:
+        tau = t - self.time
+        if tau >= self.duration:
+            return 0.0
+        return max(self._speed(max(tau, 0.0)), 0.0)
+
+    def position(self, t: float) -> (float, float):
+        d = self.distance(t)
+        return (self.x + self.ux * d, self.y + self.uy * d)
+
+    def velocity(self, t: float) -> (float, float):
+        s = self.speed_at(t)
+        return (self.ux * s, self.uy * s)
+
+    def time_at(self, distance: float) -> float:
+        # absolute time the ball has travelled distance, None if it stops before
+        if distance <= 0:
+            return self.time
+        if distance > self.travel:
+            return None
+        if abs(self.k) < eps and self.c > 0:
+            s0 = self.speed
+            return self.time + (s0 - sqrt(max(s0 * s0 - 2 * self.c * distance, 0.0))) / self.c
+        if self.c <= 0 and abs(self.k) < eps:
+            return self.time + distance / self.speed
+        # distance is monotone in time, newton steps kept inside a bisection bracket
+        low = 0.0
+        high = self.duration if self.duration < inf else distance / max(self._speed(0), eps) * 2
+        while self._distance(high) < distance:
+            high *= 2
+        tau = distance / self.speed
+        tau = min(max(tau, low), high)
+        for i in range(50):
+            f = self._distance(tau) - distance
+            if abs(f) < 1e-9:
+                break
+            if f > 0:
+                high = tau
+            else:
+                low = tau
+            s = self._speed(tau)
+            step = tau - f / s if s > eps else (low + high) / 2
+            tau = step if low < step < high else (low + high) / 2
+        return self.time + tau
+
+    def apply(self, body: Body, t: float):
+        # write the state at time t back to the body
+        x, y = self.position(t)
+        vx, vy = self.velocity(t)
+        body.position = Vec2(x, y)
+        body.linear_velocity = Vec2(vx, vy)
+        tau = max(t - self.time, 0.0)
+        w = self.angle_velocity
+        a = self.angle_deceleration
+        if a > 0 and w != 0:
+            stop = abs(w) / a
+            spin = min(tau, stop)
+            body.angle_velocity = w - copysign(a * spin, w) if tau < stop else 0.0
+            body.angle = (self.angle + w * spin - copysign(0.5 * a * spin * spin, w)) % (2 * Pi)
+        else:
+            body.angle_velocity = w
+            body.angle = (self.angle + w * tau) % (2 * Pi)
+
+    def bounds(self, t: float, end: float, radius: float) -> (float, float, float, float):
+        # bounding box of the path between t and end
+        x1, y1 = self.position(t)
+        x2, y2 = self.position(end)
+        return (min(x1, x2) - radius, min(y1, y2) - radius, max(x1, x2) + radius, max(y1, y2) + radius)
+
+
+def _distance_to_point(traj: Trajectory, t: float, point: (float, float), radius: float) -> float:
+    # distance along the path from time t until the center is within radius of point
+    x, y = traj.position(t)
+    wx = x - point[0]
+    wy = y - point[1]
+    b = traj.ux * wx + traj.uy * wy
+    c = wx * wx + wy * wy - radius * radius
+    if c <= 0:
+        return 0.0 if b < 0 else None
+    if b >= 0:
+        return None
+    discriminant = b * b - c
+    if discriminant < 0:
+        return None
+    return -b - sqrt(discriminant)
+
+
+class Event():
+    class Type(Enum):
+        Ball = 0
+        Static = 1
+        Pocket = 2
+
+    type: Type
+    time: float
+    bodyA: Body
+    bodyB: Body
+    pocket: int
+
+    def __init__(self, type, time, bodyA, bodyB=None, pocket=-1):
+        self.type = type
+        self.time = time
+        self.bodyA = bodyA
+        self.bodyB = bodyB
+        self.pocket = pocket
+
+
+class PhysicsManager_Event(PhysicsManager):
+    """
+    Event driven engine for circle bodies. Between collisions the motion under global
+    friction has a closed form, so the next ball, cushion (edge or corner) and pocket
+    event is predicted and the simulation jumps straight to it.
+    A shot resolves in as many steps as it has events instead of one per tick.
+    Only balls touched by an event are predicted again.
+    """
+    # balls are advanced until they overlap by slop, so Contact finds the hit
+    slop = 0.01
+    tolerance = 1e-4
+    max_iterations = 200
+    max_substeps = 1
+
+    def __init__(self, timer:Timer=None, headless:bool=False):
+        super().__init__(timer, None, headless)
+        self.allow_sleep = False
+        self.pockets = []
+        self.potted = []
+        self.events = []
+
+    def add_body(self, body: Body) -> int:
+        if body.type != Body.Type.Static and body.shapeType != Shape.Type.Circle:
+            raise Exception('event engine only simulates circle bodies')
+        return super().add_body(body)
+
+    def add_bodies(self, bodies: list[Body]) -> [int]:
+        if any(body.type != Body.Type.Static and body.shapeType != Shape.Type.Circle for body in bodies):
+            raise Exception('event engine only simulates circle bodies')
+        return super().add_bodies(bodies)
+
+    def add_pocket(self, position: Vec2, radius: float):
+        # a ball whose center gets within radius of position is potted
+        self.pockets.append(((position.x(), position.y()), radius))
+
+    def _static_geometry(self):
+        # plain tuples from the baked static arrays, faster to loop over
+        statics = self.static_index
+        edges = []
+        circles = []
+        for i, body in enumerate(statics.bodies):
+            if statics.kind[i] == StaticIndex.Edge:
+                if statics.length[i] < eps:
+                    continue
+                edges.append((body, *statics.start[i].tolist(), *statics.end[i].tolist(), *statics.direction[i].tolist(), float(statics.length[i])))
+            else:
+                circles.append((body, *statics.start[i].tolist(), float(statics.radius[i])))
+        return edges, circles
+
+    def _predict_pair(self, i: int, j: int, t: float, end: float):
+        A = self._trajectories[i]
+        B = self._trajectories[j]
+        R = self._balls[i].shape.radius + self._balls[j].shape.radius
+        horizon = min(max(A.end, B.end), end)
+        if horizon < t:
+            return None
+        a = A.bounds(t, horizon, self._balls[i].shape.radius)
+        b = B.bounds(t, horizon, self._balls[j].shape.radius)
+        if a[0] > b[2] or b[0] > a[2] or a[1] > b[3] or b[1] > a[3]:
+            return None
+
+        # conservative advancement, the gap never closes faster than the sum of the speeds
+        R -= self.slop
+        for iteration in range(self.max_iterations):
+            ax, ay = A.position(t)
+            bx, by = B.position(t)
+            dx = bx - ax
+            dy = by - ay
+            gap = hypot(dx, dy) - R
+            avx, avy = A.velocity(t)
+            bvx, bvy = B.velocity(t)
+            closing = A.speed_at(t) + B.speed_at(t)
+            if gap <= self.tolerance and dx * (bvx - avx) + dy * (bvy - avy) < 0:
+                return (t, Event.Type.Ball, j)
+            if closing <= eps:
+                return None
+            t += max(gap, self.tolerance) / closing
+            if t > horizon:
+                return None
+        # not settled yet, look again from there
+        return (t, None, j)
+
+    def _predict_statics(self, i: int, t: float, end: float):
+        traj = self._trajectories[i]
+        radius = self._balls[i].shape.radius - self.slop
+        first = None
+        def consider(distance, kind, other):
+            nonlocal first
+            if distance is None:
+                return
+            time = traj.time_at(traj.distance(t) + distance)
+            if time is not None and time <= end and (first is None or time < first[0]):
+                first = (max(time, t), kind, other)
+
+        if traj.speed_at(t) <= 0:
+            return None
+        x, y = traj.position(t)
+        for edge in self._edges:
+            body, x1, y1, x2, y2, ex, ey, length = edge
+            side = (x - x1) * ey - (y - y1) * ex
+            approach = traj.ux * ey - traj.uy * ex
+            if side < 0:
+                side = -side
+                approach = -approach
+            hit = None
+            if approach < 0:
+                distance = max((side - radius) / -approach, 0.0)
+                along = (x + traj.ux * distance - x1) * ex + (y + traj.uy * distance - y1) * ey
+                if 0 <= along <= length:
+                    hit = distance
+            if hit is None:
+                for point in ((x1, y1), (x2, y2)):
+                    distance = _distance_to_point(traj, t, point, radius)
+                    if distance is not None and (hit is None or distance < hit):
+                        hit = distance
+            consider(hit, Event.Type.Static, body)
+        for body, cx, cy, r in self._circles:
+            consider(_distance_to_point(traj, t, (cx, cy), radius + r), Event.Type.Static, body)
+        for index, (point, r) in enumerate(self.pockets):
+            consider(_distance_to_point(traj, t, point, r), Event.Type.Pocket, index)
+        return first
+
+    def _predict(self, i: int, t: float, end: float):
+        if not self._active[i]:
+            return
+        version = self._versions
+        found = self._predict_statics(i, t, end)
+        if found is not None:
+            time, kind, other = found
+            heapq.heappush(self._queue, (time, next(self._counter), kind, i, other, version[i], -1))
+        for j in range(len(self._balls)):
+            if j == i or not self._active[j]:
+                continue
+            found = self._predict_pair(i, j, t, end)
+            if found is not None:
+                time, kind, other = found
+                heapq.heappush(self._queue, (time, next(self._counter), kind, i, other, version[i], version[j]))
+
+    def _restart(self, i: int, t: float):
+        self._trajectories[i] = Trajectory(self._balls[i], t, self.global_friction)
+        self._versions[i] += 1
+
+    def advance(self, duration: float, until_rest: bool = False) -> float:
+        """
+        Simulate duration seconds jumping from event to event, returns the simulated time.
+        With until_rest the simulation ends as soon as every ball has stopped.
+        """
+        self.flush_removals()
+        self.wake_islands()
+        self._balls = list(self._bodies)
+        self._edges, self._circles = self._static_geometry()
+        self._trajectories = [Trajectory(body, 0.0, self.global_friction) for body in self._balls]
+        self._versions = [0] * len(self._balls)
+        self._active = [True] * len(self._balls)
+        self._queue = []
+        self._counter = count()
+        potted = []
+        first_event = len(self.events)
+
+        for i in range(len(self._balls)):
+            self._predict(i, 0.0, duration)
+
+        while self._queue:
+            t, _, kind, i, other, version_a, version_b = heapq.heappop(self._queue)
+            if t > duration:
+                break
+            if version_a != self._versions[i] or not self._active[i]:
+                continue
+            if kind is None or kind == Event.Type.Ball:
+                if version_b != self._versions[other] or not self._active[other]:
+                    continue
+            if kind is None:
+                found = self._predict_pair(i, other, t, duration)
+                if found is not None:
+                    time, kind, other = found
+                    heapq.heappush(self._queue, (time, next(self._counter), kind, i, other, version_a, version_b))
+                continue
+
+            bodyA = self._balls[i]
+            self._trajectories[i].apply(bodyA, t)
+            if kind == Event.Type.Ball:
+                bodyB = self._balls[other]
+                self._trajectories[other].apply(bodyB, t)
+                contact = Contact(bodyA, bodyB)
+                contact.time_impact = t
+                if contact.intersect:
+                    contact.resolve()
+                self.events.append(Event(kind, t, bodyA, bodyB))
+                self._restart(i, t)
+                self._restart(other, t)
+                self._predict(i, t, duration)
+                self._predict(other, t, duration)
+            elif kind == Event.Type.Static:
+                contact = Contact(bodyA, other)
+                contact.time_impact = t
+                self.resolve_static(contact)
+                self.events.append(Event(kind, t, bodyA, other))
+                self._restart(i, t)
+                self._predict(i, t, duration)
+            else:
+                bodyA.linear_velocity *= 0
+                bodyA.angle_velocity = 0.0
+                self._active[i] = False
+                self._versions[i] += 1
+                potted.append(bodyA)
+                self.events.append(Event(kind, t, bodyA, pocket=other))
+
+        end = duration
+        if until_rest:
+            end = min(duration, max([traj.end for traj, active in zip(self._trajectories, self._active) if active], default=0.0))
+        for body, traj, active in zip(self._balls, self._trajectories, self._active):
+            if active:
+                traj.apply(body, end)
+        self._remove_bodies(potted)
+        self.potted.extend(potted)
+        self.contacts = len(self.events) - first_event
+        return end
+
+    def solve(self, dt):
+        self.advance(dt)
+
+    def run_until_rest(self, max_time:float, dt:float=None) -> SimulationResult:
+        # dt is not used, the whole run is one jump from event to event
+        t = timeit.default_timer()
+        first_event = len(self.events)
+        elapsed = self.advance(max_time, until_rest=True)
+        self.frametime = 1000 * (timeit.default_timer() - t)
+        self.time += elapsed
+        self.ticks += 1
+        steps = []
+        last = 0.0
+        for number, event in enumerate(self.events[first_event:]):
+            steps.append(StepStats(number + 1, event.time, event.time - last, 0.0, len(self._awake), 1))
+            last = event.time
+        if steps:
+            steps[-1].frametime = self.frametime
+        return SimulationResult(elapsed, len(steps), self.at_rest(), self.state(), steps)
@@ -0,0 +1,25 @@
+from physics.body import Body
+
+
+class Island():
+    """
+    Group of touching bodies put to sleep together. Waking any of them wakes all,
+    the island is then queued in woken for the manager to take the bodies back.
+    """
+    bodies: [Body]
+
+    def __init__(self, bodies: [Body], woken: list):
+        self.bodies = bodies
+        self._woken = woken
+        for body in bodies:
+            body.sleeping = True
+            body.island = self
+            body.linear_velocity *= 0
+            body.angle_velocity = 0.0
+
+    def wake(self):
+        for body in self.bodies:
+            body.sleeping = False
+            body.sleep_time = 0
+            body.island = None
+        self._woken.append(self)
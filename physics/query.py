@@ -0,0 +1,183 @@
+import numpy as np
+from physics.common import *
+from physics.body import Body
+from physics.shape import Shape
+from physics.static_index import StaticIndex
+
+import math
+
+
+class RayHit():
+    body: Body
+    # first point of the body touched, on its surface
+    point: Vec2
+    # surface normal at point, facing the cast
+    normal: Vec2
+    # travel along the direction until the hit
+    distance: float
+    # center of the cast circle at the hit (ghost ball), the hit point for a ray
+    position: Vec2
+
+    def __init__(self, body, point, normal, distance, position):
+        self.body = body
+        self.point = point
+        self.normal = normal
+        self.distance = distance
+        self.position = position
+
+    def __repr__(self):
+        return f'RayHit({self.body}, {self.point.toTuple()}, {self.normal.toTuple()}, {self.distance:.3f})'
+
+
+def overlapping(bounds: np.ndarray, box) -> np.ndarray:
+    # indices of the rows of bounds overlapping box, both (min_x, min_y, max_x, max_y)
+    if not len(bounds):
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero((bounds[:, 0] <= box[2]) & (box[0] <= bounds[:, 2])
+                          & (bounds[:, 1] <= box[3]) & (box[1] <= bounds[:, 3]))
+
+
+def ray_boxes(bounds: np.ndarray, ox: float, oy: float, dx: float, dy: float, max_distance: float, inflate: float = 0.0) -> (np.ndarray, np.ndarray):
+    """
+    Slab test of a ray against all boxes at once, boxes grown by inflate.
+    Returns the indices of the boxes crossed within max_distance and where the ray
+    enters them, sorted by entry.
+    """
+    if not len(bounds):
+        return np.zeros(0, dtype=np.intp), np.zeros(0)
+    origin = np.array([ox, oy])
+    # a zero component never leaves its slab, a tiny one does the same without nan
+    direction = np.array([dx if abs(dx) > 1e-12 else 1e-12, dy if abs(dy) > 1e-12 else 1e-12])
+    inverse = 1.0 / direction
+    t1 = (bounds[:, 0:2] - inflate - origin) * inverse
+    t2 = (bounds[:, 2:4] + inflate - origin) * inverse
+    enter = np.minimum(t1, t2).max(axis=1)
+    leave = np.maximum(t1, t2).min(axis=1)
+    hit = np.flatnonzero((leave >= np.maximum(enter, 0.0)) & (enter <= max_distance))
+    enter = np.maximum(enter[hit], 0.0)
+    order = np.argsort(enter, kind='stable')
+    return hit[order], enter[order]
+
+
+def cast_circle(ox, oy, dx, dy, radius, cx, cy, radius_c) -> (float, float, float):
+    # circle of radius moving from o along unit d against a circle at c, (t, nx, ny) or None
+    r = radius + radius_c
+    mx = ox - cx
+    my = oy - cy
+    b = mx * dx + my * dy
+    c = mx * mx + my * my - r * r
+    if c > 0 and b > 0:
+        # outside and moving away
+        return None
+    discriminant = b * b - c
+    if discriminant < 0:
+        return None
+    t = max(-b - discriminant ** 0.5, 0.0)
+    nx = mx + dx * t
+    ny = my + dy * t
+    length = (nx * nx + ny * ny) ** 0.5
+    if length <= eps:
+        return t, -dx, -dy
+    return t, nx / length, ny / length
+
+
+def cast_segment(ox, oy, dx, dy, radius, x1, y1, x2, y2, ux, uy, length) -> (float, float, float):
+    # circle of radius moving along unit d against the segment x1 y1 to x2 y2, (t, nx, ny) or None
+    nx = uy
+    ny = -ux
+    side = (ox - x1) * nx + (oy - y1) * ny
+    if side < 0:
+        side = -side
+        nx = -nx
+        ny = -ny
+    approach = dx * nx + dy * ny
+    best = None
+    if side <= radius:
+        t = 0.0
+    elif approach < 0:
+        t = (side - radius) / -approach
+    else:
+        t = None
+    if t is not None:
+        along = (ox + dx * t - x1) * ux + (oy + dy * t - y1) * uy
+        if 0 <= along <= length:
+            best = (t, nx, ny)
+    # the end points, a ray only touches them edge on
+    for px, py in ((x1, y1), (x2, y2)):
+        hit = cast_circle(ox, oy, dx, dy, radius, px, py, 0.0)
+        if hit is not None and (best is None or hit[0] < best[0]):
+            best = hit
+    return best
+
+
+def cast_body(body: Body, ox, oy, dx, dy, radius) -> (float, float, float):
+    if body.shapeType == Shape.Type.Circle:
+        cx, cy = body.position.toTuple()
+        return cast_circle(ox, oy, dx, dy, radius, cx, cy, body.shape.radius)
+    x1, y1 = body.position.toTuple()
+    x2, y2 = body.point_local_to_world(body.shape.vec).toTuple()
+    length = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+    if length <= eps:
+        return cast_circle(ox, oy, dx, dy, radius, x1, y1, 0.0)
+    return cast_segment(ox, oy, dx, dy, radius, x1, y1, x2, y2, (x2 - x1) / length, (y2 - y1) / length, length)
+
+
+def cast(bodies: [Body], bounds: np.ndarray, statics: StaticIndex, origin: Vec2, radius: float, direction: Vec2,
+         max_distance: float = math.inf, ignore=(), static_rows: np.ndarray = None) -> RayHit:
+    """
+    First body hit by a circle of radius moving from origin along direction, a ray
+    for radius 0. Candidates come from a slab test on the bounds of the bodies and
+    of the statics in static_rows (all when None), they are tested in order of entry
+    and the search stops at the first candidate entered after the closest hit.
+    """
+    length = direction.length()
+    if length <= eps:
+        return None
+    ox, oy = origin.toTuple()
+    dx = direction.x() / length
+    dy = direction.y() / length
+    best = None
+    best_body = None
+
+    index, enter = ray_boxes(bounds, ox, oy, dx, dy, max_distance, radius)
+    for i, t in zip(index.tolist(), enter.tolist()):
+        if best is not None and t > best[0]:
+            break
+        body = bodies[i]
+        if body in ignore:
+            continue
+        hit = cast_body(body, ox, oy, dx, dy, radius)
+        if hit is not None and hit[0] <= max_distance and (best is None or hit[0] < best[0]):
+            best = hit
+            best_body = body
+
+    if static_rows is None:
+        static_rows = np.arange(len(statics))
+    index, enter = ray_boxes(statics.bounds[static_rows], ox, oy, dx, dy, max_distance, radius)
+    for i, t in zip(static_rows[index].tolist(), enter.tolist()):
+        if best is not None and t > best[0]:
+            break
+        body = statics.bodies[i]
+        if body in ignore:
+            continue
+        if statics.kind[i] == StaticIndex.Circle:
+            x, y = statics.start[i].tolist()
+            hit = cast_circle(ox, oy, dx, dy, radius, x, y, float(statics.radius[i]))
+        elif statics.length[i] <= eps:
+            x, y = statics.start[i].tolist()
+            hit = cast_circle(ox, oy, dx, dy, radius, x, y, 0.0)
+        else:
+            x1, y1 = statics.start[i].tolist()
+            x2, y2 = statics.end[i].tolist()
+            ux, uy = statics.direction[i].tolist()
+            hit = cast_segment(ox, oy, dx, dy, radius, x1, y1, x2, y2, ux, uy, float(statics.length[i]))
+        if hit is not None and hit[0] <= max_distance and (best is None or hit[0] < best[0]):
+            best = hit
+            best_body = body
+
+    if best is None:
+        return None
+    t, nx, ny = best
+    px = ox + dx * t
+    py = oy + dy * t
+    return RayHit(best_body, Vec2(px - nx * radius, py - ny * radius), Vec2(nx, ny), t, Vec2(px, py))
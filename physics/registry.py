@@ -0,0 +1,55 @@
+from physics.body import Body
+
+
+class BodyRegistry():
+    """
+    Bodies in a dense list with stable integer handles. Removing swaps the last
+    body into the free slot, so add and remove are O(1) and the list stays packed
+    for the loops over it. The order of bodies changes on removal, handles don't.
+    """
+    bodies: [Body]
+
+    def __init__(self):
+        self.bodies = []
+        self._handles = []
+        # handle to position in bodies, body to handle
+        self._index = {}
+        self._handle_of = {}
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def __iter__(self):
+        return iter(self.bodies)
+
+    def __contains__(self, body: Body):
+        return body in self._handle_of
+
+    def add(self, body: Body, handle: int):
+        if body in self._handle_of:
+            raise Exception('body is already registered')
+        self._index[handle] = len(self.bodies)
+        self._handle_of[body] = handle
+        self.bodies.append(body)
+        self._handles.append(handle)
+
+    def remove(self, body: Body) -> int:
+        handle = self._handle_of.pop(body)
+        i = self._index.pop(handle)
+        last = len(self.bodies) - 1
+        if i != last:
+            moved = self.bodies[last]
+            moved_handle = self._handles[last]
+            self.bodies[i] = moved
+            self._handles[i] = moved_handle
+            self._index[moved_handle] = i
+        self.bodies.pop()
+        self._handles.pop()
+        return handle
+
+    def handle(self, body: Body) -> int:
+        return self._handle_of.get(body)
+
+    def get(self, handle: int) -> Body:
+        i = self._index.get(handle)
+        return None if i is None else self.bodies[i]
@@ -0,0 +1,197 @@
+import numpy as np
+from physics.common import *
+from physics.body import Body
+from physics.shape import Shape
+
+import struct
+
+
+_magic = b'PHYSREPL'
+# magic, version, bodies, keyframe interval, dt
+_header = struct.Struct('<8sIIId')
+# columns of a tick: x, y, vx, vy, angle, angle velocity, one row per body
+_columns = 6
+
+
+class _Layout():
+    """
+    Byte offsets in a replay file. Ticks are fixed size records, every interval-th
+    one is a keyframe in float64, the others are float32, so the offset of a tick
+    is plain arithmetic and seeking doesn't read anything before it.
+    """
+    def __init__(self, bodies: int, interval: int):
+        self.bodies = bodies
+        self.interval = interval
+        self.start = _header.size + 4 * bodies
+        self.keyframe_size = 8 * _columns * bodies
+        self.frame_size = 4 * _columns * bodies
+        self.block_size = self.keyframe_size + (interval - 1) * self.frame_size
+
+    def offset(self, tick: int) -> int:
+        block, i = divmod(tick, self.interval)
+        offset = self.start + block * self.block_size
+        if i:
+            offset += self.keyframe_size + (i - 1) * self.frame_size
+        return offset
+
+    def ticks(self, file_size: int) -> int:
+        # complete ticks in a file of that size
+        blocks, rest = divmod(file_size - self.start, self.block_size)
+        ticks = blocks * self.interval
+        if rest >= self.keyframe_size:
+            ticks += 1 + (rest - self.keyframe_size) // self.frame_size
+        return ticks
+
+
+class ReplayRecorder():
+    """
+    Appends the state of a fixed list of bodies after every step to a replay file.
+    Bodies removed from the manager are written as nan. Set it as manager.recorder
+    to record every step, or call record() by hand.
+    """
+    path: str
+    bodies: [Body]
+    keyframe_interval: int
+    ticks: int
+
+    def __init__(self, path: str, manager, bodies: [Body] = None, keyframe_interval: int = 60):
+        if keyframe_interval < 1:
+            raise Exception('keyframe interval must be at least 1')
+        self.path = path
+        self.manager = manager
+        self.bodies = list(bodies) if bodies is not None else list(manager._bodies)
+        self.keyframe_interval = keyframe_interval
+        self.ticks = 0
+        self._state = np.zeros((_columns, len(self.bodies)))
+        self._file = open(path, 'wb')
+        self._file.write(_header.pack(_magic, 1, len(self.bodies), keyframe_interval, manager.dt))
+        radius = [body.shape.radius if body.shapeType == Shape.Type.Circle else 0.0 for body in self.bodies]
+        self._file.write(np.array(radius, dtype='<f4').tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self):
+        state = self._state
+        present = set(self.manager._bodies)
+        for i, body in enumerate(self.bodies):
+            if body in present:
+                x, y = body.position.toTuple()
+                vx, vy = body.linear_velocity.toTuple()
+                state[:, i] = (x, y, vx, vy, body.angle, body.angle_velocity)
+            else:
+                state[:, i] = np.nan
+        dtype = '<f8' if self.ticks % self.keyframe_interval == 0 else '<f4'
+        self._file.write(state.astype(dtype).tobytes())
+        self.ticks += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if self.manager.recorder is self:
+            self.manager.recorder = None
+
+
+class ReplayFrame():
+    """State of the recorded bodies at one tick, columns of length bodies."""
+    tick: int
+    keyframe: bool
+    position: np.ndarray
+    velocity: np.ndarray
+    angle: np.ndarray
+    angle_velocity: np.ndarray
+
+    def __init__(self, tick: int, keyframe: bool, state: np.ndarray):
+        self.tick = tick
+        self.keyframe = keyframe
+        self.position = state[0:2].T
+        self.velocity = state[2:4].T
+        self.angle = state[4]
+        self.angle_velocity = state[5]
+
+    def present(self) -> np.ndarray:
+        # bodies still in the manager at that tick
+        return ~np.isnan(self.position[:, 0])
+
+
+class ReplayPlayer():
+    """
+    Reads a replay file through a memory map, only the pages of the ticks looked
+    at are loaded. Ticks written since opening are seen after refresh().
+    Frames between keyframes are float32, keyframes keep the full state, restore()
+    sets bodies to a keyframe to re-simulate a bad frame from shortly before it.
+    """
+    path: str
+    dt: float
+    keyframe_interval: int
+    radius: np.ndarray
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            magic, version, bodies, interval, dt = _header.unpack(file.read(_header.size))
+            if magic != _magic:
+                raise Exception(f'{path} is not a replay file')
+            if version != 1:
+                raise Exception(f'unknown replay version {version}')
+            self.radius = np.frombuffer(file.read(4 * bodies), dtype='<f4')
+        self.bodies = bodies
+        self.dt = dt
+        self.keyframe_interval = interval
+        self._layout = _Layout(bodies, interval)
+        self.refresh()
+
+    def refresh(self):
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        self.ticks = self._layout.ticks(len(self._data))
+
+    def __len__(self):
+        return self.ticks
+
+    def keyframe(self, tick: int) -> int:
+        # nearest keyframe at or before tick
+        return tick - tick % self.keyframe_interval
+
+    def frame(self, tick: int) -> ReplayFrame:
+        if tick < 0:
+            tick += self.ticks
+        if not 0 <= tick < self.ticks:
+            raise IndexError(f'tick {tick} not in replay of {self.ticks} ticks')
+        layout = self._layout
+        keyframe = tick % self.keyframe_interval == 0
+        offset = layout.offset(tick)
+        size = layout.keyframe_size if keyframe else layout.frame_size
+        state = self._data[offset:offset + size].view('<f8' if keyframe else '<f4').reshape(_columns, self.bodies)
+        return ReplayFrame(tick, keyframe, state)
+
+    def __getitem__(self, tick: int) -> ReplayFrame:
+        return self.frame(tick)
+
+    def play(self, start: int = 0, stop: int = None, step: int = 1):
+        for tick in range(start, self.ticks if stop is None else min(stop, self.ticks), step):
+            yield self.frame(tick)
+
+    def restore(self, bodies: [Body], tick: int) -> int:
+        """
+        Set bodies, in recorded order, to the keyframe at or before tick.
+        Returns the tick of that keyframe, step the manager from there to reach tick.
+        """
+        if len(bodies) != self.bodies:
+            raise Exception(f'replay has {self.bodies} bodies, got {len(bodies)}')
+        frame = self.frame(self.keyframe(tick))
+        for i, body in enumerate(bodies):
+            if np.isnan(frame.position[i, 0]):
+                continue
+            body.position = Vec2(*frame.position[i])
+            body.linear_velocity = Vec2(*frame.velocity[i])
+            body.angle = float(frame.angle[i])
+            body.angle_velocity = float(frame.angle_velocity[i])
+            if body.sleeping:
+                body.wake()
+        return frame.tick
@@ -3,6 +3,7 @@ from abc import ABC, abstractmethod
 from enum import Enum
 
 class Shape(ABC):
+    __slots__ = ('_center_mass',)
     _center_mass: Vec2
     _inerita_tenser: float
     class Type(Enum):
@@ -20,6 +21,11 @@ class Shape(ABC):
     def inerita_tenser(self) -> float:
         pass
 
+    # half extent of the shape, a body moving less than this per step can't skip over it
+    @abstractmethod
+    def size(self) -> float:
+        pass
+
     # center mass is local space
     def center_mass(self) -> Vec2:
         return self._center_mass
@@ -27,6 +33,7 @@ class Shape(ABC):
 
     
 class Circle(Shape):
+    __slots__ = ('radius',)
     radius: float
     
     def __init__(self, radii):
@@ -40,7 +47,11 @@ class Circle(Shape):
     def inerita_tenser(self):
         return 0.5 * self.radius * self.radius
 
+    def size(self):
+        return self.radius
+
 class Edge(Shape):
+    __slots__ = ('_type', 'vec')
     vec: Vec2
     def __init__(self, vec):
         super().__init__()
@@ -53,4 +64,7 @@ class Edge(Shape):
     
     def inerita_tenser(self):
         return 0
+
+    def size(self):
+        return self.vec.length() / 2
         
\ No newline at end of file
@@ -0,0 +1,115 @@
+from physics.common import *
+from physics.body import Body
+
+import copy
+import timeit
+
+
+class BodyState():
+    body: Body
+    position: (float, float)
+    linear_velocity: (float, float)
+    angle: float
+    angle_velocity: float
+
+    def __init__(self, body: Body):
+        self.body = body
+        self.position = body.position.toTuple()
+        self.linear_velocity = body.linear_velocity.toTuple()
+        self.angle = body.angle
+        self.angle_velocity = body.angle_velocity
+
+
+class StepStats():
+    tick: int
+    # simulation time at the end of the step
+    time: float
+    dt: float
+    # wall time of the step in ms
+    frametime: float
+    awake: int
+    contacts: int
+    substeps: int
+    # narrowphase tests and resolved contacts, statics included
+    pairs: int
+    resolved: int
+
+    def __init__(self, tick, time, dt, frametime, awake, contacts, substeps=1, pairs=0, resolved=0):
+        self.tick = tick
+        self.time = time
+        self.dt = dt
+        self.frametime = frametime
+        self.awake = awake
+        self.contacts = contacts
+        self.substeps = substeps
+        self.pairs = pairs
+        self.resolved = resolved
+
+
+class SimulationResult():
+    time: float
+    ticks: int
+    at_rest: bool
+    bodies: [BodyState]
+    steps: [StepStats]
+
+    def __init__(self, time, ticks, at_rest, bodies, steps):
+        self.time = time
+        self.ticks = ticks
+        self.at_rest = at_rest
+        self.bodies = bodies
+        self.steps = steps
+
+    def frametime(self) -> float:
+        # total wall time in ms
+        return sum(step.frametime for step in self.steps)
+
+
+class Snapshot():
+    """
+    Immutable copy of the dynamic bodies after a step, readable from any thread.
+    previous holds the positions one step earlier, alpha is how far to blend towards
+    the current ones. With alpha None it follows the wall clock from the moment the
+    snapshot was published, reaching the current positions dt later.
+    """
+    __slots__ = ('time', 'ticks', 'frametime', 'dt', 'published', '_alpha', 'positions', 'previous', 'velocities', 'angles')
+
+    def __init__(self, time, ticks, frametime, dt, bodies, previous, alpha=None):
+        self.time = time
+        self.ticks = ticks
+        self.frametime = frametime
+        self.dt = dt
+        self.published = timeit.default_timer()
+        self._alpha = alpha
+        self.positions = {body: body.position.toTuple() for body in bodies}
+        self.velocities = {body: body.linear_velocity.toTuple() for body in bodies}
+        self.angles = {body: body.angle for body in bodies}
+        self.previous = {body: position.toTuple() for body, position in previous.items()}
+
+    def with_alpha(self, alpha: float) -> 'Snapshot':
+        # the same step blended by another alpha, the copies of the bodies are shared
+        snapshot = copy.copy(self)
+        snapshot._alpha = alpha
+        return snapshot
+
+    def alpha(self) -> float:
+        if self._alpha is not None:
+            return self._alpha
+        return min((timeit.default_timer() - self.published) / self.dt, 1.0)
+
+    # bodies not in the snapshot (added after it) are read from the body itself
+    def position(self, body: Body) -> Vec2:
+        position = self.positions.get(body)
+        return Vec2(*position) if position is not None else Vec2(body.position)
+
+    def velocity(self, body: Body) -> Vec2:
+        velocity = self.velocities.get(body)
+        return Vec2(*velocity) if velocity is not None else Vec2(body.linear_velocity)
+
+    def interpolated_position(self, body: Body) -> Vec2:
+        position = self.positions.get(body)
+        previous = self.previous.get(body)
+        if position is None or previous is None:
+            return self.position(body)
+        alpha = self.alpha()
+        return Vec2(previous[0] + (position[0] - previous[0]) * alpha, previous[1] + (position[1] - previous[1]) * alpha)
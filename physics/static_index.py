@@ -0,0 +1,206 @@
+import numpy as np
+from physics.common import *
+from physics.body import Body
+from physics.shape import Shape
+from physics.contact import Contact
+from physics.broadphase import CellIndex
+
+
+class StaticIndex():
+    """
+    Static bodies baked at registration into world space: end points, unit direction,
+    normal and length of edges, center and radius of circles, and the bounds of both.
+    A uniform grid maps cells to the statics they touch, edges only take the cells
+    their segment passes through.
+    Statics are not expected to move, remove and add a body again after moving it.
+    Every add or remove bakes the arrays again, use add_many / remove_many for batches.
+    """
+    Edge = 0
+    Circle = 1
+
+    cell_width: float
+    cell_height: float
+    bodies: [Body]
+    kind: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    direction: np.ndarray
+    normal: np.ndarray
+    length: np.ndarray
+    radius: np.ndarray
+    bounds: np.ndarray
+
+    def __init__(self, cell_width: float = 64, cell_height: float = None):
+        self.cell_width = float(cell_width)
+        self.cell_height = float(cell_height if cell_height else cell_width)
+        self.bodies = []
+        self._geometry = []
+        # cells given at add, None for the cells of the geometry
+        self._given_cells = []
+        self._cells = {}
+        self._bake()
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def _bake(self):
+        # flat arrays from the per body geometry rows
+        n = len(self._geometry)
+        rows = np.array([row[1:] for row in self._geometry], dtype=float).reshape(n, 10)
+        self.kind = np.array([row[0] for row in self._geometry], dtype=np.int8)
+        self.start = rows[:, 0:2]
+        self.end = rows[:, 2:4]
+        self.direction = rows[:, 4:6]
+        self.normal = rows[:, 6:8]
+        self.length = rows[:, 8]
+        self.radius = rows[:, 9]
+        self.bounds = np.stack((np.minimum(rows[:, 0], rows[:, 2]) - rows[:, 9], np.minimum(rows[:, 1], rows[:, 3]) - rows[:, 9],
+                                np.maximum(rows[:, 0], rows[:, 2]) + rows[:, 9], np.maximum(rows[:, 1], rows[:, 3]) + rows[:, 9]), axis=-1)
+        # the cells as sorted entries, for query_pairs
+        entries = [(CellIndex.key(x, y), i) for (x, y), ids in self._cells.items() for i in ids]
+        entries = np.array(entries, dtype=np.int64).reshape(-1, 2)
+        self._cell_index = CellIndex(self.cell_width, self.cell_height)
+        self._cell_index.set_entries(entries[:, 0], entries[:, 1])
+
+    def _cell_range(self, bounds) -> (int, int, int, int):
+        return (int(bounds[0] // self.cell_width), int(bounds[1] // self.cell_height),
+                int(bounds[2] // self.cell_width), int(bounds[3] // self.cell_height))
+
+    def _segment_touches_cell(self, row, x, y) -> bool:
+        # the cell is inside the segment bounds already, check its corners lie on both sides
+        x1, y1, x2, y2 = row[1:5]
+        x0 = x * self.cell_width
+        y0 = y * self.cell_height
+        corners = ((x0, y0), (x0 + self.cell_width, y0), (x0, y0 + self.cell_height), (x0 + self.cell_width, y0 + self.cell_height))
+        sides = [(x2 - x1) * (cy - y1) - (y2 - y1) * (cx - x1) for cx, cy in corners]
+        return min(sides) <= 0 <= max(sides)
+
+    def cells(self, body: Body) -> list:
+        return self._row_cells(self._geometry[self.bodies.index(body)])
+
+    def _row_cells(self, row) -> list:
+        radius = row[10]
+        x0, y0, x1, y1 = self._cell_range((min(row[1], row[3]) - radius, min(row[2], row[4]) - radius,
+                                           max(row[1], row[3]) + radius, max(row[2], row[4]) + radius))
+        cells = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+        if row[0] == StaticIndex.Edge:
+            cells = [cell for cell in cells if self._segment_touches_cell(row, *cell)]
+        return cells
+
+    def add(self, body: Body, cells: list = None):
+        self._insert(body, cells)
+        self._bake()
+
+    def add_many(self, bodies: [Body]):
+        for body in bodies:
+            self._insert(body)
+        self._bake()
+
+    def _insert(self, body: Body, cells: list = None):
+        if body.shapeType == Shape.Type.Edge:
+            b1 = body.position
+            b2 = body.point_local_to_world(body.shape.vec)
+            vec_edge = b2 - b1
+            length = vec_edge.length()
+            unit = vec_edge / length if length > eps else Vec2(0, 0)
+            row = (StaticIndex.Edge, b1.x(), b1.y(), b2.x(), b2.y(), unit.x(), unit.y(), unit.y(), -unit.x(), length, 0.0)
+        elif body.shapeType == Shape.Type.Circle:
+            x, y = body.position.toTuple()
+            row = (StaticIndex.Circle, x, y, x, y, 0.0, 0.0, 0.0, 0.0, 0.0, body.shape.radius)
+        else:
+            raise Exception('unknown static shape')
+        i = len(self.bodies)
+        self.bodies.append(body)
+        self._geometry.append(row)
+        self._given_cells.append(cells)
+        for cell in (cells if cells is not None else self._row_cells(row)):
+            self._cells.setdefault(tuple(cell), []).append(i)
+
+    def remove(self, body: Body):
+        self.remove_many([body])
+
+    def remove_many(self, bodies: [Body]):
+        # ids are positions in the arrays, the rest is indexed again once
+        removed = set(bodies)
+        kept = [(body, cells) for body, cells in zip(self.bodies, self._given_cells) if body not in removed]
+        self.bodies = []
+        self._geometry = []
+        self._given_cells = []
+        self._cells = {}
+        for body, cells in kept:
+            self._insert(body, cells)
+        self._bake()
+
+    def query(self, bounds) -> [int]:
+        # statics whose cells overlap the bounds (min_x, min_y, max_x, max_y)
+        x0, y0, x1, y1 = self._cell_range(bounds)
+        cells = self._cells
+        found = []
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                ids = cells.get((x, y))
+                if ids:
+                    found.extend(ids)
+        if len(found) > 1:
+            found = sorted(set(found))
+        return found
+
+    def query_pairs(self, bounds: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        query for many bounds at once, rows (min_x, min_y, max_x, max_y). Returns the
+        row and the static of every candidate sharing a cell with the row, sorted by
+        row then static, the same candidates as query row by row.
+        """
+        return self._cell_index.query(bounds)
+
+    def collide(self, bodyA: Body, i: int, contact: Contact = None) -> Contact:
+        """
+        Contact of circle bodyA against static i, from the baked geometry.
+        Same result as Contact(bodyA, static), None if they don't intersect.
+        A given contact record is filled instead of a new one.
+        """
+        kind, x1, y1, x2, y2, ux, uy, nx, ny, length, radius_s = self._geometry[i]
+        px, py = bodyA.position.toTuple()
+        radius = bodyA.shape.radius
+        if kind == StaticIndex.Circle:
+            dx = x1 - px
+            dy = y1 - py
+            lengthSquare = dx * dx + dy * dy
+            if lengthSquare > (radius + radius_s) ** 2 or lengthSquare <= eps:
+                return None
+            d = lengthSquare ** 0.5
+            nx = dx / d
+            ny = dy / d
+            pt_B = Vec2(x1 - nx * radius_s, y1 - ny * radius_s)
+        else:
+            ax = px - x1
+            ay = py - y1
+            along = ax * ux + ay * uy
+            if along < 0 or along > length:
+                # beyond an end point, the closest point is the end point
+                if abs(along if along < 0 else along - length) >= radius:
+                    return None
+                qx, qy = (x1, y1) if along < 0 else (x2, y2)
+            else:
+                qx = x1 + ux * along
+                qy = y1 + uy * along
+            dx = px - qx
+            dy = py - qy
+            lengthSquare = dx * dx + dy * dy
+            if lengthSquare > radius ** 2 or lengthSquare <= eps:
+                return None
+            if along < 0 or along > length:
+                d = lengthSquare ** 0.5
+                nx = -dx / d
+                ny = -dy / d
+            elif nx * ax + ny * ay >= 0:
+                # the normal points from the circle into the edge
+                nx = -nx
+                ny = -ny
+            pt_B = Vec2(qx, qy)
+
+        pt_A = Vec2(px + nx * radius, py + ny * radius)
+        if contact is None:
+            return Contact.from_points(bodyA, self.bodies[i], Vec2(nx, ny), pt_A, pt_B)
+        contact.set_points(bodyA, self.bodies[i], Vec2(nx, ny), pt_A, pt_B)
+        return contact
@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class PhysicsStats():
+    """
+    Ring buffer of the last capacity steps. Each sample holds the wall time of
+    the phases of a step in ms, substeps summed, and the counters of the step.
+    The manager fills current while it steps and record() closes the sample.
+    Readers on another thread may see the sample being written, good enough for
+    an overlay, copy with samples() for anything exact.
+    """
+    # phases, ms
+    Broadphase = 0
+    Narrowphase = 1
+    Resolve = 2
+    Integrate = 3
+    Sleep = 4
+    Total = 5
+    # counters
+    Pairs = 6
+    Contacts = 7
+    StaticChecks = 8
+    Awake = 9
+    Sleeping = 10
+    Substeps = 11
+
+    phases = ('broadphase', 'narrowphase', 'resolve', 'integrate', 'sleep', 'total')
+    counters = ('pairs', 'contacts', 'static_checks', 'awake', 'sleeping', 'substeps')
+    fields = phases + counters
+
+    capacity: int
+    # samples recorded since the start, the buffer holds the last capacity of them
+    count: int
+    current: list
+
+    def __init__(self, capacity: int = 600):
+        self.capacity = capacity
+        self._samples = np.zeros((capacity, len(PhysicsStats.fields)))
+        self.count = 0
+        self.current = [0.0] * len(PhysicsStats.fields)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def begin(self):
+        self.current = [0.0] * len(PhysicsStats.fields)
+
+    def record(self):
+        # phases are measured in seconds, stored in ms
+        sample = self.current
+        for i in range(len(PhysicsStats.phases)):
+            sample[i] *= 1000
+        self._samples[self.count % self.capacity] = sample
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+        self.begin()
+
+    def _field(self, name) -> int:
+        if isinstance(name, int):
+            return name
+        if name not in PhysicsStats.fields:
+            raise Exception(f'unknown stats field {name}')
+        return PhysicsStats.fields.index(name)
+
+    def samples(self) -> np.ndarray:
+        # recorded samples, oldest first
+        if self.count <= self.capacity:
+            return self._samples[:self.count].copy()
+        head = self.count % self.capacity
+        return np.concatenate((self._samples[head:], self._samples[:head]))
+
+    def values(self, name) -> np.ndarray:
+        return self.samples()[:, self._field(name)]
+
+    def last(self) -> dict:
+        if not self.count:
+            return {}
+        sample = self._samples[(self.count - 1) % self.capacity]
+        return dict(zip(PhysicsStats.fields, sample.tolist()))
+
+    def percentile(self, name, q: float) -> float:
+        values = self.values(name)
+        if not len(values):
+            return 0.0
+        return float(np.percentile(values, q))
+
+    def summary(self, percentiles=(50, 95, 99)) -> dict:
+        # per field mean, max and percentiles over the buffer
+        samples = self.samples()
+        summary = {}
+        for i, name in enumerate(PhysicsStats.fields):
+            values = samples[:, i]
+            if not len(values):
+                summary[name] = {'mean': 0.0, 'max': 0.0, **{f'p{q}': 0.0 for q in percentiles}}
+                continue
+            summary[name] = {'mean': float(values.mean()), 'max': float(values.max()),
+                             **{f'p{q}': value for q, value in zip(percentiles, np.percentile(values, percentiles).tolist())}}
+        return summary
+
+    def lines(self) -> [str]:
+        # text for an overlay, phases with mean and p95, counters of the last step
+        if not self.count:
+            return []
+        summary = self.summary((95,))
+        last = self.last()
+        lines = [f'{name:<12}{summary[name]["mean"]:7.3f} ms  p95 {summary[name]["p95"]:7.3f}' for name in PhysicsStats.phases]
+        lines.append('  '.join(f'{name} {int(last[name])}' for name in PhysicsStats.counters))
+        return lines
@@ -0,0 +1,72 @@
+from PySide6.QtCore import QThread, Signal
+
+from physics.common import *
+from physics.body import Body
+from physics.simulation import Snapshot
+from physics.core import PhysicsManager
+
+from queue import SimpleQueue, Empty
+import time
+import timeit
+
+
+class PhysicsWorker(QThread):
+    """
+    Runs a headless PhysicsManager on its own thread. Only this thread touches the
+    manager and its bodies, other threads post commands to the input queue and read
+    the published Snapshot. Snapshots are immutable and replaced as a whole after
+    each batch of steps, readers keep the one they hold (front and back buffer)
+    and never lock.
+    """
+    stepped = Signal()
+
+    manager: PhysicsManager
+    snapshot: Snapshot
+
+    def __init__(self, manager: PhysicsManager, parent=None):
+        super().__init__(parent)
+        if manager._timer is not None:
+            raise Exception('worker needs a headless physics manager')
+        self.manager = manager
+        self._queue = SimpleQueue()
+        self.snapshot = manager.snapshot(clock=True)
+
+    def post(self, command, *args):
+        # command(*args) runs on the physics thread before the next step
+        self._queue.put((command, args))
+
+    def add_body(self, body: Body):
+        self.post(self.manager.add_body, body)
+
+    def remove_body(self, body: Body):
+        self.post(self.manager.remove_body, body)
+
+    def apply_impulse(self, body: Body, impulse: Vec2):
+        self.post(body.applyImpulseLinear, Vec2(impulse))
+
+    def _drain(self):
+        while True:
+            try:
+                command, args = self._queue.get_nowait()
+            except Empty:
+                return
+            command(*args)
+
+    def run(self):
+        manager = self.manager
+        last = timeit.default_timer()
+        while not self.isInterruptionRequested():
+            self._drain()
+            now = timeit.default_timer()
+            steps = manager.accumulate(now - last)
+            last = now
+            if steps:
+                self.snapshot = manager.snapshot(clock=True)
+                self.stepped.emit()
+            # sleep until the accumulator covers the next step
+            time.sleep(max(manager.dt * (1 - manager.alpha), 0.001))
+        self._drain()
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
@@ -0,0 +1,246 @@
+from PySide6.QtGui import QVector2D as Vec2
+from physics import PhysicsManager, PhysicsManager_Event
+from snooker import Ball, Table, hit_impulse
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import math
+import random
+import timeit
+
+
+class TableState():
+    """
+    Plain (picklable) snapshot of a board: cue ball position, (position, color)
+    of the other balls, board size and the physics settings the shot is played with.
+    """
+    cue: (float, float)
+    balls: [((float, float), int)]
+    size: (float, float)
+    global_friction: float
+    max_hit_force: float
+
+    def __init__(self, cue, balls, size=(400, 800), global_friction=0.5, max_hit_force=1000.0):
+        self.cue = tuple(cue)
+        self.balls = [(tuple(position), color) for position, color in balls]
+        self.size = tuple(size)
+        self.global_friction = global_friction
+        self.max_hit_force = max_hit_force
+
+    @staticmethod
+    def from_board(board) -> 'TableState':
+        balls = [(ball.position().toTuple(), ball.color) for ball in board.ball_list]
+        return TableState(board.ball_focused.position().toTuple(), balls, board.board_size.toTuple(),
+                          board.physicManager.global_friction, board.max_hit_force)
+
+
+class Shot():
+    # direction of the cue in radians, hit level in [0, 1] as SnookerBoard.hit_level
+    angle: float
+    power: float
+
+    def __init__(self, angle: float, power: float):
+        self.angle = angle
+        self.power = power
+
+    def __repr__(self):
+        return f'Shot({self.angle:.4f}, {self.power:.3f})'
+
+    @staticmethod
+    def grid(angles: int, powers: int, min_power: float = 0.1, max_power: float = 1.0) -> ['Shot']:
+        # angles evenly around the cue ball times powers evenly in [min_power, max_power]
+        shots = []
+        for i in range(angles):
+            for j in range(powers):
+                power = min_power + (max_power - min_power) * j / max(powers - 1, 1)
+                shots.append(Shot(2 * math.pi * i / angles, power))
+        return shots
+
+
+class ShotResult():
+    """Outcome of a single simulated shot."""
+    potted: [int]
+    cue_potted: bool
+    missed: bool
+    cue_end: (float, float)
+    time: float
+
+    def __init__(self, potted, cue_potted, missed, cue_end, time):
+        self.potted = potted
+        self.cue_potted = cue_potted
+        self.missed = missed
+        self.cue_end = cue_end
+        self.time = time
+
+    def foul(self) -> bool:
+        return self.cue_potted or self.missed
+
+
+class ShotOutcome():
+    """
+    Aggregate over the trials of one candidate shot. A trial is a foul when the
+    cue ball is potted or hits no other ball.
+    """
+    shot: Shot
+    trials: int
+    pots: float
+    pot_rate: float
+    foul_rate: float
+    potted: dict
+    cue_end: [(float, float)]
+    cue_mean: (float, float)
+    cue_spread: float
+
+    def __init__(self, shot: Shot, results: [ShotResult]):
+        self.shot = shot
+        self.trials = len(results)
+        self.pots = sum(len(result.potted) for result in results) / self.trials
+        self.pot_rate = sum(1 for result in results if result.potted) / self.trials
+        self.foul_rate = sum(1 for result in results if result.foul()) / self.trials
+        self.potted = {}
+        for result in results:
+            for color in result.potted:
+                self.potted[color] = self.potted.get(color, 0) + 1
+        self.cue_end = [result.cue_end for result in results if not result.cue_potted]
+        self.cue_mean = None
+        self.cue_spread = 0.0
+        if self.cue_end:
+            x = sum(p[0] for p in self.cue_end) / len(self.cue_end)
+            y = sum(p[1] for p in self.cue_end) / len(self.cue_end)
+            self.cue_mean = (x, y)
+            self.cue_spread = math.sqrt(sum((p[0] - x) ** 2 + (p[1] - y) ** 2 for p in self.cue_end) / len(self.cue_end))
+
+    def __repr__(self):
+        return f'{self.shot} pots {self.pots:.2f} pot rate {self.pot_rate:.2f} foul rate {self.foul_rate:.2f} cue {self.cue_mean}'
+
+
+def simulate(state: TableState, angle: float, power: float, event_driven: bool = True, max_time: float = 30.0) -> ShotResult:
+    """
+    Play one shot on a headless table built from state. The event engine pots balls
+    analytically, the stepped engine applies the pot test of SnookerBoard every tick.
+    """
+    table = Table(Vec2(*state.size))
+    if event_driven:
+        manager = PhysicsManager_Event(headless=True)
+        for hole in table.pockets:
+            manager.add_pocket(hole, table.pocket_radius())
+    else:
+        manager = PhysicsManager(headless=True)
+    manager.global_friction = state.global_friction
+    table.add_to(manager)
+
+    cue = Ball(Vec2(*state.cue), 0)
+    balls = [Ball(Vec2(*position), color) for position, color in state.balls]
+    manager.add_body(cue.body)
+    for ball in balls:
+        manager.add_body(ball.body)
+    start = [ball.position().toTuple() for ball in balls]
+
+    cue.hit(hit_impulse(Vec2(math.cos(angle), math.sin(angle)), power, state.max_hit_force))
+    potted = []
+    if event_driven:
+        manager.run_until_rest(max_time)
+        potted = [ball for ball in balls if ball.body in manager.potted]
+        cue_potted = cue.body in manager.potted
+    else:
+        cue_potted = False
+        remaining = list(balls)
+        while manager.time < max_time and not manager.at_rest():
+            manager.step()
+            for ball in list(remaining):
+                if table.is_potted(ball.position()):
+                    manager.remove_body(ball.body)
+                    remaining.remove(ball)
+                    potted.append(ball)
+            if table.is_potted(cue.position()):
+                cue_potted = True
+                break
+
+    # no other ball touched, every ball is still where it was
+    missed = not potted and all((ball.position() - Vec2(*position)).lengthSquared() < 1e-6 for ball, position in zip(balls, start))
+    return ShotResult([ball.color for ball in potted], cue_potted, missed, cue.position().toTuple(), manager.time)
+
+
+def _evaluate(task) -> ShotOutcome:
+    # one candidate with its trials, run in a worker process
+    state, shot, trials, angle_sigma, power_sigma, seed, event_driven, max_time = task
+    rng = random.Random(seed)
+    results = []
+    for trial in range(trials):
+        angle = shot.angle
+        power = shot.power
+        if trial > 0:
+            # first trial is the shot as given, the others are played with noise
+            angle = rng.gauss(shot.angle, angle_sigma)
+            power = min(max(rng.gauss(shot.power, power_sigma), 0.0), 1.0)
+        results.append(simulate(state, angle, power, event_driven, max_time))
+    return ShotOutcome(shot, results)
+
+
+class ShotEvaluator():
+    """
+    Monte Carlo evaluation of candidate shots. Every candidate is played trials times
+    with gaussian noise on angle and power, candidates are spread over a process pool
+    and simulated headless, so a sweep scales with the number of cores.
+    The pool is kept between calls, close it with close() or use a with block.
+    """
+    trials: int
+    angle_sigma: float
+    power_sigma: float
+    event_driven: bool
+    max_time: float
+    seed: int
+
+    def __init__(self, workers: int = None, trials: int = 16, angle_sigma: float = 0.01, power_sigma: float = 0.02,
+                 event_driven: bool = True, max_time: float = 30.0, seed: int = 0):
+        self.workers = workers if workers else os.cpu_count() or 1
+        self.trials = trials
+        self.angle_sigma = angle_sigma
+        self.power_sigma = power_sigma
+        self.event_driven = event_driven
+        self.max_time = max_time
+        self.seed = seed
+        self._executor = None
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def evaluate(self, state: TableState, shots: [Shot]) -> [ShotOutcome]:
+        """Outcomes of the shots, in the same order."""
+        t = timeit.default_timer()
+        tasks = [(state, shot, self.trials, self.angle_sigma, self.power_sigma, self.seed * 1000003 + i,
+                  self.event_driven, self.max_time) for i, shot in enumerate(shots)]
+        if self.workers == 1:
+            outcomes = [_evaluate(task) for task in tasks]
+        else:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers)
+            # a few chunks per worker, large enough to keep pickling cheap, small enough to balance
+            chunksize = max(1, len(tasks) // (self.workers * 4))
+            outcomes = list(self._executor.map(_evaluate, tasks, chunksize=chunksize))
+        self.elapsed = timeit.default_timer() - t
+        return outcomes
+
+    def best(self, state: TableState, shots: [Shot], foul_weight: float = 1.0) -> ShotOutcome:
+        # candidate with the most potted balls per trial, fouls count against it
+        outcomes = self.evaluate(state, shots)
+        return max(outcomes, key=lambda outcome: outcome.pots - foul_weight * outcome.foul_rate)
+
+
+if __name__ == '__main__':
+    balls = [((150 + (i % 5) * 21, 200 + (i // 5) * 21), 1 + i % 7) for i in range(15)]
+    state = TableState((200, 600), balls)
+    with ShotEvaluator() as evaluator:
+        outcomes = evaluator.evaluate(state, Shot.grid(36, 3))
+        print(f'{len(outcomes)} shots x {evaluator.trials} trials in {evaluator.elapsed:.2f} s on {evaluator.workers} workers')
+        for outcome in sorted(outcomes, key=lambda outcome: outcome.pots - outcome.foul_rate, reverse=True)[:5]:
+            print(outcome)
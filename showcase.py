@@ -12,29 +12,70 @@ from queue import Queue
 color_palette = ['#2ecc71', '#3498db', '#27ae60', '#e74c3c', '#9b59b6', '#ecf0f1', '#f1c40f', '#f39c12', '#e67e22']
 
 class PhysicsManager_Gravity(PhysicsManager):
-    def __init__(self):
-        super().__init__()
+    # piles under gravity settle with warm started iterations
+    solver_iterations = 4
+
+    def __init__(self, timer:QTimer=None, broadphase:Broadphase=None, headless:bool=False):
+        super().__init__(timer, broadphase, headless)
         self.gravity = 0
         self.gravity_center = None
 
-    def solve_movement(self, dt):
+    # sleeping bodies rest on what held them under the old gravity, they are woken when it changes
+    @property
+    def gravity(self) -> float:
+        return self._gravity
+
+    @gravity.setter
+    def gravity(self, value: float):
+        self._gravity = value
+        self.wake_all()
+
+    @property
+    def gravity_center(self) -> Vec2:
+        return self._gravity_center
+
+    @gravity_center.setter
+    def gravity_center(self, value: Vec2):
+        self._gravity_center = value
+        self.wake_all()
+
+    def wake_all(self):
         for body in self._bodies:
-            body.update(dt)
+            if body.island is not None:
+                body.island.wake()
+
+    def _remove_bodies(self, bodies: [Body]):
+        # what rested on a removed body falls again
+        islands = {body.island for body in bodies if body.island is not None}
+        super()._remove_bodies(bodies)
+        for island in islands:
+            island.wake()
+
+    def solve(self, dt):
+        # gravity goes in before the contacts, so a resting body's pull is taken by its
+        # supports in the same tick and its velocity can fall under the sleep threshold
+        self.wake_islands()
+        self.apply_gravity(dt)
+        super().solve(dt)
+
+    def apply_gravity(self, dt):
+        # sleeping bodies don't fall, only the awake ones
+        if self.gravity <= 0:
+            return
+        for body in self._awake:
             if body.type is not Body.Type.Dynamic:
                 continue
-            if self.gravity > 0:
-                # gravity
-                if self.gravity_center is not None:
-                    diff = self.gravity_center - body.position
-                    lengthSquared = diff.lengthSquared()
-                    if lengthSquared < 100:
-                        body.linear_velocity *= 0
-                    else:
-                        vec_G = diff.normalized() / lengthSquared
-                        vec_G *= self.gravity * 20000 * dt
-                        body.linear_velocity += vec_G
+            if self.gravity_center is not None:
+                diff = self.gravity_center - body.position
+                lengthSquared = diff.lengthSquared()
+                if lengthSquared < 100:
+                    body.linear_velocity *= 0
                 else:
-                    body.linear_velocity += Vec2(0, self.gravity*dt)
+                    vec_G = diff.normalized() / lengthSquared
+                    vec_G *= self.gravity * 20000 * dt
+                    body.linear_velocity += vec_G
+            else:
+                body.linear_velocity += Vec2(0, self.gravity*dt)
 
 
 class Ball():
@@ -122,8 +163,13 @@ class Field(QRasterWindow):
         self.physics.add_body(ledge.body)
 
     def remove_ball(self, ball):
-        self.physics.remove_body(ball.body)
-        self.ball_list.remove(ball)
+        self.remove_balls([ball])
+
+    def remove_balls(self, balls):
+        for ball in balls:
+            self.physics.remove_body(ball.body)
+        removed = set(balls)
+        self.ball_list = [ball for ball in self.ball_list if ball not in removed]
 
     def mousePressEvent(self, event):
         if event.button() == Qt.RightButton:
@@ -190,10 +236,13 @@ class Field(QRasterWindow):
                 p.setPen(pen)
                 p.drawLine(self.last_click.toPoint(), self.cursor_position.toPoint())
 
+            escaped = []
             for ball in self.ball_list:
                 ball.paint(p)
                 if (ball.position()-QVector2D(self.width()/2, self.height()/2)).lengthSquared() > self.height()**2 + self.width()**2:
-                    self.remove_ball(ball)
+                    escaped.append(ball)
+            if escaped:
+                self.remove_balls(escaped)
                 # if ball.position().y() + ball.radius > self.height():
                 #     ball.position().setY(self.height() - ball.radius)
                 #     ball.body.linear_velocity.setY(0)
@@ -1,8 +1,8 @@
 from PySide6.QtCore import QSize, Qt, Signal, Slot, QThreadPool, QRunnable, QTimer, QEvent  
 from PySide6.QtGui import QColor, QPainter, QPixmap, QVector2D as Vec2, QRasterWindow, QTransform, QImage, QTransform, QGuiApplication, QResizeEvent
 from PySide6.QtWidgets import QApplication, QWidget
-from physics import PhysicsManager, Body, Circle, Edge, Shape, PhysicsManager_Grid
-from lighting import LightSource, LightingManager, Material
+from physics import PhysicsManager, Body, Circle, Edge, Shape, PhysicsManager_Grid, PhysicsWorker, Snapshot
+from lighting import LightSource, LightingManager, Material, IlluminationCache, GBuffer, LightLayers
 from lighting.common import *
 
 import sys
@@ -68,6 +68,11 @@ class Ball(object):
         self.body = Body(Circle(Ball.radius),Body.Type.Dynamic)
         self.body.position = pos
         self.texture = None
+        # zoom the texture was scaled for
+        self.texture_zoom = None
+        # image of the ball lit on a cache miss and a writable view of its pixels, kept across misses
+        self.image = None
+        self.pixels = None
         self.color = color
 
     
@@ -132,13 +137,69 @@ class Cushion():
                 self.corner1.position = pos1 - Vec2(corner_radius, 0)
                 self.corner2.position = pos2 - Vec2(corner_radius, 0)
         
-    
+
+def hit_impulse(direction: Vec2, level: float, max_hit_force: float) -> Vec2:
+    # cue hit, level in [0, 1] of the max force along direction
+    return max_hit_force * level * direction.normalized()
+
+class Table():
+    """
+    Pockets and cushions of a board of the given size, no rendering needed,
+    so a table can be set up for a headless PhysicsManager too.
+    """
+    size: Vec2
+    pockets: [Vec2]
+    cushions: [Cushion]
+
+    def __init__(self, size: Vec2):
+        self.size = size
+        world_size = size
+
+        pockets = []
+        pockets.append(Vec2(5/128,5/256) * world_size)
+        pockets.append(Vec2(122/128,5/256) * world_size)
+        pockets.append(Vec2(5/128,128/256) * world_size)
+        pockets.append(Vec2(122/128,128/256) * world_size)
+        pockets.append(Vec2(5/128,250/256) * world_size)
+        pockets.append(Vec2(122/128,250/256) * world_size)
+        self.pockets = pockets
+
+        cushions = []
+        # Top and Bottom
+        cushions.append(Cushion(Vec2(15/128, 8/256) * world_size, Vec2(113/128, 8/256) * world_size, Cushion.Face.DOWN))
+        cushions.append(Cushion(Vec2(15/128, 248/256) * world_size, Vec2(113/128, 248/256) * world_size, Cushion.Face.UP))
+        # Left Top and Left Bottom
+        cushions.append(Cushion(Vec2(8/128, 15/256) * world_size, Vec2(8/128, 120/256) * world_size, Cushion.Face.RIGHT))
+        cushions.append(Cushion(Vec2(8/128, 137/256) * world_size, Vec2(8/128, 241/256) * world_size, Cushion.Face.RIGHT))
+        # Right Top and Right Bottom
+        cushions.append(Cushion(Vec2(120/128, 15/256) * world_size, Vec2(120/128, 120/256) * world_size, Cushion.Face.LEFT))
+        cushions.append(Cushion(Vec2(120/128, 137/256) * world_size, Vec2(120/128, 241/256) * world_size, Cushion.Face.LEFT))
+        self.cushions = cushions
+
+    def add_to(self, manager: PhysicsManager):
+        for obj in self.cushions:
+            manager.add_body(obj.edge)
+            manager.add_body(obj.corner1)
+            manager.add_body(obj.corner2)
+
+    def pocket_radius(self) -> float:
+        # a ball whose center is closer than this to a pocket falls in
+        return math.sqrt(Ball.radius**2-Ball.radius)
+
+    def is_potted(self, pos: Vec2) -> bool:
+        if (pos.x() < 3 or pos.x() > self.size.x() - 3) or (pos.y() < 3 or pos.y() > self.size.y() - 3):
+            return True
+        for hole in self.pockets:
+            if (pos - hole).lengthSquared() < Ball.radius**2-Ball.radius:
+                return True
+        return False
+
 
 class SnookerBoard(QRasterWindow):
     physicManager: PhysicsManager
     board_size = Vec2(400,800)
     lighting_update_step_num = 3
-    def __init__(self, width:int, height:int, parent=None, landscape=False):
+    def __init__(self, width:int, height:int, parent=None, landscape=False, threaded=False):
         super().__init__(parent)
         
         self.installEventFilter(self)
@@ -172,14 +233,26 @@ class SnookerBoard(QRasterWindow):
         
 
         # Physics
+        # threaded physics runs on a PhysicsWorker, the board only reads its snapshots
+        # and posts changes to it
 
         self.max_hit_force = 1000.0
         grid_manager = False
-        self.physicManager = PhysicsManager(self._timer)
+        if grid_manager:
+            self.physicManager = PhysicsManager_Grid(self._timer, world_w, world_h, 20, 40, headless=threaded)
+        else:
+            self.physicManager = PhysicsManager(self._timer, headless=threaded)
         self.physicManager.global_friction = 0.5
+        self.physics_worker = None
+        # without a worker, the snapshot of the last tick, copied once per tick
+        self._snapshot = None
         
         # UI
         self.cursor_position = Vec2(0,0)
+        # RayHit of the cue ball towards the cursor
+        self.aim = None
+        # tick of the snapshot the aim was last cast for
+        self._aim_ticks = None
         self.mouseRightPressed = False
         self.mouseLeftPressed = False
 
@@ -206,6 +279,8 @@ class SnookerBoard(QRasterWindow):
         bulb2.set_color(QColor('#ffaaff'))
         self.lighting.add_light_source(bulb1)
         self.lighting.add_light_source(bulb2)
+        # ball textures by colour, position and zoom, shading only depends on them
+        self.illumination_cache = IlluminationCache(self.lighting, capacity=2048, quantum=2.0)
 
 
         # Texture
@@ -223,14 +298,20 @@ class SnookerBoard(QRasterWindow):
             mt1.metalness = 10
             ball_material_list.append(mt1)
         self.ball_material_list = ball_material_list
+        # ball materials resampled to a texture side, and the surfaces of a batch of them
+        self._ball_materials = {}
+        self._ball_surfaces = np.empty((0, 0, 0, 3), dtype=np.float32)
 
         board_img = QImage()
         board_img.load("board.png")
         board_material = Material()
         board_material.set_diffuse_map(Array_from_QImage(board_img))
+        self.board_material = board_material
         board_surface = plain_local(board_img.width(), board_img.height(), world_w, world_h)
-        board_texture = self.lighting.illuminate(board_surface, board_material)
-        board_image_illum = QImage_from_Array(board_texture)
+        # the board keeps a layer per light, relighting it after the lights change is a weighted sum
+        self.board_layers = LightLayers(self.lighting, board_surface, board_material)
+        self.board_image = QImage(board_img.width(), board_img.height(), QImage.Format_ARGB32)
+        self.relight_board()
 
         self.pole_image = QImage()
         self.pole_image.load("pole.png")
@@ -238,12 +319,22 @@ class SnookerBoard(QRasterWindow):
         self.pole_material = Material()
         self.pole_material.set_diffuse_map(pole_array)
         self.pole_material.set_normal_map(pole_normal(pole_array))
-        self.pole_surface = pole_surface(pole_array)
-        self.pole_texture = self.pole_image
+        self.pole_surface = pole_surface(pole_array).astype(np.float32)
+        # relit in place, pole_pixels is the memory of pole_texture
+        self.pole_texture = QImage(self.pole_image.width(), self.pole_image.height(), QImage.Format_ARGB32)
+        self.pole_pixels = Array_view_of_QImage(self.pole_texture)
+        self.lighting.illuminate_into(self.pole_surface, self.pole_material, self.pole_pixels)
 
         
-        self.background = QPixmap.fromImage(board_image_illum)
         self.render_time = 0
+        # physics phase timings drawn over the board, F3 toggles
+        self.show_stats = False
+        # light board, balls and cue together in one pass per frame over a screen sized gbuffer, F4 toggles
+        self.deferred = False
+        self.gbuffer = GBuffer(0, 0)
+        self.deferred_image = None
+        # board, ball and cue layers resampled for the current zoom
+        self._deferred_layers = {}
 
         # Objects
         self.ball_list = []
@@ -251,51 +342,64 @@ class SnookerBoard(QRasterWindow):
         self.physicManager.add_body(self.ball_focused.body)
 
 
-        pockets = []
-        pockets.append(Vec2(5/128,5/256) * world_size)
-        pockets.append(Vec2(122/128,5/256) * world_size)
-        pockets.append(Vec2(5/128,128/256) * world_size)
-        pockets.append(Vec2(122/128,128/256) * world_size)
-        pockets.append(Vec2(5/128,250/256) * world_size)
-        pockets.append(Vec2(122/128,250/256) * world_size)
-        self.pockets = pockets
-
-        cushions = []
-        # Top and Bottom
-        cushions.append(Cushion(Vec2(15/128, 8/256) * world_size, Vec2(113/128, 8/256) * world_size, Cushion.Face.DOWN))
-        cushions.append(Cushion(Vec2(15/128, 248/256) * world_size, Vec2(113/128, 248/256) * world_size, Cushion.Face.UP))
-        # Left Top and Left Bottom
-        cushions.append(Cushion(Vec2(8/128, 15/256) * world_size, Vec2(8/128, 120/256) * world_size, Cushion.Face.RIGHT))
-        cushions.append(Cushion(Vec2(8/128, 137/256) * world_size, Vec2(8/128, 241/256) * world_size, Cushion.Face.RIGHT))
-        # Right Top and Right Bottom
-        cushions.append(Cushion(Vec2(120/128, 15/256) * world_size, Vec2(120/128, 120/256) * world_size, Cushion.Face.LEFT))
-        cushions.append(Cushion(Vec2(120/128, 137/256) * world_size, Vec2(120/128, 241/256) * world_size, Cushion.Face.LEFT))
-        self.cushions = cushions
-
-        
-        for obj in cushions:
-            self.physicManager.add_body(obj.edge)
-            self.physicManager.add_body(obj.corner1)
-            self.physicManager.add_body(obj.corner2)
+        self.table = Table(world_size)
+        self.pockets = self.table.pockets
+        self.cushions = self.table.cushions
+        self.table.add_to(self.physicManager)
         
         # start loop
+        if threaded:
+            self.physics_worker = PhysicsWorker(self.physicManager)
+            QGuiApplication.instance().aboutToQuit.connect(self.physics_worker.stop)
+            self.physics_worker.start()
         self._timer.start()
         self.resizing = False
     
     def add_ball(self, position: Vec2, ball_color: Ball.Color):
         new_ball = Ball(position, ball_color)
         self.ball_list.append(new_ball)
-        self.physicManager.add_body(new_ball.body)
+        self.post(self.physicManager.add_body, new_ball.body)
     
     def remove_ball(self, ball: Ball):
-        self.physicManager.remove_body(ball.body)
-        self.ball_list.remove(ball)
+        self.remove_balls([ball])
+
+    def remove_balls(self, balls: [Ball]):
+        # one pass over ball_list, the manager drops the bodies at its next step
+        for ball in balls:
+            self.post(self.physicManager.remove_body, ball.body)
+        removed = set(balls)
+        self.ball_list = [ball for ball in self.ball_list if ball not in removed]
+
+    def post(self, command, *args):
+        # changes to the physics run on the physics thread when threaded
+        if self.physics_worker:
+            self.physics_worker.post(command, *args)
+        else:
+            command(*args)
+            self._snapshot = None
+
+    def snapshot(self) -> Snapshot:
+        if self.physics_worker:
+            return self.physics_worker.snapshot
+        # the bodies only change on a tick or a post, between them only the interpolation moves
+        manager = self.physicManager
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.ticks != manager.ticks:
+            snapshot = self._snapshot = manager.snapshot()
+        elif snapshot.alpha() != manager.alpha:
+            snapshot = self._snapshot = snapshot.with_alpha(manager.alpha)
+        return snapshot
+
+    def cast_aim(self, cue: Body, cursor_position: QVector2D):
+        # ghost ball, where the cue ball stops against the first ball or cushion on the line
+        position = cue.position
+        self.aim = self.physicManager.circle_cast(position, Ball.radius, cursor_position - position, ignore={cue})
 
     def hit_level(self) -> float:
         return (math.cos(self.hit_timer.remainingTime() / self.hit_timer.interval() * 2 * math.pi - math.pi) + 1) / 2
 
     def is_active(self) -> bool:
-        if self.ball_focused.speedSquared() < 0.01:
+        if self.snapshot().velocity(self.ball_focused.body).lengthSquared() < 0.01:
             return True
         else:
             return False
@@ -318,14 +422,20 @@ class SnookerBoard(QRasterWindow):
         elif event.button() == Qt.LeftButton:
             self.mouseLeftPressed = False
             if self.is_active():
-                force = self.max_hit_force * self.hit_level() * (cursor_position - self.ball_focused.position()).normalized()
-                self.ball_focused.hit(force)
+                force = hit_impulse(cursor_position - self.snapshot().position(self.ball_focused.body), self.hit_level(), self.max_hit_force)
+                self.post(self.ball_focused.hit, force)
                 self.hit_timer.stop()
+                self.aim = None
     
     def mouseMoveEvent(self, event):
         inverse = self._render_transform.inverted()[0].scale(1/self.zoom, 1/self.zoom)
         cursor_position = QVector2D(inverse.map(event.position()))
         self.cursor_position = cursor_position
+        if self.is_active():
+            # the cast reads the bodies, it runs on the physics thread and paint draws the last result
+            self.post(self.cast_aim, self.ball_focused.body, cursor_position)
+        else:
+            self.aim = None
 
         
 
@@ -366,6 +476,26 @@ class SnookerBoard(QRasterWindow):
                     return False
         return super().eventFilter(watched, event)
     
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_F3:
+            self.show_stats = not self.show_stats
+        elif event.key() == Qt.Key_F4:
+            self.deferred = not self.deferred
+        elif event.key() == Qt.Key_Plus:
+            self.dim_lights(1.25)
+        elif event.key() == Qt.Key_Minus:
+            self.dim_lights(0.8)
+
+    def dim_lights(self, factor: float):
+        for source in self.lighting.lighting_list:
+            source.intensity *= factor
+        self.lighting.changed()
+
+    def relight_board(self):
+        self.board_layers.illuminate_into(Array_view_of_QImage(self.board_image))
+        self.background = QPixmap.fromImage(self.board_image)
+        self.board_version = self.lighting.version
+
     def resizeEvent(self, event):
         self.resizing = True
 
@@ -376,50 +506,207 @@ class SnookerBoard(QRasterWindow):
             self.render_time = 1000 * (timeit.default_timer() - t)
     
 
-    def render_ball(self, ball: Ball, p: QPainter, update:bool = True):
+    def render_ball(self, ball: Ball, p: QPainter, snapshot: Snapshot):
         zoom = self.zoom
         render_r = int(Ball.radius) * zoom
-        pos = ball.position() * zoom
-        
-        if self.lighting_update_step == 0 and update:
-            ball_material = self.ball_material_list[ball.color]
-            ball_surface = ball_material.normal_map*Ball.radius + Array_from_QVector3D(ball.position().toVector3D())
-            ball.texture = QImage_from_Array(self.lighting.illuminate(ball_surface, ball_material))
+        # physics runs in fixed steps, draw between the last two of them
+        pos = snapshot.interpolated_position(ball.body) * zoom
         if ball.texture is not None:
-            p.drawImage(pos.x() - render_r, pos.y() - render_r, ball.texture.scaled(render_r*2, render_r*2))
+            p.drawImage(pos.x() - render_r, pos.y() - render_r, ball.texture)
         else:
             p.drawPoint(pos.toPoint())
     
-    def render_pole(self, p:QPainter):
-        render_r = int(Ball.radius)
+    def ball_materials_at(self, side: int) -> [Material]:
+        # ball materials at the texture size, the textures are lit without scaling
+        materials = self._ball_materials.get(side)
+        if materials is None:
+            materials = []
+            for source in self.ball_material_list:
+                # the nearest pixels as QImage.scaled picks them, halves round down
+                height, width = source.diffuse_map.shape[:2]
+                rows = np.clip(np.ceil((np.arange(side) + 0.5) * height / side - 1), 0, height - 1).astype(np.intp)
+                cols = np.clip(np.ceil((np.arange(side) + 0.5) * width / side - 1), 0, width - 1).astype(np.intp)
+                material = Material()
+                material.set_diffuse_map(np.concatenate((source.diffuse_map, source.alpha_map), axis=-1)[rows][:, cols])
+                material.set_normal_map(source.normal_map[rows][:, cols])
+                material.smoothness = source.smoothness
+                material.metalness = source.metalness
+                materials.append(material)
+            self._ball_materials[side] = materials
+        return materials
+
+    def update_ball_textures(self, balls: [Ball], snapshot: Snapshot):
+        # textures from the cache, all misses lit in one batch exactly at their position into the images of the balls
+        zoom = self.zoom
+        side = int(int(Ball.radius) * zoom * 2)
+        missed = {}
+        for ball in balls:
+            position = snapshot.interpolated_position(ball.body)
+            key = (ball.color, *self.illumination_cache.quantize(position.x(), position.y()), zoom)
+            texture = self.illumination_cache.get(key) if key not in missed else None
+            if texture is None:
+                missed.setdefault(key, (ball.color, position, []))[2].append(ball)
+            else:
+                ball.texture = texture
+                ball.texture_zoom = zoom
+        if not missed:
+            return
+        ball_materials = self.ball_materials_at(side)
+        materials = [ball_materials[color] for color, _, _ in missed.values()]
+        if len(self._ball_surfaces) < len(missed) or self._ball_surfaces.shape[1] != side:
+            self._ball_surfaces = np.empty((max(len(missed), 2 * len(self._ball_surfaces)), side, side, 3), dtype=np.float32)
+        surfaces = self._ball_surfaces[:len(missed)]
+        images = []
+        for surface, material, (_, position, balls) in zip(surfaces, materials, missed.values()):
+            np.multiply(material.normal_map, Ball.radius, out=surface)
+            surface += Array_from_QVector3D(position.toVector3D())
+            ball = balls[0]
+            if ball.image is None or ball.image.width() != side:
+                ball.image = QImage(side, side, QImage.Format_ARGB32)
+                ball.pixels = Array_view_of_QImage(ball.image)
+            images.append(ball.pixels)
+        self.lighting.illuminate_batch(surfaces, materials, images)
+        for key, (_, _, balls) in missed.items():
+            # the cache keeps a copy, the image of the ball is lit again on its next miss
+            cached = balls[0].image.copy()
+            self.illumination_cache.put(key, cached)
+            balls[0].texture = balls[0].image
+            for ball in balls[1:]:
+                ball.texture = cached
+            for ball in balls:
+                ball.texture_zoom = zoom
+
+    def pole_transform(self, snapshot: Snapshot) -> (QTransform, QTransform):
+        # pole image to world and back
         hit_d = Ball.radius + 5
         if self.mouseLeftPressed:
             hit_d += self.hit_level() * 20
-        a = self.ball_focused.position()
-        direction = (self.ball_focused.position() - self.cursor_position).normalized()
+        a = snapshot.position(self.ball_focused.body)
+        direction = (a - self.cursor_position).normalized()
         rotate = lambda v: QTransform(v.x(), v.y(), -v.y(), v.x(), 0, 0)
         rotate_counter = lambda v: QTransform(v.x(), -v.y(), v.y(), v.x(), 0, 0)
         translate = lambda dx,dy: QTransform(1,0,0,1,dx,dy)
         scale = lambda x,y: QTransform(x, 0, 0, y, 0, 0)
         transform = translate(hit_d, -3) * rotate(direction) * scale(1.5, 1.5) * translate(a.x(),a.y())
         inv_transform = translate(-a.x(),-a.y()) * scale(2/3, 2/3) * rotate_counter(direction) * translate(-hit_d, 3)
+        return transform, inv_transform
+
+    def render_pole(self, p:QPainter, snapshot: Snapshot):
+        scale = lambda x,y: QTransform(x, 0, 0, y, 0, 0)
+        transform, inv_transform = self.pole_transform(snapshot)
         if self.lighting_update_step == 0:
             transform_matrix = Matrix_from_QTransform(inv_transform)
-            self.pole_texture = QImage_from_Array(self.lighting.illuminate(self.pole_surface, self.pole_material, transform_matrix))
+            self.lighting.illuminate_into(self.pole_surface, self.pole_material, self.pole_pixels, transform_matrix)
         p.setTransform(transform * self._render_transform * scale(self.zoom, self.zoom))
         p.drawImage(0, 0, self.pole_texture)
         p.setTransform(self._render_transform * scale(self.zoom, self.zoom))
 
+    def deferred_layers(self) -> dict:
+        # board and per colour ball patches at the current zoom, cue sampling is per frame
+        zoom = self.zoom
+        layers = self._deferred_layers
+        if layers.get('zoom') == zoom:
+            return layers
+        layers.clear()
+        layers['zoom'] = zoom
+        width = round(self.board_size.x() * zoom)
+        height = round(self.board_size.y() * zoom)
+        board = self.board_material
+        layers['board'] = (plain_local(width, height, self.board_size.x(), self.board_size.y()).astype(np.float32),
+                           resample_nearest(board.diffuse_map, height, width), resample_nearest(board.alpha_map, height, width))
+        size = round(int(Ball.radius) * zoom) * 2
+        normal = sphere_normal(np.zeros((size, size))).astype(np.float32)
+        layers['ball_normal'] = normal
+        layers['balls'] = [(resample_nearest(material.diffuse_map, size, size),
+                            resample_nearest(material.alpha_map, size, size) * (normal[:, :, 2:] > 0))
+                           for material in self.ball_material_list]
+        return layers
+
+    def composite_pole(self, snapshot: Snapshot):
+        # sample the pole image for the gbuffer pixels it covers, world position with the height of the pole surface
+        zoom = self.zoom
+        transform, inv_transform = self.pole_transform(snapshot)
+        to_world = Matrix_from_QTransform(transform)
+        to_pole = Matrix_from_QTransform(inv_transform)
+        pole_h, pole_w = self.pole_surface.shape[:2]
+        corners = to_world @ np.array([[0, pole_w, 0, pole_w], [0, 0, pole_h, pole_h], [1, 1, 1, 1]]) * zoom
+        x0, y0 = np.floor(corners[:2].min(axis=1)).astype(int)
+        x1, y1 = np.ceil(corners[:2].max(axis=1)).astype(int)
+        world = plain_local(x1 - x0, y1 - y0)
+        world[:, :, 0] += x0 + 0.5
+        world[:, :, 1] += y0 + 0.5
+        world /= zoom
+        world[:, :, 2] = 1
+        local = world @ to_pole.T
+        u = np.floor(local[:, :, 0]).astype(np.intp)
+        v = np.floor(local[:, :, 1]).astype(np.intp)
+        inside = (u >= 0) & (u < pole_w) & (v >= 0) & (v < pole_h)
+        u = np.where(inside, u, 0)
+        v = np.where(inside, v, 0)
+        material = self.pole_material
+        alpha = material.alpha_map[v, u] * inside[:, :, np.newaxis]
+        normal = material.normal_map[v, u]
+        # normals turn with the pole, the transform scales uniformly
+        linear = to_world[:2, :2] / np.sqrt(abs(np.linalg.det(to_world[:2, :2])))
+        normal[:, :, :2] = normal[:, :, :2] @ linear.T
+        position = world.astype(np.float32)
+        position[:, :, 2] = self.pole_surface[v, u, 2]
+        self.gbuffer.composite(x0, y0, position, material.diffuse_map[v, u], alpha, normal,
+                               material.smoothness, material.metalness)
+
+    def render_deferred(self, p: QPainter, snapshot: Snapshot):
+        zoom = self.zoom
+        layers = self.deferred_layers()
+        position, albedo, alpha = layers['board']
+        gbuffer = self.gbuffer
+        if (gbuffer.height, gbuffer.width) != position.shape[:2] or self.deferred_image is None:
+            # the board is the static background
+            gbuffer.resize(position.shape[1], position.shape[0])
+            gbuffer.clear_background()
+            gbuffer.clear()
+            gbuffer.composite(0, 0, position, albedo, alpha)
+            gbuffer.set_background()
+            self.deferred_image = QImage(gbuffer.width, gbuffer.height, QImage.Format_ARGB32)
+            self.deferred_pixels = Array_view_of_QImage(self.deferred_image)
+        gbuffer.clear()
+
+        render_r = round(int(Ball.radius) * zoom)
+        normal = layers['ball_normal']
+        balls = self.ball_list + [self.ball_focused] if self.ball_focused else self.ball_list
+        for ball in balls:
+            center = snapshot.interpolated_position(ball.body)
+            material = self.ball_material_list[ball.color]
+            albedo, alpha = layers['balls'][ball.color]
+            surface = normal * Ball.radius + Array_from_QVector3D(center.toVector3D()).astype(np.float32)
+            gbuffer.composite(round(center.x() * zoom) - render_r, round(center.y() * zoom) - render_r,
+                              surface, albedo, alpha, normal, material.smoothness, material.metalness)
+        if self.ball_focused and self.is_active():
+            self.composite_pole(snapshot)
+
+        self.lighting.illuminate_gbuffer(gbuffer, self.deferred_pixels)
+        p.setTransform(self._render_transform)
+        p.drawImage(0, 0, self.deferred_image)
+
     def render(self,p):
         # p.setRenderHint(QPainter.Antialiasing)
         p.fillRect(0, 0, self.width(), self.height(), Qt.black)
+        snapshot = self.snapshot()
+        if self.deferred:
+            self.render_deferred(p, snapshot)
         p.setTransform(self._render_transform)
         p.scale(self.zoom, self.zoom)
-        p.drawPixmap(0,0,self.board_size.x(), self.board_size.y(), self.background)
+        if not self.deferred:
+            if self.board_version != self.lighting.version:
+                self.relight_board()
+            p.drawPixmap(0,0,self.board_size.x(), self.board_size.y(), self.background)
         p.setPen(QColor(250, 120, 120))
         p.drawText(40, 30, 'mouse_point: '+str(self.cursor_position.toTuple()))
         p.drawText(40, 40, 'physic_time: '+str(self.physicManager.frametime))
         p.drawText(40, 50, 'render_time: '+str(self.render_time))
+        if self.show_stats:
+            lines = self.physicManager.stats.lines() + [self.illumination_cache.stats(), 'deferred' if self.deferred else 'forward']
+            for i, line in enumerate(lines):
+                p.drawText(40, 70 + 10 * i, line)
         render_r = int(Ball.radius * self.zoom)
         self.lighting_update_step = (self.lighting_update_step + 1) % self.lighting_update_step_num
 
@@ -431,58 +718,59 @@ class SnookerBoard(QRasterWindow):
 
         # render balls, remove pre scale in painter to avoid bad upscaling on ball textures
         p.setTransform(self._render_transform)
-        for ball in self.ball_list:
-            upd = True
-            if ball.texture is not None and ball.speedSquared() < 0.01:
-                upd = False
-            self.render_ball(ball, p, upd)
+        balls = self.ball_list + [self.ball_focused] if self.ball_focused else self.ball_list
+        if not self.deferred:
+            if self.lighting_update_step == 0:
+                relit = [ball for ball in balls if ball.texture is None or ball.texture_zoom != self.zoom
+                         or ball is self.ball_focused or snapshot.velocity(ball.body).lengthSquared() >= 0.01]
+            else:
+                relit = [ball for ball in balls if ball.texture is not None and ball.texture_zoom != self.zoom]
+            self.update_ball_textures(relit, snapshot)
+            for ball in balls:
+                self.render_ball(ball, p, snapshot)
         
         if not self.ball_focused:
             return
-        self.render_ball(self.ball_focused, p)
         p.scale(self.zoom, self.zoom)
 
         if self.is_active():
             # indicator line
             p.drawEllipse(self.cursor_position.toPoint(), Ball.radius, Ball.radius)
-            p.drawLine(self.ball_focused.position().toPoint(), self.cursor_position.toPoint())
+            aim = self.aim
+            if aim is not None:
+                p.drawLine(snapshot.position(self.ball_focused.body).toPoint(), aim.position.toPoint())
+                p.drawEllipse(aim.position.toPoint(), Ball.radius, Ball.radius)
+                if aim.body.type == Body.Type.Dynamic:
+                    # the object ball leaves along the line of centers
+                    center = snapshot.position(aim.body)
+                    p.drawLine(center.toPoint(), (center - aim.normal * Ball.radius * 4).toPoint())
+            else:
+                p.drawLine(snapshot.position(self.ball_focused.body).toPoint(), self.cursor_position.toPoint())
 
-            self.render_pole(p)
+            if not self.deferred:
+                self.render_pole(p, snapshot)
             
             
     
     def update(self):
         super().update()
-        for ball in self.ball_list:
-            hit = False
-            pos = ball.position()
-            if (pos.x() < 3 or pos.x() > self.board_size.x() - 3) or (pos.y() < 3 or pos.y() > self.board_size.y() - 3):
-                hit = True
-            else:
-                for hole in self.pockets:
-                    if (pos - hole).lengthSquared() < Ball.radius**2-Ball.radius:
-                        hit = True
-                        break
-            
-            if hit:
-                self.remove_ball(ball)
-                print("hit")
+        snapshot = self.snapshot()
+        potted = [ball for ball in self.ball_list if self.table.is_potted(snapshot.position(ball.body))]
+        if potted:
+            self.remove_balls(potted)
+            print("hit")
         
         if self.ball_focused:
-            ball = self.ball_focused
-            hit = False
-            pos = ball.position()
-            if (pos.x() < 3 or pos.x() > self.board_size.x() - 3) or (pos.y() < 3 or pos.y() > self.board_size.y() - 3):
-                hit = True
-            else:
-                for hole in self.pockets:
-                    if (pos - hole).lengthSquared() < Ball.radius**2-Ball.radius:
-                        hit = True
-                        break
-            
-            if hit:
-                self.ball_focused.reset(Vec2(200 * self.zoom, 600 * self.zoom))
+            if self.table.is_potted(snapshot.position(self.ball_focused.body)):
+                self.post(self.ball_focused.reset, Vec2(200 * self.zoom, 600 * self.zoom))
                 print("OOPS")
+            # the other balls move and go, the aim is cast again on every tick the cue ball can be hit
+            if self.is_active():
+                if snapshot.ticks != self._aim_ticks:
+                    self._aim_ticks = snapshot.ticks
+                    self.post(self.cast_aim, self.ball_focused.body, self.cursor_position)
+            else:
+                self.aim = None
     
 
 if __name__ == '__main__':
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the physics and lighting packages use QtGui types, no display is needed
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
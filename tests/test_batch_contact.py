@@ -0,0 +1,40 @@
+import random
+
+import numpy as np
+from PySide6.QtGui import QVector2D as Vec2
+
+from physics import PhysicsManager, PhysicsManager_Array, color_pairs
+from benchmark import snooker_rack
+from snooker import hit_impulse
+
+
+def test_color_pairs_keeps_the_order_of_every_body():
+    rng = random.Random(3)
+    pairs = [rng.sample(range(12), 2) for i in range(80)]
+    index_a = np.array([a for a, b in pairs])
+    index_b = np.array([b for a, b in pairs])
+    batches = color_pairs(index_a, index_b, 12)
+    batch_of = np.empty(len(pairs), dtype=int)
+    for k, batch in enumerate(batches):
+        bodies = np.concatenate((index_a[batch], index_b[batch]))
+        assert len(set(bodies.tolist())) == len(bodies)
+        batch_of[batch] = k
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(pairs)))
+    for body in range(12):
+        mine = np.flatnonzero((index_a == body) | (index_b == body))
+        assert (np.diff(batch_of[mine]) > 0).all()
+
+
+def break_positions(manager: PhysicsManager) -> (int, np.ndarray):
+    cue = snooker_rack(manager)
+    cue.hit(hit_impulse(Vec2(205, 210) - cue.position(), 1.0, 1000.0))
+    result = manager.run_until_rest(60)
+    return result.ticks, np.array([body.position.toTuple() for body in manager._bodies])
+
+
+def test_array_manager_matches_sequential_resolve():
+    ticks, positions = break_positions(PhysicsManager(headless=True))
+    array_ticks, array_positions = break_positions(PhysicsManager_Array(headless=True))
+    assert array_ticks == ticks
+    # float64 arrays against float32 vectors, only rounding apart
+    assert np.abs(array_positions - positions).max() < 0.01
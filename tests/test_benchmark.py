@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+from benchmark import compare
+
+
+baseline = {'scenarios': {'pile': {'ticks': 120, 'ms_per_tick': 3.0, 'pairs_per_tick': 124.0, 'contacts_per_tick': 70.0}}}
+
+
+def result(ms_per_tick: float, pairs_per_tick: float, contacts_per_tick: float, ticks: int = 120):
+    return SimpleNamespace(name='pile', ticks=ticks, ms_per_tick=ms_per_tick,
+                           pairs_per_tick=pairs_per_tick, contacts_per_tick=contacts_per_tick)
+
+
+def test_timing_noise_is_not_a_regression():
+    assert compare([result(4.1, 124.0, 70.0)], baseline, 0.5) == []
+
+
+def test_counters_are_held_tight():
+    assert len(compare([result(3.0, 140.0, 70.0)], baseline, 0.5)) == 1
+    assert len(compare([result(3.0, 124.0, 80.0)], baseline, 0.5)) == 1
+    assert compare([result(3.0, 124.5, 70.2)], baseline, 0.5) == []
+
+
+def test_other_tick_counts_are_skipped():
+    assert compare([result(30.0, 500.0, 500.0, ticks=60)], baseline, 0.5) == []
@@ -0,0 +1,48 @@
+from PySide6.QtGui import QVector2D as Vec2
+
+from physics import Body, Circle, Edge, PhysicsManager_CCD
+
+
+def ball(manager: PhysicsManager_CCD, position: Vec2, velocity: Vec2, radius: float = 10) -> Body:
+    body = Body(Circle(radius), Body.Type.Dynamic)
+    body.position = position
+    body.linear_velocity = velocity
+    manager.add_body(body)
+    return body
+
+
+def test_fast_ball_does_not_pass_a_thin_edge():
+    manager = PhysicsManager_CCD(headless=True)
+    edge = Body(Edge(Vec2(0, 400)), Body.Type.Static)
+    edge.position = Vec2(100, -200)
+    manager.add_body(edge)
+    # moves 100 per tick, ten times its radius
+    body = ball(manager, Vec2(0, 0), Vec2(1000, 0))
+    for i in range(5):
+        manager.step(0.1)
+        assert body.position.x() < 100
+    assert body.linear_velocity.x() < 0
+
+
+def test_fast_balls_do_not_pass_each_other():
+    manager = PhysicsManager_CCD(headless=True)
+    left = ball(manager, Vec2(0, 0), Vec2(800, 0))
+    right = ball(manager, Vec2(100, 0), Vec2(-800, 0))
+    manager.step(0.1)
+    assert left.position.x() < right.position.x()
+    assert left.linear_velocity.x() < 0 < right.linear_velocity.x()
+    assert manager.impacts == 1
+    # the impact counts as touching, for the sleep islands
+    assert manager.contacts == 1
+
+
+def test_later_impacts_see_the_earlier_ones():
+    manager = PhysicsManager_CCD(headless=True)
+    # the middle ball is hit first and only then meets the last one
+    first = ball(manager, Vec2(0, 0), Vec2(1000, 0))
+    middle = ball(manager, Vec2(40, 0), Vec2(0, 0))
+    last = ball(manager, Vec2(80, 0), Vec2(0, 0))
+    manager.step(0.1)
+    assert manager.impacts >= 2
+    assert first.position.x() < middle.position.x() < last.position.x()
+    assert last.linear_velocity.x() > 0
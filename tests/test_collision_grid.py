@@ -0,0 +1,22 @@
+import numpy as np
+
+from physics import BruteForce
+from physics.collision_grid import SpatialHash
+
+
+def test_spatial_hash_finds_the_pairs_of_brute_force():
+    rng = np.random.default_rng(5)
+    position = rng.uniform(0, 400, (60, 2))
+    size = rng.uniform(2, 50, (60, 2))
+    grid = SpatialHash(32)
+    brute = BruteForce()
+    for tick in range(40):
+        # small steps keep most bodies in their cells, a few jump far
+        position += rng.normal(0, 3, position.shape)
+        jump = rng.random(60) < 0.05
+        position[jump] = rng.uniform(0, 400, (jump.sum(), 2))
+        bounds = np.hstack((position, position + size))
+        a, b = grid.find_pairs(bounds)
+        expected_a, expected_b = brute.find_pairs(bounds)
+        assert sorted(zip(a.tolist(), b.tolist())) == sorted(zip(expected_a.tolist(), expected_b.tolist()))
+        assert (a < b).all()
@@ -0,0 +1,30 @@
+from PySide6.QtGui import QVector2D as Vec2
+
+from physics import Body, Circle, Edge, PhysicsManager
+
+
+def ball_on_floor(solver_iterations: int, velocity: Vec2) -> Body:
+    manager = PhysicsManager(headless=True)
+    manager.solver_iterations = solver_iterations
+    floor = Body(Edge(Vec2(400, 0)), Body.Type.Static)
+    floor.position = Vec2(0, 100)
+    manager.add_body(floor)
+    ball = Body(Circle(10), Body.Type.Dynamic)
+    ball.position = Vec2(200, 90.5)
+    ball.linear_velocity = velocity
+    manager.add_body(ball)
+    manager.step(1 / 60)
+    return ball
+
+
+def test_cached_static_contact_keeps_the_resting_clamp():
+    # leaving the floor slowly, the normal velocity is taken off as in resolve_static
+    ball = ball_on_floor(4, Vec2(20, -0.5))
+    assert ball.linear_velocity.y() == 0
+    assert ball.position.y() == 90
+
+
+def test_cached_static_contact_bounces_like_resolve_static():
+    cached = ball_on_floor(4, Vec2(0, 30))
+    sequential = ball_on_floor(0, Vec2(0, 30))
+    assert abs(cached.linear_velocity.y() - sequential.linear_velocity.y()) < 1e-4
@@ -0,0 +1,140 @@
+import numpy as np
+from PySide6.QtGui import QColor, QTransform
+
+from lighting import LightingManager, LightSource, Material, LightLayers
+from lighting.common import plain_local, sphere_normal, Matrix_from_QTransform
+
+
+def spot(position, color: str, intensity: float = 10, spread: float = 0.1) -> LightSource:
+    source = LightSource(LightSource.Type.Spot)
+    source.set_position(position)
+    source.set_direction((0, 0, -1))
+    source.spread = spread
+    source.intensity = intensity
+    source.set_color(QColor(color))
+    return source
+
+
+def lighting() -> LightingManager:
+    manager = LightingManager()
+    manager.ambient_intensity = 0.3
+    manager.add_light_source(spot((60, 40, 130), '#ffffaa'))
+    manager.add_light_source(spot((20, 90, 100), '#aaffff', 6, 0.3))
+    parallel = LightSource(LightSource.Type.Parallel)
+    parallel.set_direction((0.3, 0.2, -1))
+    parallel.intensity = 0.5
+    manager.add_light_source(parallel)
+    return manager
+
+
+def material(size: int, seed: int, normal: bool = True) -> Material:
+    rng = np.random.default_rng(seed)
+    material = Material()
+    material.set_diffuse_map(rng.uniform(0, 255, (size, size, 4)))
+    if normal:
+        with np.errstate(invalid='ignore'):
+            material.set_normal_map(sphere_normal(np.zeros((size, size))))
+        material.smoothness = 0.5
+        material.metalness = 10
+    else:
+        material.smoothness = 0.3
+    return material
+
+
+def ball_surface(material: Material, x: float, y: float) -> np.ndarray:
+    return material.normal_map * 10 + np.array([x, y, 0])
+
+
+def test_illuminate_into_matches_illuminate():
+    manager = lighting()
+    ball = material(16, 1)
+    board = material(96, 2, normal=False)
+    transform = Matrix_from_QTransform(QTransform(0.6, 0.8, -0.8, 0.6, 30, 40))
+    for surface, mat, matrix in ((ball_surface(ball, 40, 50), ball, None),
+                                 (plain_local(96, 96, 120, 120), board, None),
+                                 (plain_local(96, 96), board, transform)):
+        expected = manager.illuminate(surface, mat, matrix)
+        out = np.zeros(expected.shape, dtype=np.uint8)
+        manager.illuminate_into(surface, mat, out, matrix)
+        # float32 against float64, a channel may round the other way
+        assert np.abs(out.astype(int) - expected.astype(np.uint8)).max() <= 1
+
+
+def test_illuminate_batch_matches_illuminate():
+    manager = lighting()
+    materials = [material(16, seed) for seed in range(6)]
+    materials[2] = material(16, 9, normal=False)
+    materials[2].set_normal_map(np.zeros((16, 16, 3)))
+    rng = np.random.default_rng(3)
+    surfaces = np.stack([ball_surface(m, *rng.uniform(0, 120, 2)) for m in materials])
+    batch = manager.illuminate_batch(surfaces, materials)
+    single = np.stack([manager.illuminate(s, m) for s, m in zip(surfaces, materials)])
+    assert batch.shape == single.shape
+    assert np.allclose(batch, single, atol=1e-3)
+
+
+def test_illuminate_batch_writes_into_each_image():
+    manager = lighting()
+    materials = [material(16, seed) for seed in range(3)]
+    rng = np.random.default_rng(4)
+    surfaces = np.stack([ball_surface(m, *rng.uniform(0, 120, 2)) for m in materials]).astype(np.float32)
+    images = [np.zeros((16, 16, 4), dtype=np.uint8) for m in materials]
+    assert manager.illuminate_batch(surfaces, materials, images) is images
+    for image, surface, m in zip(images, surfaces, materials):
+        expected = manager.illuminate(surface.astype(float), m).astype(np.uint8)
+        assert np.abs(image.astype(int) - expected).max() <= 1
+    # a smaller batch after a larger one runs on the top rows of the same buffers
+    assert np.allclose(manager.illuminate_batch(surfaces[:1], materials[:1])[0],
+                       manager.illuminate(surfaces[0].astype(float), materials[0]), atol=1e-3)
+
+
+def test_scissor_culling_matches_illuminate_for_split_reach():
+    manager = LightingManager()
+    manager.ambient_intensity = 0.2
+    manager.add_light_source(spot((96, 32, 60), '#ffffff', 2, 0.5))
+    board = Material()
+    board.set_diffuse_map(np.random.default_rng(8).uniform(0, 255, (64, 192, 4)))
+    # the middle third sinks out of reach, the spot lights the tiles left and right of it
+    surface = plain_local(192, 64)
+    surface[:, 64:128, 2] = -2000
+    lower, upper = manager._tiles(surface)
+    source = manager.lighting_list[0]
+    position, direction, color = manager._light_frame(source, None)
+    assert manager._light_scissor(source, position, direction, (lower[:, 2:4], upper[:, 2:4])) is None
+    assert manager._light_scissor(source, position, direction, (lower, upper)) == (slice(0, 64), slice(0, 192))
+    expected = manager.illuminate(surface, board)
+    out = np.zeros(expected.shape, dtype=np.uint8)
+    manager.illuminate_into(surface, board, out)
+    assert np.abs(out.astype(int) - expected.astype(np.uint8)).max() <= 1
+
+
+def test_light_layers_match_illuminate_into():
+    manager = lighting()
+    # layers cover the whole surface, compare against the manager without culling
+    manager.cull_threshold = 0
+    board = material(96, 2, normal=False)
+    surface = plain_local(96, 96, 120, 120)
+    layers = LightLayers(manager, surface, board)
+    out = np.zeros((96, 96, 4), dtype=np.uint8)
+    expected = out.copy()
+
+    def check():
+        layers.illuminate_into(out)
+        manager.illuminate_into(surface, board, expected)
+        assert np.abs(out.astype(int) - expected).max() <= 1
+
+    check()
+    assert layers.recomputed == 3
+    # intensity, color and ambient only weight the layers again
+    manager.lighting_list[0].intensity = 4
+    manager.lighting_list[1].set_color(QColor('#ffaaff'))
+    manager.ambient_intensity = 0.1
+    check()
+    assert layers.recomputed == 3
+    # a moved light is recomputed alone
+    manager.lighting_list[0].set_position((70, 50, 120))
+    check()
+    assert layers.recomputed == 4
+    manager.lighting_list.pop()
+    check()
+    assert layers.recomputed == 4
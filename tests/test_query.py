@@ -0,0 +1,55 @@
+import math
+
+import numpy as np
+import pytest
+from PySide6.QtGui import QVector2D as Vec2
+
+from physics import Body, Circle, Edge, PhysicsManager, PhysicsManager_Array
+from physics.query import cast, overlapping
+
+
+def scene(manager_type) -> PhysicsManager:
+    rng = np.random.default_rng(5)
+    manager = manager_type(headless=True)
+    for k in range(60):
+        body = Body(Circle(rng.uniform(3, 15)), Body.Type.Dynamic)
+        body.position = Vec2(*rng.uniform(0, 400, 2))
+        manager.add_body(body)
+    for k in range(12):
+        body = Body(Edge(Vec2(*rng.uniform(-60, 60, 2))), Body.Type.Static)
+        body.position = Vec2(*rng.uniform(0, 400, 2))
+        manager.add_body(body)
+    manager.step()
+    return manager
+
+
+@pytest.mark.parametrize('manager_type', [PhysicsManager, PhysicsManager_Array])
+def test_query_aabb_finds_what_a_full_search_finds(manager_type):
+    manager = scene(manager_type)
+    bodies, bounds, moving = manager._all_body_bounds()
+    statics = manager.static_index
+    rng = np.random.default_rng(6)
+    for k in range(50):
+        x, y = rng.uniform(-20, 400, 2)
+        box = (x, y, x + rng.uniform(1, 120), y + rng.uniform(1, 120))
+        expected = {bodies[i] for i in overlapping(bounds, box).tolist()}
+        expected.update(statics.bodies[i] for i in overlapping(statics.bounds, box).tolist())
+        assert set(manager.query_aabb(box)) == expected
+
+
+@pytest.mark.parametrize('manager_type', [PhysicsManager, PhysicsManager_Array])
+def test_circle_cast_hits_what_a_full_search_hits(manager_type):
+    manager = scene(manager_type)
+    bodies, bounds, moving = manager._all_body_bounds()
+    rng = np.random.default_rng(7)
+    for k in range(50):
+        origin = Vec2(*rng.uniform(0, 400, 2))
+        angle = rng.uniform(0, 2 * math.pi)
+        direction = Vec2(math.cos(angle), math.sin(angle))
+        for radius, max_distance in ((0.0, math.inf), (10.0, math.inf), (10.0, 80.0)):
+            hit = manager.circle_cast(origin, radius, direction, max_distance)
+            expected = cast(bodies, bounds, manager.static_index, origin, radius, direction, max_distance)
+            assert (hit is None) == (expected is None)
+            if hit is not None:
+                assert hit.body is expected.body
+                assert hit.distance == pytest.approx(expected.distance)
@@ -0,0 +1,62 @@
+import pytest
+from PySide6.QtGui import QVector2D as Vec2
+
+from physics import Body, Circle, Edge, PhysicsManager, BodyRegistry
+
+
+def ball() -> Body:
+    return Body(Circle(5), Body.Type.Dynamic)
+
+
+def test_registry_keeps_handles_across_swap_removal():
+    registry = BodyRegistry()
+    bodies = [ball() for i in range(5)]
+    for handle, body in enumerate(bodies):
+        registry.add(body, handle)
+    assert registry.remove(bodies[1]) == 1
+    # the last body took the free slot, its handle still finds it
+    assert registry.bodies[1] is bodies[4]
+    assert registry.get(4) is bodies[4]
+    assert registry.get(1) is None
+    assert registry.handle(bodies[1]) is None
+    assert bodies[1] not in registry
+    assert [registry.get(handle) for handle in (0, 2, 3, 4)] == [bodies[0], bodies[2], bodies[3], bodies[4]]
+    with pytest.raises(Exception):
+        registry.add(bodies[0], 7)
+
+
+def test_manager_rejects_stale_handles():
+    manager = PhysicsManager(headless=True)
+    bodies = [ball() for i in range(3)]
+    handles = manager.add_bodies(bodies)
+    wall = Body(Edge(Vec2(10, 0)), Body.Type.Static)
+    wall_handle = manager.add_body(wall)
+    assert len(set(handles + [wall_handle])) == 4
+
+    manager.remove_body(handles[0])
+    manager.remove_body(wall)
+    # removal is deferred to the next step
+    assert manager.body(handles[0]) is bodies[0]
+    manager.step()
+    assert manager.body(handles[0]) is None
+    assert manager.body(wall_handle) is None
+    assert manager.handle(bodies[0]) is None
+    assert manager.body(handles[2]) is bodies[2]
+    with pytest.raises(Exception):
+        manager.remove_body(handles[0])
+    with pytest.raises(Exception):
+        manager.remove_body(bodies[0])
+
+    # handles are never reused
+    assert manager.add_body(ball()) not in handles + [wall_handle]
+
+
+def test_min_size_grows_back_after_removals():
+    manager = PhysicsManager(headless=True)
+    small = Body(Circle(2), Body.Type.Dynamic)
+    large = Body(Circle(20), Body.Type.Dynamic)
+    manager.add_bodies([small, large])
+    assert manager._min_size == small.shape.size()
+    manager.remove_body(small)
+    manager.step()
+    assert manager._min_size == large.shape.size()
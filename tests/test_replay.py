@@ -0,0 +1,54 @@
+import numpy as np
+from PySide6.QtGui import QVector2D as Vec2
+
+from physics import PhysicsManager, ReplayRecorder, ReplayPlayer
+from benchmark import snooker_rack
+from snooker import hit_impulse
+
+
+def state(bodies) -> np.ndarray:
+    return np.array([body.position.toTuple() + body.linear_velocity.toTuple() + (body.angle, body.angle_velocity)
+                     for body in bodies])
+
+
+def test_replay_round_trip(tmp_path):
+    manager = PhysicsManager(headless=True)
+    cue = snooker_rack(manager)
+    cue.hit(hit_impulse(Vec2(205, 210) - cue.position(), 1.0, 1000.0))
+    bodies = list(manager._bodies)
+    removed = bodies[3]
+    recorded = []
+    path = str(tmp_path / 'break.replay')
+    with ReplayRecorder(path, manager, keyframe_interval=10) as recorder:
+        manager.recorder = recorder
+        for tick in range(35):
+            if tick == 30:
+                manager.remove_body(removed)
+            manager.step()
+            recorded.append(state(bodies))
+        recorder.flush()
+
+        player = ReplayPlayer(path)
+        assert len(player) == 35
+        assert player.keyframe_interval == 10
+        for frame in player.play():
+            expected = recorded[frame.tick]
+            assert frame.keyframe == (frame.tick % 10 == 0)
+            present = frame.present()
+            assert present[3] == (frame.tick < 30)
+            got = np.column_stack((frame.position, frame.velocity, frame.angle, frame.angle_velocity))[present]
+            # keyframes are float64, the frames between float32 of the same values
+            assert np.allclose(got, expected[present], rtol=0 if frame.keyframe else 1e-6, atol=0 if frame.keyframe else 1e-5)
+        assert np.isnan(player[-1].position[3]).all()
+
+        # ticks written after opening show up on refresh
+        manager.step()
+        recorder.flush()
+        assert len(player) == 35
+        player.refresh()
+        assert len(player) == 36
+
+        # restore sets the bodies to the keyframe at or before the tick
+        assert player.restore(bodies, 27) == 20
+        present = player[20].present()
+        assert np.array_equal(state(bodies)[present], recorded[20][present])
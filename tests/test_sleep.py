@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from PySide6.QtGui import QVector2D as Vec2
+
+from benchmark import walls
+from physics import Body, Circle, BodyArray, PhysicsManager, PhysicsManager_Array
+from showcase import PhysicsManager_Gravity
+
+
+def test_sleeping_bodies_stay_until_gravity_changes():
+    manager = PhysicsManager_Gravity(headless=True)
+    ball = Body(Circle(10), Body.Type.Dynamic)
+    ball.position = Vec2(100, 100)
+    manager.add_body(ball)
+    for i in range(PhysicsManager.sleep_ticks + 2):
+        manager.step()
+    assert ball.sleeping
+    manager.step()
+    assert ball.position == Vec2(100, 100)
+
+    manager.gravity = 200
+    assert not ball.sleeping
+    manager.step()
+    manager.step()
+    assert ball.position.y() > 100
+
+
+def test_body_array_integrates_only_the_given_rows():
+    array = BodyArray()
+    for i in range(4):
+        body = Body(Circle(5), Body.Type.Dynamic)
+        body.linear_velocity = Vec2(10, 0)
+        body.angle_velocity = 1.0
+        array.bind(body)
+    index = np.array([1, 3])
+    array.integrate(0.5, index)
+    array.apply_friction(0.5, 0.5, index)
+    assert array.position[:4, 0].tolist() == [0, 5, 0, 5]
+    assert array.angle[:4].tolist() == [0, 0.5, 0, 0.5]
+    assert (array.linear_velocity[[0, 2], 0] == 10).all()
+    assert (array.linear_velocity[[1, 3], 0] < 10).all()
+    assert array.angle_velocity[:4].tolist() == [1, 0.75, 1, 0.75]
+
+
+def test_resting_stack_falls_asleep_under_gravity():
+    manager = PhysicsManager_Gravity(headless=True)
+    manager.gravity = 200
+    walls(manager, 400, 400)
+    balls = []
+    for k in range(2):
+        ball = Body(Circle(20), Body.Type.Dynamic)
+        ball.elasticity = 0
+        ball.position = Vec2(200, 379.5 - k * 41)
+        manager.add_body(ball)
+        balls.append(ball)
+    for i in range(120):
+        manager.step()
+    assert all(ball.sleeping for ball in balls)
+    assert not manager._awake
+
+
+@pytest.mark.parametrize('manager_type', [PhysicsManager, PhysicsManager_Array])
+def test_moving_body_wakes_its_sleeping_neighbour(manager_type):
+    manager = manager_type(headless=True)
+    sleepers = []
+    for x in (100, 300, 500):
+        ball = Body(Circle(10), Body.Type.Dynamic)
+        ball.position = Vec2(x, 100)
+        manager.add_body(ball)
+        sleepers.append(ball)
+    for i in range(PhysicsManager.sleep_ticks + 2):
+        manager.step()
+    assert all(ball.sleeping for ball in sleepers)
+
+    ball = Body(Circle(10), Body.Type.Dynamic)
+    ball.position = Vec2(275, 100)
+    ball.linear_velocity = Vec2(300, 0)
+    manager.add_body(ball)
+    manager.step()
+    # only the sleeper in the cells of the awake ball is given to the broadphase
+    bodies = manager._body_bounds()[0]
+    assert sleepers[0] not in bodies and sleepers[2] not in bodies
+    for i in range(5):
+        manager.step()
+    assert not sleepers[1].sleeping
+    assert sleepers[0].sleeping and sleepers[2].sleeping
@@ -0,0 +1,23 @@
+import numpy as np
+from PySide6.QtGui import QVector2D as Vec2
+
+from physics import Body, Circle, Edge, StaticIndex
+
+
+def test_query_pairs_finds_what_query_finds_row_by_row():
+    rng = np.random.default_rng(2)
+    index = StaticIndex(32)
+    statics = []
+    for k in range(20):
+        if k % 3:
+            body = Body(Edge(Vec2(*rng.uniform(-80, 80, 2))), Body.Type.Static)
+        else:
+            body = Body(Circle(rng.uniform(2, 20)), Body.Type.Static)
+        body.position = Vec2(*rng.uniform(-50, 250, 2))
+        statics.append(body)
+    index.add_many(statics)
+    corner = rng.uniform(-80, 280, (200, 2))
+    bounds = np.hstack((corner, corner + rng.uniform(1, 60, (200, 2))))
+    rows, found = index.query_pairs(bounds)
+    expected = [(row, i) for row in range(len(bounds)) for i in index.query(bounds[row])]
+    assert list(zip(rows.tolist(), found.tolist())) == expected